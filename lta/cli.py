@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
 """Provide entry point for CLI."""
 
+import importlib
 import logging
+import sys
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, cast
 
 import configargparse
 
-from lta.parser import lta_parser
+from lta.parser import lta_parser, select
 
 
 def main(args: Optional[configargparse.Namespace] = None) -> None:
@@ -21,6 +23,12 @@ def main(args: Optional[configargparse.Namespace] = None) -> None:
     file handlers are set up for ``--logfile``,
     unless the passed file is ``term``,
     in which case a stream handler is used.
+    If the first argument names a command, such as ``convert``,
+    the rest are parsed for that command instead.
+    The module of the command is only imported once the arguments are parsed,
+    so that a light command,
+    such as ``inspect``,
+    never imports the pipeline.
 
     Parameters
     ----------
@@ -29,8 +37,10 @@ def main(args: Optional[configargparse.Namespace] = None) -> None:
         This is the *intended* behaviour,
         as this option only exists to allow for testing.
     """
+    parser = lta_parser
     if args is None:
-        args = lta_parser.parse_args()
+        parser, argv = select(sys.argv[1:])
+        args = parser.parse_args(argv)
 
     # Get verbosity level
     verbosity = {
@@ -73,6 +83,7 @@ def main(args: Optional[configargparse.Namespace] = None) -> None:
     logger = logging.getLogger(__name__)
 
     logger.log(
-        45, f"Running LTA with the following parameters:\n{lta_parser.format_values()}"
+        45, f"Running LTA with the following parameters:\n{parser.format_values()}"
     )
-    args.func(args)
+    command = importlib.import_module(f"lta.commands.{args.command}")
+    getattr(command, args.command)(args)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Convert a CSV data file into a table for the CLI."""
+
+import logging
+
+import configargparse
+
+import lta.helpers.data_handling as dh
+
+logger = logging.getLogger(__name__)
+
+
+def convert(args: configargparse.Namespace) -> None:
+    """Convert a CSV data file into a Parquet or Feather table.
+
+    Every row of metadata is kept,
+    so the table can be passed to ``lta`` in place of the CSV.
+
+    Parameters
+    ----------
+    args: configargparse.Namespace
+        The passed args.
+    """
+    logger.debug(f"Converting {args.file} to {args.output}.")
+    dh.convert(
+        args.file,
+        args.output,
+        args.n_rows_metadata,
+        index_names=["Lipid", "Category", "m/z"],
+        index_col=[0, 1, 2],
+        header=None,
+    )
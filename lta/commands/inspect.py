@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Check a data file against the configuration for the CLI."""
+
+import logging
+
+import configargparse
+
+import lta.helpers.data_handling as dh
+
+logger = logging.getLogger(__name__)
+
+
+def inspect(args: configargparse.Namespace) -> None:
+    """Print the design of a data file, and check it can be analysed.
+
+    Only the metadata rows are parsed.
+    The lipids of a CSV are estimated from the size of the file,
+    unless ``--count-rows`` is passed to count every line,
+    which means reading the whole file.
+    Problems are printed with the rest of the report, rather than logged.
+
+    Parameters
+    ----------
+    args: configargparse.Namespace
+        The passed args.
+
+    Raises
+    ------
+    SystemExit
+        If the data file cannot be analysed as configured.
+    """
+    header = dh.read_header(
+        args.file, args.n_rows_metadata, index_col=[0, 1, 2], header=None
+    )
+    n_rows, exact = dh.count_rows(args.file, args.n_rows_metadata, args.count_rows)
+    lipids = f"{n_rows} lipids" if exact else f"about {n_rows} lipids"
+    print(f"{args.file}: {lipids}, {header.shape[1]} samples")
+
+    rows = {
+        "group": args.group,
+        "compartment": args.compartment,
+        "mode": args.mode,
+        "sample-id": args.sample_id,
+    }
+    filters = {
+        row: values
+        for row, values in [
+            (args.mode, args.modes),
+            (args.compartment, args.compartments),
+            (args.group, args.groups),
+        ]
+        if values is not None
+    }
+    problems = dh.check_design(header, rows, args.control, filters)
+    if all(row in header.index for row in rows.values()):
+        print(dh.design(header, args.group, args.compartment, args.mode).to_string())
+    if not problems:
+        print("No problems found.")
+        return
+    for problem in problems:
+        print(f"Problem: {problem}")
+    raise SystemExit(1)
@@ -35,8 +35,30 @@ def run(args: configargparse.Namespace) -> None:
         args.mode,
         args.sample_id,
         args.threshold,
-        args.boot_reps,
-        args.savealignfiles,
+        n=args.boot_reps,
+        save_align_files=args.savealignfiles,
+        method=args.jaccard_method,
+        sampler=args.boot_sampler,
+        strategy=args.boot_strategy,
+        alpha=args.boot_alpha,
+        exceedances=args.boot_exceedances,
+        null_cache_size=args.null_cache_size,
+        null_cache_dir=args.null_cache_dir,
+        null_cache_disk_size=args.null_cache_disk_size,
+        share_nulls=args.share_nulls,
+        jobs=args.jobs,
+        seed=args.seed,
+        network=args.network,
+        all_pairs=args.all_pairs,
+        compartment_jaccard=args.compartment_jaccard,
+        column_chunk=args.column_chunk,
+        row_chunk=args.row_chunk,
+        modes=args.modes,
+        compartments=args.compartments,
+        groups=args.groups,
+        input_cache_dir=args.input_cache_dir,
+        input_cache_size=args.input_cache_size,
+        refresh_input_cache=args.refresh_input_cache,
     )
     logger.debug("Running pipeline.")
     pl.run()
@@ -6,37 +6,129 @@ most of its constructor and processing functions have been moved here.
 This makes the code more atomic -
 and, thus, testable -
 by removing it from the harder to test context of the object.
+
+Attributes
+----------
+ENGINE : Literal["pyarrow", "c"]
+    The parser for the numeric body of data files,
+    the multithreaded pyarrow parser if it is installed.
 """
 
 import logging
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, List, Literal, Optional, Tuple
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
+
+from lta.helpers import tables
+
+ENGINE: Literal["pyarrow", "c"]
+try:
+    import pyarrow  # noqa: F401
+except ImportError:  # pragma: no cover
+    ENGINE = "c"
+else:
+    ENGINE = "pyarrow"
 
 logger = logging.getLogger(__name__)
 
 
+def _select(rows: pd.DataFrame, filters: Mapping[str, Sequence[str]]) -> np.ndarray:
+    """Find the samples whose metadata match every filter.
+
+    Parameters
+    ----------
+    rows : pd.DataFrame
+        The metadata of each sample, indexed by the name of each row.
+    filters : Mapping[str, Sequence[str]]
+        Keys are metadata rows, values are the values to keep from that row.
+
+    Returns
+    -------
+    np.ndarray
+        Whether each sample matches.
+
+    Raises
+    ------
+    ValueError
+        If a filter is not a row of metadata, or no samples match.
+    """
+    keep = np.ones(rows.shape[1], dtype=bool)
+    for row, values in filters.items():
+        if row not in rows.index:
+            logger.error(f"{row} is not a row of metadata.", stack_info=True)
+            raise ValueError(f"{row} is not a row of metadata.")
+        keep &= rows.loc[row].isin(values).to_numpy()
+    if not keep.any():
+        logger.error(f"No samples match {dict(filters)}.", stack_info=True)
+        raise ValueError(f"No samples match {dict(filters)}.")
+    return keep
+
+
+def _table_samples(
+    file: Path, filters: Optional[Mapping[str, Sequence[str]]]
+) -> pd.Index:
+    """Find the samples of a table whose metadata match every filter.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the table.
+    filters : Optional[Mapping[str, Sequence[str]]]
+        Keys are metadata rows, values are the values to keep from that row.
+
+    Returns
+    -------
+    pd.Index
+        The names of the matching samples.
+    """
+    header = tables.read_header(file)
+    if filters:
+        return header.columns[_select(header, filters)]
+    return header.columns
+
+
 def construct_df(
     file: Path,
     n_rows: int,
     metadata: List[str],
     index_names: Optional[List[str]] = None,
+    engine: Literal["pyarrow", "c"] = ENGINE,
+    filters: Optional[Mapping[str, Sequence[str]]] = None,
     **kwargs: Any,  # noqa: ANN401
 ) -> pd.DataFrame:
     """Construct a dataframe from the given path.
 
     A light wrapper to handing the reading of complex metadata.
-    It reads the whole dataframe,
-    then sices of ``n_rows`` to treat as metadata.
-    Any undesired rows are dropped,
-    then metadata is added as a multiindex onto the raw data,
-    less those rows that were metadata.
+    It reads the first ``n_rows`` to treat as metadata,
+    and drops any undesired rows.
+    Given ``filters``,
+    only the samples whose metadata match are kept.
+    It then reads the rest of those samples straight into numbers,
+    with the row metadata kept as text,
+    and adds the column metadata as a multiindex.
 
     Any row metadata can be retained by specifying the
     ``index_col`` kwarg to ``pd.read_csv``.
 
+    A Parquet or Feather file, as written by ``convert``,
+    is instead read by ``tables.read_table``,
+    ignoring ``n_rows``, ``engine``, and ``kwargs``.
+
     Parameters
     ----------
     file : Path
@@ -47,6 +139,12 @@ def construct_df(
         The metadata rows to include
     index_names : Optional[List[str]]
         Names for the data frame multi-index
+    engine : Literal["pyarrow", "c"]
+        default=ENGINE
+        The parser for the data, after the metadata
+    filters : Optional[Mapping[str, Sequence[str]]]
+        Keys are metadata rows, values are the values to keep from that row.
+        Needs ``index_col``.
     **kwargs : Any
         Further argument passed to ``pd.read_csv``
 
@@ -55,25 +153,363 @@ def construct_df(
     pd.DataFrame
         The created dataframe
     """
-    counts: pd.DataFrame = pd.read_csv(file, **kwargs)
+    if tables.is_table(file):
+        samples = _table_samples(file, filters)
+        return tables.read_table(file, metadata, samples, index_names)
 
     # Retrieve column metadata
-    cols = counts.iloc[:n_rows, :].copy()
+    header: pd.DataFrame = pd.read_csv(file, nrows=n_rows, **kwargs)
+    cols = header.copy()
     cols.index = cols.index.droplevel([0, 1])
+    if filters:
+        keep = _select(cols, filters)
+        header, cols = header.loc[:, keep], cols.loc[:, keep]
+        kwargs["usecols"] = [*header.index.names, *header.columns]
     cols = cols.loc[metadata, :]
 
-    # Create final dataframe
-    data = counts.iloc[n_rows:, :].copy()
+    # Create final dataframe, with only the row metadata as text
+    # pyarrow renumbers columns under usecols, so only the index is typed by name
+    dtype = {name: str for name in header.index.names}
+    data: pd.DataFrame = pd.read_csv(
+        file, skiprows=n_rows, dtype=dtype, engine=engine, **kwargs
+    ).astype(np.float64)
     data.columns = pd.MultiIndex.from_frame(cols.transpose())
     if index_names:
         data.index.names = index_names
 
-    # Force numeric types
-    data = data.apply(pd.to_numeric)
-
     return data
 
 
+def read_column_chunks(
+    file: Path,
+    n_rows: int,
+    metadata: List[str],
+    chunk: int,
+    index_names: Optional[List[str]] = None,
+    filters: Optional[Mapping[str, Sequence[str]]] = None,
+    **kwargs: Any,  # noqa: ANN401
+) -> Iterator[pd.DataFrame]:
+    """Read a dataframe from the given path a chunk of samples at a time.
+
+    Each chunk is as ``construct_df`` would give for those samples,
+    so only ``chunk`` samples are ever held at once.
+    As a CSV is stored row by row,
+    the whole file is still parsed for every chunk,
+    trading time for memory.
+    A Parquet or Feather file is read a chunk of columns at a time instead.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the data file
+    n_rows : int
+        The number of rows in the column metadata
+    metadata : List[str]
+        The metadata rows to include
+    chunk : int
+        The number of samples in each chunk
+    index_names : Optional[List[str]]
+        Names for the data frame multi-index
+    filters : Optional[Mapping[str, Sequence[str]]]
+        Keys are metadata rows, values are the values to keep from that row.
+    **kwargs : Any
+        Further argument passed to ``pd.read_csv``,
+        which must include ``index_col`` as a list of the first columns
+
+    Yields
+    ------
+    pd.DataFrame
+        The data of each chunk of samples, in order
+
+    Raises
+    ------
+    ValueError
+        If chunk is less than 1, or no samples match the filters.
+    """
+    if chunk < 1:
+        logger.error(f"Chunks need at least one sample, not {chunk}.", stack_info=True)
+        raise ValueError(f"Chunks need at least one sample, not {chunk}.")
+    if tables.is_table(file):
+        names = _table_samples(file, filters)
+        for start in range(0, len(names), chunk):
+            yield tables.read_table(
+                file, metadata, names[start : start + chunk], index_names
+            )
+        return
+
+    header = pd.read_csv(file, nrows=n_rows, **kwargs)
+    n_index = header.index.nlevels
+    samples = np.arange(n_index, n_index + header.shape[1])
+    if filters:
+        header.index = header.index.droplevel([0, 1])
+        samples = samples[_select(header, filters)]
+    for start in range(0, len(samples), chunk):
+        usecols = [*range(n_index), *samples[start : start + chunk]]
+        yield construct_df(
+            file, n_rows, metadata, index_names, usecols=usecols, **kwargs
+        )
+
+
+def convert(
+    file: Path,
+    output: Path,
+    n_rows: int,
+    index_names: Optional[List[str]] = None,
+    **kwargs: Any,  # noqa: ANN401
+) -> None:
+    """Convert a CSV data file into a Parquet or Feather table.
+
+    Every row of column metadata is kept,
+    so the table can be read by ``construct_df`` in place of the CSV.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the CSV data file
+    output : Path
+        Where to write the table, with its format given by its extension
+    n_rows : int
+        The number of rows in the column metadata
+    index_names : Optional[List[str]]
+        Names for the data frame multi-index
+    **kwargs : Any
+        Further argument passed to ``pd.read_csv``
+    """
+    header = pd.read_csv(file, nrows=n_rows, **kwargs)
+    metadata = list(header.index.droplevel([0, 1]).dropna().unique())
+    data = construct_df(file, n_rows, metadata, index_names, **kwargs)
+    logger.info(f"Writing {data.shape[1]} samples to {output}...")
+    tables.write_table(data, output)
+
+
+def read_header(file: Path, n_rows: int, **kwargs: Any) -> pd.DataFrame:  # noqa: ANN401
+    """Read only the column metadata of a data file.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the data file
+    n_rows : int
+        The number of rows in the column metadata
+    **kwargs : Any
+        Further argument passed to ``pd.read_csv``,
+        which must include ``index_col`` as a list of the first 3 columns
+
+    Returns
+    -------
+    pd.DataFrame
+        The metadata of each sample, indexed by the name of each row.
+    """
+    if tables.is_table(file):
+        return tables.read_header(file)
+    header: pd.DataFrame = pd.read_csv(file, nrows=n_rows, **kwargs)
+    header.index = header.index.droplevel([0, 1])
+    return header
+
+
+def _count_lines(file: Path) -> int:
+    """Count the lines of a file, including a last line without a newline.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the file
+
+    Returns
+    -------
+    int
+        The number of lines.
+    """
+    lines = 0
+    last = b"\n"
+    with open(file, "rb") as f:
+        while block := f.read(2**24):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return lines + (last != b"\n")
+
+
+def count_rows(file: Path, n_rows: int, exact: bool = False) -> Tuple[int, bool]:
+    """Count the lipids in a data file, without parsing it.
+
+    A table stores its number of rows.
+    For a CSV, lines are counted,
+    so blank lines are counted too.
+    Unless ``exact``,
+    only the first MiB of a CSV is read,
+    and the lines of a larger file are estimated
+    from its size and the average length of the lipid lines in that MiB.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the data file
+    n_rows : int
+        The number of rows in the column metadata
+    exact : bool
+        Whether to read the whole of a CSV to count its lines.
+
+    Returns
+    -------
+    Tuple[int, bool]
+        The number of rows after the metadata,
+        and whether it is exact rather than estimated.
+    """
+    if tables.is_table(file):
+        return tables.count_rows(file), True
+    with open(file, "rb") as f:
+        block = f.read(2**20)
+    lines = block.split(b"\n")[:-1]
+    size = file.stat().st_size
+    if exact or len(block) == size or len(lines) <= n_rows:
+        return _count_lines(file) - n_rows, True
+    head = sum(len(line) + 1 for line in lines[:n_rows])
+    body = sum(len(line) + 1 for line in lines[n_rows:])
+    return round((size - head) * (len(lines) - n_rows) / body), False
+
+
+def design(
+    header: pd.DataFrame, level: str, compartment: str, mode: str
+) -> pd.DataFrame:
+    """Count the samples of each condition in each compartment and mode.
+
+    Parameters
+    ----------
+    header : pd.DataFrame
+        The metadata of each sample, indexed by the name of each row.
+    level : str
+        Metadata location of experimental conditions.
+    compartment : str
+        Metadata location of sample tissue compartment.
+    mode : str
+        Metadata location of lipidomics mode.
+
+    Returns
+    -------
+    pd.DataFrame
+        The number of samples,
+        with modes and conditions as rows and compartments as columns.
+    """
+    samples = header.loc[[mode, level, compartment], :].transpose()
+    counts = samples.groupby([mode, level, compartment], dropna=False).size()
+    return counts.unstack(compartment, fill_value=0)
+
+
+def check_design(
+    header: pd.DataFrame,
+    rows: Mapping[str, str],
+    control: str,
+    filters: Optional[Mapping[str, Sequence[str]]] = None,
+) -> List[str]:
+    """Find problems with how a data file is to be analysed.
+
+    Parameters
+    ----------
+    header : pd.DataFrame
+        The metadata of each sample, indexed by the name of each row.
+    rows : Mapping[str, str]
+        The metadata row given for each of
+        "group", "compartment", "mode", and "sample-id".
+    control : str
+        The control condition.
+    filters : Optional[Mapping[str, Sequence[str]]]
+        Keys are metadata rows, values are the values to keep from that row.
+
+    Returns
+    -------
+    List[str]
+        A description of each problem found.
+    """
+    missing = [
+        f"--{option} {row} is not a row of metadata."
+        for option, row in rows.items()
+        if row not in header.index
+    ]
+    if missing:
+        return missing
+
+    problems = []
+    for row, values in (filters or {}).items():
+        absent = sorted(set(values) - set(header.loc[row, :]))
+        if absent:
+            problems.append(f"No samples have {row} {', '.join(absent)}.")
+    group, mode = header.loc[rows["group"], :], header.loc[rows["mode"], :]
+    for name in mode.unique():
+        if control not in set(group[mode == name]):
+            problems.append(f"Mode {name} has no samples of control {control}.")
+    ids = header.loc[rows["sample-id"], :]
+    duplicated = sorted(set(ids[ids.duplicated()].astype(str)))
+    if duplicated:
+        problems.append(f"Sample IDs are not unique: {', '.join(duplicated)}.")
+    return problems
+
+
+def _segments(index: pd.Index, levels: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort labels by some levels of a multiindex, and find where each group starts.
+
+    Groups are sorted by level values, as for ``groupby``,
+    and labels with a missing value in any level are left out.
+
+    Parameters
+    ----------
+    index : pd.Index
+        The multiindex to group.
+    levels : List[str]
+        The levels to group by, in order.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The positions of the labels in group order,
+        and the position in that order at which each group starts.
+    """
+    codes = np.stack(
+        [pd.factorize(index.get_level_values(level), sort=True)[0] for level in levels]
+    )
+    keep = np.flatnonzero((codes >= 0).all(axis=0))
+    order = keep[np.lexsort(codes[::-1, keep])]
+    changes = (np.diff(codes[:, order], axis=1) != 0).any(axis=0)
+    starts = np.flatnonzero(np.r_[len(order) > 0, changes])
+    return order, starts
+
+
+def _zero_groups(
+    values: np.ndarray, index: pd.Index, levels: List[str], thresh: float
+) -> Tuple[np.ndarray, pd.MultiIndex]:
+    """Mark groups of columns with at most ``thresh`` fraction 0 as present.
+
+    The columns are sorted by group once,
+    so the zeros of every group are counted in a single ``np.add.reduceat``,
+    and compared to their thresholds together.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        A matrix of lipids by samples.
+    index : pd.Index
+        The multiindex of the samples.
+    levels : List[str]
+        The levels of ``index`` to group samples by.
+    thresh : float
+        The fraction of samples above which a group is said to be 0
+
+    Returns
+    -------
+    Tuple[np.ndarray, pd.MultiIndex]
+        A boolean matrix of lipids by groups, and the labels of the groups.
+    """
+    order, starts = _segments(index, levels)
+    labels = index[order[starts]]
+    labels = pd.MultiIndex.from_arrays(
+        [labels.get_level_values(level) for level in levels], names=levels
+    )
+    if not len(starts):
+        return np.zeros((len(values), 0), dtype=bool), labels
+    zeros = np.add.reduceat(values[:, order] == 0, starts, axis=1, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(order)])
+    return zeros <= (thresh * sizes), labels
+
+
 def not_zero(
     df: pd.DataFrame,
     axis: Literal["index", "columns"],
@@ -110,22 +546,971 @@ def not_zero(
     pd.DataFrame
         The processed data.
     """
-    bool_df = df == 0
     if axis == "index":
-        df = bool_df.groupby(level=[compartment, level]).agg(
-            lambda x: x.sum() <= (thresh * len(x))
+        df = df.T
+    binary, labels = _zero_groups(
+        df.to_numpy(), df.columns, [compartment, level], thresh
+    )
+    keep = binary.any(axis=1)
+    result = pd.DataFrame(binary[keep], index=df.index[keep], columns=labels)
+    return result.T if axis == "index" else result
+
+
+def binarize(
+    df: pd.DataFrame,
+    mode: str,
+    level: str,
+    compartment: str,
+    thresh: float,
+) -> Dict[Hashable, pd.DataFrame]:
+    """Split lipid data by mode and mark groups with too many 0s as 0.
+
+    This is ``not_zero`` applied to the samples of each mode,
+    but the samples are sorted by mode, compartment, and level only once,
+    and the zeros of every group of every mode are counted together.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The lipid data, with samples on the columns
+    mode : str
+        The level of the column multiindex containing the lipidomics mode
+    level : str
+        The level of the column multiindex to groupby
+    compartment : str
+        The level of the column multiindex containing compartment sample
+    thresh : float
+        The fraction of samples above which a group is said to be 0
+
+    Returns
+    -------
+    Dict[Hashable, pd.DataFrame]
+        Keys are modes, sorted.
+        Values are as for ``not_zero``.
+    """
+    binary, labels = _zero_groups(
+        df.to_numpy(), df.columns, [mode, compartment, level], thresh
+    )
+    return _split_modes(binary, df.index, labels, mode)
+
+
+def _split_modes(
+    binary: np.ndarray, index: pd.Index, labels: pd.MultiIndex, mode: str
+) -> Dict[Hashable, pd.DataFrame]:
+    """Split the binary data of every group by mode, dropping lipids that are all 0.
+
+    Parameters
+    ----------
+    binary : np.ndarray
+        A boolean matrix of lipids by groups, from ``_zero_groups``.
+    index : pd.Index
+        The lipids.
+    labels : pd.MultiIndex
+        The labels of the groups, sorted.
+    mode : str
+        The level of ``labels`` containing the lipidomics mode
+
+    Returns
+    -------
+    Dict[Hashable, pd.DataFrame]
+        Keys are modes, sorted.
+        Values are as for ``not_zero``.
+    """
+    modes = labels.get_level_values(mode)
+    result = {}
+    for name in pd.unique(modes):
+        groups = np.flatnonzero(modes == name)
+        present = binary[:, groups]
+        keep = present.any(axis=1)
+        result[name] = pd.DataFrame(
+            present[keep], index=index[keep], columns=labels[groups].droplevel(mode)
         )
-    else:
-        df = (
-            bool_df.T.groupby(level=[compartment, level])
-            .agg(lambda x: x.sum() <= (thresh * len(x)))
-            .T
+    return result
+
+
+@dataclass
+class RunningBinary:
+    """The binary data of every mode, updated a chunk of samples at a time.
+
+    The zeros of each group of samples are counted per chunk,
+    and added to the running counts,
+    so only one chunk of samples is held at once.
+
+    Attributes
+    ----------
+    mode : str
+        The level of the column multiindex containing the lipidomics mode
+    level : str
+        The level of the column multiindex to groupby
+    compartment : str
+        The level of the column multiindex containing compartment sample
+    thresh : float
+        The fraction of samples above which a group is said to be 0
+    index : Optional[pd.Index]
+        The lipids, taken from the first chunk.
+    """
+
+    mode: str
+    level: str
+    compartment: str
+    thresh: float
+    index: Optional[pd.Index] = field(default=None, init=False)
+    _groups: Dict[Tuple[Hashable, ...], Tuple[int, np.ndarray]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    def update(self, df: pd.DataFrame) -> None:
+        """Add a chunk of samples to the zero counts.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The lipid data of some samples, with samples on the columns
+
+        Raises
+        ------
+        ValueError
+            If ``df`` has different lipids to earlier chunks.
+        """
+        if self.index is None:
+            self.index = df.index
+        elif not df.index.equals(self.index):
+            logger.error("Chunks must all have the same lipids.", stack_info=True)
+            raise ValueError("Chunks must all have the same lipids.")
+        order, starts = _segments(df.columns, [self.mode, self.compartment, self.level])
+        if not len(starts):
+            return
+        zeros = np.add.reduceat(
+            df.to_numpy()[:, order] == 0, starts, axis=1, dtype=np.int64
         )
-    if axis == "index":
-        df = df.loc[:, df.any(axis=axis)]
-    if axis == "columns":
-        df = df.loc[df.any(axis=axis), :]
-    return df
+        sizes = np.diff(np.r_[starts, len(order)])
+        labels = df.columns[order[starts]]
+        keys = zip(
+            *[
+                labels.get_level_values(level)
+                for level in [self.mode, self.compartment, self.level]
+            ],
+            strict=True,
+        )
+        for i, key in enumerate(keys):
+            size, counts = int(sizes[i]), zeros[:, i]
+            if key in self._groups:
+                size, counts = (
+                    size + self._groups[key][0],
+                    counts + self._groups[key][1],
+                )
+            self._groups[key] = size, counts
+
+    def finalize(self) -> Dict[Hashable, pd.DataFrame]:
+        """Return the binary data of every sample added so far.
+
+        Returns
+        -------
+        Dict[Hashable, pd.DataFrame]
+            The binary data, as from ``binarize`` on all the samples at once.
+        """
+        index = self.index if self.index is not None else pd.Index([])
+        labels = pd.MultiIndex.from_tuples(
+            sorted(self._groups), names=[self.mode, self.compartment, self.level]
+        )
+        zeros = np.zeros((len(index), len(labels)), dtype=np.int64)
+        sizes = np.zeros(len(labels), dtype=np.int64)
+        for i, key in enumerate(labels):
+            sizes[i], zeros[:, i] = self._groups[key]
+        return _split_modes(zeros <= (self.thresh * sizes), index, labels, self.mode)
+
+
+@dataclass
+class Presence:
+    """The compartments each lipid is present in, per condition, as bitmasks.
+
+    Bit ``k`` of a mask stands for the ``k``-th compartment,
+    so sets of compartments are tested with bitwise operations and popcounts,
+    rather than by slicing and regrouping the binary data.
+
+    Attributes
+    ----------
+    index : pd.Index
+        The lipids.
+    compartments : pd.Index
+        The compartments, in the order of their bits.
+    conditions : pd.Index
+        The conditions.
+    bits : np.ndarray
+        The compartments each lipid is present in, as a uint64 matrix of
+        lipids by conditions.
+    exists : np.ndarray
+        The compartments with samples of each condition, as uint64 masks.
+    """
+
+    index: pd.Index
+    compartments: pd.Index
+    conditions: pd.Index
+    bits: np.ndarray
+    exists: np.ndarray
+
+    @property
+    def spread(self) -> np.ndarray:
+        """Return the compartments each lipid is present in, in any condition.
+
+        Returns
+        -------
+        np.ndarray
+            A uint64 mask for each lipid.
+        """
+        return np.bitwise_or.reduce(self.bits, axis=1)
+
+    def names(self, mask: int) -> List[str]:
+        """Return the compartments of a mask.
+
+        Parameters
+        ----------
+        mask : int
+            The bitmask of some compartments.
+
+        Returns
+        -------
+        List[str]
+            The compartments, in the order of their bits.
+        """
+        return [str(c) for k, c in enumerate(self.compartments) if mask >> k & 1]
+
+    def unpack(self, condition: int) -> np.ndarray:
+        """Unpack the masks of a condition into a boolean matrix.
+
+        Parameters
+        ----------
+        condition : int
+            The position of the condition.
+
+        Returns
+        -------
+        np.ndarray
+            A boolean matrix of lipids by compartments.
+        """
+        shifts = np.arange(len(self.compartments), dtype=np.uint64)
+        return (self.bits[:, condition, None] >> shifts & np.uint64(1)).astype(bool)
+
+    def all(self, mask: int, rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Mark lipids present in every compartment of a mask, per condition.
+
+        Only compartments with samples of a condition are considered,
+        and conditions with none in the mask are left out.
+        Each distinct presence pattern is tested once.
+
+        Parameters
+        ----------
+        mask : int
+            The bitmask of the compartments.
+        rows : Optional[np.ndarray]
+            A boolean mask of the lipids to test.
+            If not given, every lipid is tested.
+
+        Returns
+        -------
+        pd.DataFrame
+            A boolean table of lipids by conditions.
+        """
+        if rows is None:
+            rows = np.ones(len(self.index), dtype=bool)
+        sub = self.exists & np.uint64(mask)
+        columns = sub != 0
+        bits = self.bits[rows][:, columns]
+        if bits.size:
+            patterns, inverse = np.unique(bits, axis=0, return_inverse=True)
+            present = ((patterns & sub[columns]) == sub[columns])[inverse.reshape(-1)]
+        else:
+            present = np.zeros(bits.shape, dtype=bool)
+        return pd.DataFrame(
+            present, index=self.index[rows], columns=self.conditions[columns]
+        )
+
+
+def presence(df: pd.DataFrame, compartment: str, level: str) -> Presence:
+    """Encode binary lipid data as compartment bitmasks.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Binary lipid data, as from ``binarize``,
+        with samples grouped by compartment and level on the columns
+    compartment : str
+        The level of the column multiindex containing compartment sample
+    level : str
+        The level of the column multiindex containing experimental conditions
+
+    Returns
+    -------
+    Presence
+        The bitmasks of each lipid and condition.
+
+    Raises
+    ------
+    ValueError
+        If there are more than 64 compartments.
+    """
+    k, compartments = pd.factorize(df.columns.get_level_values(compartment), sort=True)
+    c, conditions = pd.factorize(df.columns.get_level_values(level), sort=True)
+    if len(compartments) > 64:
+        logger.error(
+            f"At most 64 compartments are supported, not {len(compartments)}.",
+            stack_info=True,
+        )
+        raise ValueError(
+            f"At most 64 compartments are supported, not {len(compartments)}."
+        )
+    weights = np.left_shift(np.uint64(1), k.astype(np.uint64))
+    bits = np.zeros((len(df), len(conditions)), dtype=np.uint64)
+    exists = np.zeros(len(conditions), dtype=np.uint64)
+    values = df.to_numpy(dtype=bool)
+    for column, condition in enumerate(c):
+        bits[values[:, column], condition] |= weights[column]
+        exists[condition] |= weights[column]
+    return Presence(
+        df.index,
+        pd.Index(compartments, name=compartment),
+        pd.Index(conditions, name=level),
+        bits,
+        exists,
+    )
+
+
+def combinations(masks: Sequence[int]) -> List[int]:
+    """Sort compartment bitmasks as ``itertools.combinations`` would give them.
+
+    Parameters
+    ----------
+    masks : Sequence[int]
+        Bitmasks with the same number of compartments.
+
+    Returns
+    -------
+    List[int]
+        The masks, in lexicographic order of their compartments.
+    """
+    return sorted(masks, key=lambda mask: [k for k in range(64) if mask >> k & 1])
+
+
+def read_network(file: Path) -> List[Tuple[str, str]]:
+    """Read an edge list of compartment adjacencies.
+
+    Each line holds two compartments, separated by a comma or whitespace.
+    Blank lines and lines starting with ``#`` are skipped.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the edge list
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        The pairs of adjacent compartments
+
+    Raises
+    ------
+    ValueError
+        If a line does not hold exactly two compartments.
+    """
+    edges = []
+    with open(file) as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            nodes = line.replace(",", " ").split()
+            if len(nodes) != 2:
+                logger.error(
+                    f"Line {number} of {file} is not a pair of compartments: {line}",
+                    stack_info=True,
+                )
+                raise ValueError(
+                    f"Line {number} of {file} is not a pair of compartments: {line}"
+                )
+            edges.append((nodes[0], nodes[1]))
+    return edges
+
+
+def adjacency(edges: Sequence[Tuple[str, str]], compartments: pd.Index) -> np.ndarray:
+    """Encode the neighbours of each compartment as a bitmask.
+
+    Edges to compartments that are not in ``compartments`` are ignored.
+
+    Parameters
+    ----------
+    edges : Sequence[Tuple[str, str]]
+        The pairs of adjacent compartments
+    compartments : pd.Index
+        The compartments, in the order of their bits
+
+    Returns
+    -------
+    np.ndarray
+        The uint64 mask of the neighbours of each compartment.
+    """
+    bit = {str(c): k for k, c in enumerate(compartments)}
+    neighbours = np.zeros(len(compartments), dtype=np.uint64)
+    for a, b in edges:
+        if a in bit and b in bit and a != b:
+            neighbours[bit[a]] |= np.uint64(1 << bit[b])
+            neighbours[bit[b]] |= np.uint64(1 << bit[a])
+    return neighbours
+
+
+def connected(mask: int, neighbours: np.ndarray) -> bool:
+    """Check whether a set of compartments forms a connected subgraph.
+
+    Parameters
+    ----------
+    mask : int
+        The bitmask of the compartments
+    neighbours : np.ndarray
+        The mask of the neighbours of each compartment, as from ``adjacency``
+
+    Returns
+    -------
+    bool
+        Whether every compartment can be reached from every other within ``mask``.
+    """
+    reached = mask & -mask
+    frontier = reached
+    while frontier:
+        k = frontier.bit_length() - 1
+        frontier ^= 1 << k
+        new = int(neighbours[k]) & mask & ~reached
+        reached |= new
+        frontier |= new
+    return reached == mask
+
+
+@dataclass
+class Moments:
+    """The size, mean, and variance of every group of samples.
+
+    Attributes
+    ----------
+    index : pd.Index
+        The lipids.
+    compartments : pd.Index
+        The compartments.
+    conditions : pd.Index
+        The conditions.
+    count : np.ndarray
+        The number of samples of each compartment and condition.
+    mean : np.ndarray
+        The mean of each lipid, compartment, and condition,
+        NaN where there are no samples.
+    var : np.ndarray
+        The sample variance of each lipid, compartment, and condition,
+        NaN where there are fewer than two samples.
+    """
+
+    index: pd.Index
+    compartments: pd.Index
+    conditions: pd.Index
+    count: np.ndarray
+    mean: np.ndarray
+    var: np.ndarray
+
+    def take(self, rows: np.ndarray) -> "Moments":
+        """Keep the moments of some lipids.
+
+        The moments of each lipid only depend on its own values,
+        so these are the moments of those lipids alone.
+
+        Parameters
+        ----------
+        rows : np.ndarray
+            A boolean mask of the lipids to keep.
+
+        Returns
+        -------
+        Moments
+            The moments of the lipids kept.
+        """
+        return Moments(
+            self.index[rows],
+            self.compartments,
+            self.conditions,
+            self.count,
+            self.mean[rows],
+            self.var[rows],
+        )
+
+
+def moments(df: pd.DataFrame, compartment: str, level: str) -> Moments:
+    """Calculate the moments of every compartment and condition at once.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The lipid data, with samples on the columns
+    compartment : str
+        The level of the column multiindex containing compartment sample
+    level : str
+        The level of the column multiindex containing experimental conditions
+
+    Returns
+    -------
+    Moments
+        The moments, as arrays of lipids by compartments by conditions.
+    """
+    compartments = pd.Index(
+        pd.factorize(df.columns.get_level_values(compartment), sort=True)[1],
+        name=compartment,
+    )
+    conditions = pd.Index(
+        pd.factorize(df.columns.get_level_values(level), sort=True)[1], name=level
+    )
+    groups = pd.MultiIndex.from_product([compartments, conditions])
+    shape = (len(df), len(compartments), len(conditions))
+    grouped = df.T.groupby(level=[compartment, level])
+    return Moments(
+        df.index,
+        compartments,
+        conditions,
+        grouped.size().reindex(groups, fill_value=0).to_numpy().reshape(shape[1:]),
+        grouped.mean().reindex(groups).to_numpy().T.reshape(shape),
+        grouped.var().reindex(groups).to_numpy().T.reshape(shape),
+    )
+
+
+def _merge_moments(
+    a: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    b: Tuple[np.ndarray, np.ndarray, np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Merge the moments of two groups of samples.
+
+    This is the pairwise update of Chan, Golub, and LeVeque,
+    which stays accurate when the means are large compared with the spread.
+    Sizes are counted per lipid,
+    and a lipid without values in one group keeps the moments of the other.
+
+    Parameters
+    ----------
+    a : Tuple[np.ndarray, np.ndarray, np.ndarray]
+        The size, mean, and sum of squared deviations of the first group.
+    b : Tuple[np.ndarray, np.ndarray, np.ndarray]
+        The size, mean, and sum of squared deviations of the second group.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+        The size, mean, and sum of squared deviations of both groups together.
+    """
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = mean_b - mean_a
+        mean = mean_a + delta * (n_b / n)
+        m2 = m2_a + m2_b + delta**2 * (n_a * n_b / n)
+    mean = np.where(n_a == 0, mean_b, np.where(n_b == 0, mean_a, mean))
+    m2 = np.where(n_a == 0, m2_b, np.where(n_b == 0, m2_a, m2))
+    return n, mean, m2
+
+
+@dataclass
+class RunningMoments:
+    """The moments of every group of samples, updated a chunk of samples at a time.
+
+    Each chunk is reduced to the size, mean, and sum of squared deviations
+    of its groups,
+    which are merged into the running moments with ``_merge_moments``.
+    So only one chunk of samples is held at once,
+    and a group may be spread over any number of chunks.
+    As for ``moments``, missing values are skipped,
+    so the mean and variance of each lipid are over the samples with values.
+
+    Attributes
+    ----------
+    compartment : str
+        The level of the column multiindex containing compartment sample
+    level : str
+        The level of the column multiindex containing experimental conditions
+    index : Optional[pd.Index]
+        The lipids, taken from the first chunk.
+    """
+
+    compartment: str
+    level: str
+    index: Optional[pd.Index] = field(default=None, init=False)
+    _sizes: Dict[Tuple[Hashable, Hashable], int] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _groups: Dict[
+        Tuple[Hashable, Hashable], Tuple[np.ndarray, np.ndarray, np.ndarray]
+    ] = field(default_factory=dict, init=False, repr=False)
+
+    def update(self, df: pd.DataFrame) -> None:
+        """Add a chunk of samples to the moments.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The lipid data of some samples, with samples on the columns
+
+        Raises
+        ------
+        ValueError
+            If ``df`` has different lipids to earlier chunks.
+        """
+        if self.index is None:
+            self.index = df.index
+        elif not df.index.equals(self.index):
+            logger.error("Chunks must all have the same lipids.", stack_info=True)
+            raise ValueError("Chunks must all have the same lipids.")
+        order, starts = _segments(df.columns, [self.compartment, self.level])
+        if not len(starts):
+            return
+        values = df.to_numpy(dtype=np.float64)[:, order]
+        present = ~np.isnan(values)
+        sizes = np.diff(np.r_[starts, len(order)])
+        counts = np.add.reduceat(present, starts, axis=1, dtype=np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sums = np.add.reduceat(np.where(present, values, 0), starts, axis=1)
+            means = sums / counts
+        deviations = np.where(present, values - np.repeat(means, sizes, axis=1), 0)
+        m2 = np.add.reduceat(deviations**2, starts, axis=1)
+        labels = df.columns[order[starts]]
+        keys = zip(
+            labels.get_level_values(self.compartment),
+            labels.get_level_values(self.level),
+            strict=True,
+        )
+        for i, key in enumerate(keys):
+            moments = (counts[:, i], means[:, i], m2[:, i])
+            if key in self._groups:
+                moments = _merge_moments(self._groups[key], moments)
+            self._groups[key] = moments
+            self._sizes[key] = self._sizes.get(key, 0) + int(sizes[i])
+
+    def finalize(self) -> Moments:
+        """Return the moments of every sample added so far.
+
+        Returns
+        -------
+        Moments
+            The moments, as from ``moments`` on all the samples at once.
+        """
+        index = self.index if self.index is not None else pd.Index([])
+        groups = pd.MultiIndex.from_tuples(
+            list(self._groups), names=[self.compartment, self.level]
+        )
+        compartments = groups.levels[0].sort_values()
+        conditions = groups.levels[1].sort_values()
+        shape = (len(index), len(compartments), len(conditions))
+        count = np.zeros(shape[1:], dtype=np.int64)
+        mean = np.full(shape, np.nan)
+        var = np.full(shape, np.nan)
+        for (k, c), (n, group_mean, m2) in self._groups.items():
+            i, j = compartments.get_loc(k), conditions.get_loc(c)
+            count[i, j] = self._sizes[k, c]
+            mean[:, i, j] = group_mean
+            with np.errstate(divide="ignore", invalid="ignore"):
+                var[:, i, j] = np.where(n > 1, m2 / (n - 1), np.nan)
+        return Moments(index, compartments, conditions, count, mean, var)
+
+
+def enfcs(
+    m: Moments, conditions: Sequence[Hashable], control: Hashable
+) -> Dict[Hashable, pd.DataFrame]:
+    """Calculate the error normalised fold change of many conditions at once.
+
+    This gives the same results as ``enfc`` applied to each compartment,
+    with ``order=(condition, control)``,
+    but from moments calculated once,
+    with every condition compared by broadcasting.
+    Conditions without samples in a compartment give NaN.
+
+    Parameters
+    ----------
+    m : Moments
+        The moments of the lipid data, from ``moments``
+    conditions : Sequence[Hashable]
+        The experimental conditions
+    control : Hashable
+        The control condition
+
+    Returns
+    -------
+    Dict[Hashable, pd.DataFrame]
+        Keys are conditions.
+        Values are tables of lipids by compartments.
+    """
+    # A trailing layer of NaN stands in for conditions that are absent
+    mean = np.concatenate([m.mean, np.full(m.mean.shape[:2] + (1,), np.nan)], axis=2)
+    index = m.conditions.get_indexer([*conditions, control])
+    values = _normalised_fold_change(
+        mean[:, :, index[:-1]], mean[:, :, index[-1:]], _pooled_error(m)[:, :, None]
+    )
+    return {
+        condition: pd.DataFrame(values[:, :, i], index=m.index, columns=m.compartments)
+        for i, condition in enumerate(conditions)
+    }
+
+
+def _pooled_error(m: Moments) -> np.ndarray:
+    """Calculate the error of fold changes within each compartment.
+
+    As in ``enfc``,
+    the error pools the deviations of every condition in the compartment.
+
+    Parameters
+    ----------
+    m : Moments
+        The moments of the lipid data.
+
+    Returns
+    -------
+    np.ndarray
+        The error of each lipid and compartment.
+    """
+    # Squaring the standard deviation matches its rounding in ``enfc``
+    return (np.nansum(np.sqrt(m.var) ** 2, axis=2) / 2) ** 0.5
+
+
+def _normalised_fold_change(
+    numerator: np.ndarray, denominator: np.ndarray, error: np.ndarray
+) -> np.ndarray:
+    """Divide log fold changes of means by their error, broadcasting.
+
+    Fold changes of x/0, 0/x, and 0/0 are NaN, as in ``enfc``.
+
+    Parameters
+    ----------
+    numerator : np.ndarray
+        The means of the experimental conditions.
+    denominator : np.ndarray
+        The means of the reference conditions.
+    error : np.ndarray
+        The error of the fold changes.
+
+    Returns
+    -------
+    np.ndarray
+        The error normalised fold changes.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fc = numerator / denominator
+        fc[np.isinf(fc) | (fc == 0)] = np.nan
+        return np.log10(fc) / error
+
+
+def enfc_pairs(m: Moments) -> pd.DataFrame:
+    """Calculate the error normalised fold change between every pair of conditions.
+
+    The error of a compartment is shared by all of its conditions,
+    so the ENFC of ``b / a`` is minus that of ``a / b``,
+    and each pair is only reported once,
+    with the condition sorted before its reference.
+    Pairs without a fold change,
+    such as when either condition is all 0,
+    are left out.
+
+    Parameters
+    ----------
+    m : Moments
+        The moments of the lipid data, from ``moments``
+
+    Returns
+    -------
+    pd.DataFrame
+        A long table with an "ENFC" column,
+        indexed by lipid, compartment, condition, and reference.
+    """
+    condition, reference = np.triu_indices(len(m.conditions), k=1)
+    values = _normalised_fold_change(
+        m.mean[:, :, condition], m.mean[:, :, reference], _pooled_error(m)[:, :, None]
+    )
+    pairs = pd.MultiIndex.from_arrays(
+        [m.conditions[condition], m.conditions[reference]],
+        names=[m.conditions.name, "Reference"],
+    )
+    columns = pd.MultiIndex.from_tuples(
+        [(c, *pair) for c in m.compartments for pair in pairs],
+        names=[m.compartments.name, *pairs.names],
+    )
+    wide = pd.DataFrame(
+        values.reshape(len(m.index), len(columns)), index=m.index, columns=columns
+    )
+    return (
+        wide.stack(list(range(columns.nlevels)), future_stack=True)
+        .dropna()
+        .to_frame("ENFC")
+    )
+
+
+def _indicator(codes: np.ndarray, n: int) -> sparse.csr_array:
+    """Build a sparse matrix marking the group of each member.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        The group of each member. Members with a negative code are in no group.
+    n : int
+        The number of groups.
+
+    Returns
+    -------
+    sparse.csr_array
+        An integer matrix of groups by members.
+    """
+    (members,) = np.nonzero(codes >= 0)
+    ones = np.ones(len(members), dtype=np.int64)
+    return sparse.csr_array((ones, (codes[members], members)), shape=(n, len(codes)))
+
+
+@dataclass
+class Rollup:
+    """A sparse indicator matrix that sums lipids into classes.
+
+    Summing a table into classes is then a single sparse matrix product,
+    and rollups compose,
+    so a class to superclass rollup is a product of two small matrices.
+
+    Attributes
+    ----------
+    members : pd.Index
+        The lipids, in the order of the columns of ``matrix``.
+    labels : pd.Index
+        The classes, in the order of the rows of ``matrix``.
+    matrix : sparse.csr_array
+        An integer matrix of classes by lipids,
+        counting how often each lipid belongs to each class.
+    """
+
+    members: pd.Index
+    labels: pd.Index
+    matrix: sparse.csr_array
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Sum the rows of a table into classes.
+
+        This gives the same table as ``df.groupby(level=...).sum()``,
+        with classes sorted and those without lipids in ``df`` left out.
+        As for groupby, missing values are skipped,
+        so a class of only missing values sums to 0.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            A numeric table with lipids on the index
+
+        Returns
+        -------
+        pd.DataFrame
+            The table of classes
+
+        Raises
+        ------
+        KeyError
+            If ``df`` has lipids that are not members.
+        """
+        positions = self.members.get_indexer(df.index)
+        if (positions < 0).any():
+            logger.error(
+                f"{(positions < 0).sum()} lipids are not in any class.",
+                stack_info=True,
+            )
+            raise KeyError(f"{(positions < 0).sum()} lipids are not in any class.")
+        matrix = sparse.csr_array(self.matrix[:, positions])
+        keep = np.flatnonzero(np.diff(matrix.indptr))
+        values = df.to_numpy()
+        missing = pd.isna(values)
+        if missing.any():
+            values = np.where(missing, 0, values)
+        return pd.DataFrame(
+            matrix[keep] @ values,
+            index=self.labels[keep],
+            columns=df.columns,
+        )
+
+    def coarsen(self, parents: Mapping[Hashable, Hashable], name: str) -> "Rollup":
+        """Roll classes up further, into their parents.
+
+        Parameters
+        ----------
+        parents : Mapping[Hashable, Hashable]
+            The parent of each class, such as its superclass
+        name : str
+            The name of the parent level
+
+        Returns
+        -------
+        Rollup
+            The rollup of lipids into parents.
+        """
+        codes, labels = pd.factorize(
+            np.array([parents[label] for label in self.labels], dtype=object),
+            sort=True,
+        )
+        matrix = _indicator(codes, len(labels)) @ self.matrix
+        return Rollup(self.members, pd.Index(labels, name=name), matrix)
+
+
+def rollup(index: pd.Index, level: str) -> Rollup:
+    """Build the rollup of lipids into the classes of an index level.
+
+    Parameters
+    ----------
+    index : pd.Index
+        The lipids
+    level : str
+        The level of ``index`` holding the class of each lipid
+
+    Returns
+    -------
+    Rollup
+        The rollup of each lipid into its class.
+    """
+    members = index.unique()
+    codes, labels = pd.factorize(members.get_level_values(level), sort=True)
+    return Rollup(members, pd.Index(labels, name=level), _indicator(codes, len(labels)))
+
+
+def shards(index: pd.Index, level: str, size: int) -> List[np.ndarray]:
+    """Split rows into shards of about ``size`` rows, without splitting a group.
+
+    Groups are taken in the order they first appear,
+    and each is added to the current shard
+    unless that would take it past ``size`` rows.
+    So a group larger than ``size`` is a shard of its own.
+
+    Parameters
+    ----------
+    index : pd.Index
+        The multiindex of the rows.
+    level : str
+        The level of the multiindex that groups the rows.
+    size : int
+        The most rows to put in a shard of several groups.
+
+    Returns
+    -------
+    List[np.ndarray]
+        The positions of the rows of each shard, in their original order.
+
+    Raises
+    ------
+    ValueError
+        If size is less than 1.
+    """
+    if size < 1:
+        logger.error(f"Shards need at least one row, not {size}.", stack_info=True)
+        raise ValueError(f"Shards need at least one row, not {size}.")
+    codes, _ = pd.factorize(index.get_level_values(level), use_na_sentinel=False)
+    shard = np.zeros(codes.max(initial=-1) + 1, dtype=np.intp)
+    current = filled = 0
+    for code, rows in enumerate(np.bincount(codes)):
+        if filled and filled + rows > size:
+            current += 1
+            filled = 0
+        shard[code] = current
+        filled += rows
+    return [
+        np.flatnonzero(shard[codes] == i) for i in range(len(shard) and current + 1)
+    ]
 
 
 def enfc(
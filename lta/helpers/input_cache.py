@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""A persistent cache of parsed data files.
+
+Parsing a large data file can take much of a run,
+though runs often repeat the same file with different analysis options.
+Each parsed dataframe is stored on disk,
+keyed by a hash of the file's contents and the options it was read with,
+so editing the file, or reading it differently, never reuses a stale entry.
+The data are stored as a ``.npy`` array that is memory-mapped on load,
+with the row and column multiindexes alongside as JSON.
+Entries are evicted least recently used first,
+once they take more than a byte limit.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the stored layout changes, so old entries are never read
+_VERSION = 1
+
+
+def _hash(file: Path, options: Dict[str, Any]) -> str:
+    """Hash the contents of a file, and the options it is read with.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the data file.
+    options : Dict[str, Any]
+        The options it is read with, which must be JSON serialisable.
+
+    Returns
+    -------
+    str
+        The hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([_VERSION, options], sort_keys=True).encode())
+    with open(file, "rb") as f:
+        while block := f.read(2**20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _axis(index: pd.Index) -> Dict[str, List]:
+    """Describe a multiindex as JSON serialisable lists.
+
+    Parameters
+    ----------
+    index : pd.Index
+        The multiindex.
+
+    Returns
+    -------
+    Dict[str, List]
+        The names of its levels, and the labels of each level.
+    """
+    levels = [index.get_level_values(i) for i in range(index.nlevels)]
+    return {
+        "names": list(index.names),
+        "levels": [[None if pd.isna(x) else x for x in level] for level in levels],
+    }
+
+
+def _index(axis: Dict[str, List]) -> pd.MultiIndex:
+    """Rebuild a multiindex described by ``_axis``.
+
+    Parameters
+    ----------
+    axis : Dict[str, List]
+        The names of its levels, and the labels of each level.
+
+    Returns
+    -------
+    pd.MultiIndex
+        The multiindex.
+    """
+    return pd.MultiIndex.from_arrays(axis["levels"], names=axis["names"])
+
+
+@dataclass
+class InputCache:
+    """A least recently used on-disk cache of parsed data files.
+
+    Attributes
+    ----------
+    directory : Path
+        Where to store the entries.
+    max_bytes : int
+        The most disk space to take with entries.
+        An entry larger than this is never stored.
+    refresh : bool
+        Whether to parse files again, replacing any stored entries.
+    hits : int
+        The number of files found in the cache.
+    misses : int
+        The number of files that had to be parsed.
+    """
+
+    directory: Path
+    max_bytes: int = 2**32
+    refresh: bool = False
+    hits: int = 0
+    misses: int = 0
+
+    def __post_init__(self) -> None:
+        """Create the store."""
+        self.directory.mkdir(exist_ok=True, parents=True)
+
+    def _entries(self) -> List[Path]:
+        """List the stored entries, least recently used first.
+
+        Returns
+        -------
+        List[Path]
+            The directory of each entry.
+        """
+        entries = [
+            path
+            for path in self.directory.iterdir()
+            if path.is_dir() and Path(path, "axes.json").exists()
+        ]
+        return sorted(entries, key=lambda path: path.stat().st_mtime)
+
+    def _store(self, path: Path, data: pd.DataFrame) -> None:
+        """Store a dataframe, evicting the least recently used entries as needed.
+
+        Parameters
+        ----------
+        path : Path
+            The directory of the entry.
+        data : pd.DataFrame
+            The parsed data.
+        """
+        values = data.to_numpy()
+        if values.nbytes > self.max_bytes:
+            return
+        # Write then rename, so concurrent runs never read a partial entry
+        partial = path.with_name(f"{path.name}.{os.getpid()}.partial")
+        shutil.rmtree(partial, ignore_errors=True)
+        partial.mkdir()
+        np.save(Path(partial, "data.npy"), values)
+        axes = {"index": _axis(data.index), "columns": _axis(data.columns)}
+        Path(partial, "axes.json").write_text(json.dumps(axes))
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            partial.rename(path)
+        except OSError:
+            # Another run stored the same entry first
+            shutil.rmtree(partial, ignore_errors=True)
+        self._evict(keep=path)
+
+    def _evict(self, keep: Path) -> None:
+        """Evict the least recently used entries until within ``self.max_bytes``.
+
+        Parameters
+        ----------
+        keep : Path
+            An entry never to evict.
+        """
+        entries = self._entries()
+        sizes = {
+            path: sum(f.stat().st_size for f in path.iterdir()) for path in entries
+        }
+        total = sum(sizes.values())
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                logger.debug(f"Evicting {path.name} from the input cache...")
+                shutil.rmtree(path, ignore_errors=True)
+                total -= sizes[path]
+
+    def _load(self, path: Path) -> pd.DataFrame:
+        """Load a stored dataframe, with its data memory-mapped.
+
+        Parameters
+        ----------
+        path : Path
+            The directory of the entry.
+
+        Returns
+        -------
+        pd.DataFrame
+            The parsed data, which is read-only.
+        """
+        axes = json.loads(Path(path, "axes.json").read_text())
+        values = np.load(Path(path, "data.npy"), mmap_mode="r")
+        os.utime(path)
+        return pd.DataFrame(
+            values,
+            index=_index(axes["index"]),
+            columns=_index(axes["columns"]),
+            copy=False,
+        )
+
+    def fetch(
+        self, file: Path, options: Dict[str, Any], read: Callable[[], pd.DataFrame]
+    ) -> pd.DataFrame:
+        """Return the parsed data of a file, parsing it only if it is not cached.
+
+        Parameters
+        ----------
+        file : Path
+            The path to the data file.
+        options : Dict[str, Any]
+            The options it is read with, which must be JSON serialisable.
+        read : Callable[[], pd.DataFrame]
+            Parses the file when it is not cached.
+
+        Returns
+        -------
+        pd.DataFrame
+            The parsed data.
+        """
+        path = Path(self.directory, _hash(file, options))
+        if not self.refresh and path.exists():
+            logger.info(f"Reading {file} from the input cache...")
+            self.hits += 1
+            return self._load(path)
+        self.misses += 1
+        data = read()
+        self._store(path, data)
+        return data
@@ -4,25 +4,48 @@
 Vendored from boolean-jaccard 0.1.1 (https://github.com/rbpatt2019/boolean-jaccard),
 which is unmaintained and capped at Python <3.11.
 Original: python port of the R jaccard package by N. Chung.
+
+Attributes
+----------
+BLOCK_BYTES : int
+    The memory budget, in bytes, for a single block of bootstrap replicates.
 """
 
+import hashlib
 import logging
-from typing import Optional
+import math
+from typing import Iterable, Iterator, List, Literal, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
+from lta.helpers import kernels
+from lta.helpers.null_cache import NullCache
+
 logger = logging.getLogger(__name__)
 
+BLOCK_BYTES = 2**26
 
-def similarity(
-    x: np.ndarray,
-    y: np.ndarray,
-    center: bool = False,
-    px: Optional[float] = None,
-    py: Optional[float] = None,
-) -> float:
-    """Calculate Jaccard similarity."""
+Seed = Union[int, np.random.SeedSequence]
+
+
+def _validate(x: np.ndarray, y: np.ndarray) -> None:
+    """Check that two vectors can be compared.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first vector.
+    y : np.ndarray
+        The second vector.
+
+    Raises
+    ------
+    IndexError
+        If the vectors are not 1-d or differ in length.
+    TypeError
+        If the vectors are not boolean.
+    """
     if x.ndim != 1 or y.ndim != 1:
         logging.error(
             f"All vectors must be 1-d. ndims: {[x.ndim, y.ndim]}.", stack_info=True
@@ -41,26 +64,23 @@ def similarity(
         )
         raise TypeError
 
+
+def similarity(
+    x: np.ndarray,
+    y: np.ndarray,
+    center: bool = False,
+    px: Optional[float] = None,
+    py: Optional[float] = None,
+) -> float:
+    """Calculate Jaccard similarity."""
+    _validate(x, y)
     if px is None:
         px = float(x.mean())
     if py is None:
         py = float(y.mean())
 
-    intersect = (x & y).sum()
-    union = x.sum() + y.sum() - intersect
-
-    denominator = px + py - (px * py)
-    if denominator == 0:
-        return np.nan
-
-    if union == 0:
-        j = (px * py) / denominator
-    else:
-        j = intersect / union
-
-    if center:
-        return j - ((px * py) / denominator)
-    return j
+    intersect, sx, sy = map(int, kernels.counts(np.asarray(x), np.asarray(y)))
+    return kernels.similarity(intersect, sx + sy - intersect, px, py, center)
 
 
 def distance(
@@ -74,39 +94,1150 @@ def distance(
     return 1 - similarity(x, y, center=False, px=px, py=py)
 
 
+def _observed(
+    x: np.ndarray, y: np.ndarray, px: Optional[float], py: Optional[float]
+) -> Tuple[float, float, float, float]:
+    """Validate two vectors and calculate their similarity, raw and centered.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    px : Optional[float]
+        The probability of a True in x. Defaults to the mean of x.
+    py : Optional[float]
+        The probability of a True in y. Defaults to the mean of y.
+
+    Returns
+    -------
+    Tuple[float, float, float, float]
+        The similarity, the centered similarity, px, and py.
+    """
+    _validate(x, y)
+    if px is None:
+        px = float(x.mean())
+    if py is None:
+        py = float(y.mean())
+    intersect, sx, sy = map(int, kernels.counts(np.asarray(x), np.asarray(y)))
+    union = sx + sy - intersect
+    return (
+        kernels.similarity(intersect, union, px, py, False),
+        kernels.similarity(intersect, union, px, py, True),
+        px,
+        py,
+    )
+
+
+def _degenerate(x: np.ndarray, y: np.ndarray, px: float, py: float, name: str) -> bool:
+    """Check whether a test is degenerate, logging a warning if so.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    px : float
+        The probability of a True in x.
+    py : float
+        The probability of a True in y.
+    name : str
+        The name of the test, used by logging only.
+
+    Returns
+    -------
+    bool
+        True if at least one vector is all 1 or all 0.
+    """
+    if px == 1 or py == 1 or len(x) == x.sum() or len(y) == y.sum():
+        logger.warning(f"{name} is degenerate as at least one vector is all 1.")
+        return True
+    if px == 0 or py == 0 or x.sum() == 0 or y.sum() == 0:
+        logger.warning(f"{name} is degenerate as at least one vector is all 0.")
+        return True
+    return False
+
+
+def stream(seed: int, *key: Union[str, int]) -> np.random.SeedSequence:
+    """Derive an independent random stream from a seed and a stable key.
+
+    ``SeedSequence.spawn`` numbers its children in the order they are spawned,
+    which would tie each stream to the order of execution.
+    Instead,
+    the key is used as the spawn key of the child directly,
+    so the same key always gives the same stream,
+    and different keys give independent streams,
+    whatever the order, number of workers, or chunking.
+    Integers are used as they are,
+    while strings are hashed with SHA-256,
+    which is stable across processes and platforms.
+
+    Parameters
+    ----------
+    seed : int
+        The seed of the whole run.
+    *key : Union[str, int]
+        The parts of the key, such as lipid set, mode, condition, and category.
+
+    Returns
+    -------
+    np.random.SeedSequence
+        The stream for ``key``.
+    """
+    spawn_key = tuple(
+        (
+            int(part)
+            if isinstance(part, (int, np.integer))
+            else int.from_bytes(hashlib.sha256(part.encode()).digest()[:8], "little")
+        )
+        for part in key
+    )
+    return np.random.SeedSequence(seed, spawn_key=spawn_key)
+
+
+def _seed_key(seed: Seed) -> Union[int, str]:
+    """Identify a seed within a cache key.
+
+    Parameters
+    ----------
+    seed : Seed
+        The seed for the random number generator.
+
+    Returns
+    -------
+    Union[int, str]
+        The seed itself, or the entropy and spawn key of a stream.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return "-".join(map(str, (seed.entropy, *seed.spawn_key)))
+    return seed
+
+
+def _block_size(per_rep: int, max_bytes: int) -> int:
+    """Return how many replicates fit within ``max_bytes``.
+
+    Parameters
+    ----------
+    per_rep : int
+        The memory needed by a single replicate, in bytes.
+    max_bytes : int
+        The memory budget for a single block.
+
+    Returns
+    -------
+    int
+        The number of replicates per block, at least 1.
+    """
+    return max(1, max_bytes // per_rep)
+
+
+def _schedule(n: int, block: int, first: int) -> Iterator[int]:
+    """Yield block sizes that sum to ``n``.
+
+    Blocks start at ``first`` replicates and double until they reach ``block``.
+
+    Parameters
+    ----------
+    n : int
+        The total number of replicates.
+    block : int
+        The maximum number of replicates per block.
+    first : int
+        The number of replicates in the first block.
+
+    Yields
+    ------
+    int
+        The number of replicates in each block.
+    """
+    drawn = 0
+    size = max(1, min(first, block))
+    while drawn < n:
+        size = min(size, n - drawn)
+        yield size
+        drawn += size
+        size = min(2 * size, block)
+
+
+def _null_blocks(
+    x: np.ndarray, y: np.ndarray, sizes: Iterable[int], rng: np.random.Generator
+) -> Iterator[np.ndarray]:
+    """Yield absolute centered similarities of bootstrap replicates, block by block.
+
+    Each block draws a ``(k, 2, m)`` array of resample indices in a single call.
+    This consumes ``rng`` in exactly the order of drawing ``x`` then ``y``
+    with ``rng.choice`` once per replicate,
+    so the null distribution does not depend on the block sizes.
+
+    Several pairs of vectors of the same length can be stacked along leading axes.
+    They are then resampled with the same indices,
+    exactly as if each pair were bootstrapped on its own with the same seed.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector, or a stack of them.
+    y : np.ndarray
+        The second boolean vector, or a stack of them.
+    sizes : Iterable[int]
+        The number of replicates in each block.
+    rng : np.random.Generator
+        The generator to draw resample indices from.
+
+    Yields
+    ------
+    np.ndarray
+        A float32 array of absolute centered similarities for each block,
+        with replicates along the last axis.
+    """
+    m = x.shape[-1]
+    for k in sizes:
+        yield kernels.null_block(x, y, rng.integers(0, m, size=(k, 2, m)))
+
+
+def _count_blocks(
+    tx: int, ty: int, m: int, sizes: Iterable[int], rng: np.random.Generator
+) -> Iterator[np.ndarray]:
+    """Yield absolute centered similarities of bootstrap replicates, block by block.
+
+    Resampling a vector with replacement only changes its number of Trues,
+    which is binomial.
+    Given those counts,
+    the Trues of two independent resamples fall on uniformly random positions,
+    so their intersection is hypergeometric.
+    Each replicate is therefore three scalar draws,
+    whatever the length of the vectors.
+    Every draw comes from its own stream spawned from ``rng``,
+    so the null distribution does not depend on the block sizes.
+
+    Parameters
+    ----------
+    tx : int
+        The number of Trues in x.
+    ty : int
+        The number of Trues in y.
+    m : int
+        The length of the vectors.
+    sizes : Iterable[int]
+        The number of replicates in each block.
+    rng : np.random.Generator
+        The generator to spawn streams from.
+
+    Yields
+    ------
+    np.ndarray
+        A float32 array of absolute centered similarities for each block.
+    """
+    rng_x, rng_y, rng_xy = rng.spawn(3)
+    for k in sizes:
+        sx = rng_x.binomial(m, tx / m, size=k)
+        sy = rng_y.binomial(m, ty / m, size=k)
+        intersect = rng_xy.hypergeometric(sy, m - sy, sx)
+        j_null = kernels.centered(intersect, sx, sy, m).astype(np.float32)
+        yield np.abs(j_null, dtype=np.float32, out=j_null)
+
+
+def _replicates(
+    x: np.ndarray,
+    y: np.ndarray,
+    n: int,
+    seed: Seed,
+    block: Optional[int],
+    sampler: Literal["index", "counts"],
+    first: Optional[int] = None,
+    cache: Optional[NullCache] = None,
+) -> Iterator[np.ndarray]:
+    """Draw bootstrap replicates from the chosen sampler, block by block.
+
+    The null of the "counts" sampler depends only on the vector length,
+    the number of Trues in each vector,
+    ``n``, and ``seed``,
+    so it can be taken from ``cache`` whole,
+    rather than drawn.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    n : int
+        The total number of replicates.
+    seed : Seed
+        The seed for the random number generator.
+    block : Optional[int]
+        The maximum number of replicates per block.
+        If not given, it is chosen to keep each block within ``BLOCK_BYTES``.
+    sampler : Literal["index", "counts"]
+        How to draw bootstrap replicates.
+    first : Optional[int]
+        The number of replicates in the first block.
+        Later blocks double in size up to ``block``.
+        If not given, all blocks are full.
+    cache : Optional[NullCache]
+        Where to look for nulls of the "counts" sampler.
+
+    Returns
+    -------
+    Iterator[np.ndarray]
+        Float32 arrays of absolute centered similarities for each block.
+    """
+    m = len(x)
+    if sampler == "counts" and cache is not None:
+        key = (m, int(x.sum()), int(y.sum()), n, _seed_key(seed))
+        null = cache.fetch(
+            key,
+            lambda: np.concatenate(list(_replicates(x, y, n, seed, block, sampler))),
+        )
+        return iter([null])
+    if block is None:
+        if sampler == "counts":
+            # Each replicate holds three int64 counts
+            block = _block_size(3 * 8, BLOCK_BYTES)
+        else:
+            # Each replicate holds an int64 resample index and a bool per vector
+            block = _block_size(2 * m * (8 + 1), BLOCK_BYTES)
+    sizes = _schedule(n, block, block if first is None else first)
+    rng = np.random.default_rng(seed)
+    if sampler == "counts":
+        return _count_blocks(int(x.sum()), int(y.sum()), m, sizes, rng)
+    return _null_blocks(x, y, sizes, rng)
+
+
+def _sequential(blocks: Iterable[np.ndarray], j_obs: float, h: int) -> Tuple[int, int]:
+    """Count exceedances until ``h`` are seen or the replicates run out.
+
+    Parameters
+    ----------
+    blocks : Iterable[np.ndarray]
+        Blocks of absolute centered similarities from the null distribution.
+    j_obs : float
+        The absolute centered similarity that was observed.
+    h : int
+        The number of exceedances at which to stop.
+
+    Returns
+    -------
+    Tuple[int, int]
+        The number of exceedances and the number of replicates used.
+    """
+    exceed = used = 0
+    for j_null in blocks:
+        hits = exceed + np.cumsum(j_null >= j_obs)
+        if hits[-1] >= h:
+            return h, used + int(np.argmax(hits >= h)) + 1
+        exceed = int(hits[-1])
+        used += len(j_null)
+    return exceed, used
+
+
+def _bootstrap_p(
+    x: np.ndarray,
+    y: np.ndarray,
+    j_obs: float,
+    n: int,
+    seed: Seed,
+    block: Optional[int],
+    sampler: Literal["index", "counts"],
+    strategy: Literal["fixed", "sequential"],
+    alpha: float,
+    h: Optional[int],
+    cache: Optional[NullCache],
+) -> Tuple[float, int]:
+    """Calculate a bootstrap p-value for an observed centered similarity.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    j_obs : float
+        The centered similarity that was observed.
+    n : int
+        The number of bootstrap replicates.
+    seed : Seed
+        The seed for the random number generator.
+    block : Optional[int]
+        The number of replicates to evaluate at once.
+    sampler : Literal["index", "counts"]
+        How to draw bootstrap replicates.
+    strategy : Literal["fixed", "sequential"]
+        Whether to stop early once the p-value is settled.
+    alpha : float
+        The significance level for the sequential strategy.
+    h : Optional[int]
+        The number of exceedances at which the sequential strategy stops.
+    cache : Optional[NullCache]
+        Where to look for nulls of the "counts" sampler, under the "fixed" strategy.
+
+    Returns
+    -------
+    Tuple[float, int]
+        The p-value and the number of replicates used.
+    """
+    j_obs = np.abs(j_obs)
+    if strategy == "sequential":
+        if h is None:
+            h = math.floor(alpha * n) + 1
+        # A cached null is drawn whole, which would undo the early stop
+        blocks = _replicates(x, y, n, seed, block, sampler, first=h)
+        exceed, used = _sequential(blocks, j_obs, h)
+        return exceed / used, used
+    if sampler == "index":
+        return float(_fused_index_p([x], [y], np.array([j_obs]), n, seed, block)[0]), n
+    blocks = _replicates(x, y, n, seed, block, sampler, cache=cache)
+    exceed = sum(int((j_null >= j_obs).sum()) for j_null in blocks)
+    return exceed / n, n
+
+
 def bootstrap(
     x: np.ndarray,
     y: np.ndarray,
     px: Optional[float] = None,
     py: Optional[float] = None,
     n: int = 1000,
-    seed: int = 42,
+    seed: Seed = 42,
+    block: Optional[int] = None,
+    sampler: Literal["index", "counts"] = "index",
+    strategy: Literal["fixed", "sequential"] = "fixed",
+    alpha: float = 0.05,
+    h: Optional[int] = None,
+    cache: Optional[NullCache] = None,
 ) -> pd.Series:
-    """Bootstrap p-value for Jaccard similarity."""
-    j = similarity(x, y, center=False, px=px, py=py)
-    if px is None:
-        px = float(x.mean())
-    if py is None:
-        py = float(y.mean())
-    if px == 1 or py == 1 or len(x) == x.sum() or len(y) == y.sum():
-        logger.warning("Bootstrap is degenerate as at least one vector is all 1.")
+    """Bootstrap p-value for Jaccard similarity.
+
+    Replicates are drawn and evaluated ``block`` at a time,
+    so memory is bounded regardless of ``n``.
+    The "index" sampler resamples the vectors themselves,
+    while the "counts" sampler draws only their sufficient statistics.
+    Both have the same null distribution,
+    but the cost of a "counts" replicate does not grow with the vector length.
+
+    The "fixed" strategy always draws ``n`` replicates.
+    The "sequential" strategy follows Besag and Clifford (1991),
+    stopping as soon as ``h`` replicates are at least as extreme as observed.
+    The p-value is then ``h / L``,
+    where ``L`` is the number of replicates used,
+    and is otherwise the same as for the "fixed" strategy.
+    By default,
+    ``h`` is the smallest count that guarantees a p-value above ``alpha``,
+    so clearly non-significant results stop early
+    while every significant result sees all ``n`` replicates.
+    Larger values of ``h`` give more precise p-values.
+    As the replicates are drawn in the same order either way,
+    the sequential p-value only differs once it is certain to exceed ``alpha``.
+
+    If a ``cache`` is given,
+    the "counts" sampler reuses nulls from it under the "fixed" strategy,
+    with the same results as drawing them afresh.
+    The "sequential" strategy never uses the cache,
+    as a cached null is drawn whole.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    px : Optional[float]
+        The probability of a True in x. Defaults to the mean of x.
+    py : Optional[float]
+        The probability of a True in y. Defaults to the mean of y.
+    n : int
+        The number of bootstrap replicates.
+    seed : Seed
+        The seed for the random number generator.
+    block : Optional[int]
+        The number of replicates to evaluate at once.
+        If not given, it is chosen to keep each block within ``BLOCK_BYTES``.
+    sampler : Literal["index", "counts"]
+        How to draw bootstrap replicates.
+    strategy : Literal["fixed", "sequential"]
+        Whether to stop early once the p-value is settled.
+    alpha : float
+        The significance level for the sequential strategy.
+    h : Optional[int]
+        The number of exceedances at which the sequential strategy stops.
+        Defaults to ``floor(alpha * n) + 1``.
+    cache : Optional[NullCache]
+        Where to look for nulls of the "counts" sampler.
+
+    Returns
+    -------
+    pd.Series
+        The Jaccard similarity and p-value, labelled "J-sim" and "p-val".
+        The sequential strategy also gives the replicates used, as "n-boot".
+    """
+    j, j_obs, px, py = _observed(x, y, px, py)
+    if _degenerate(x, y, px, py, "Bootstrap"):
+        if strategy == "sequential":
+            return pd.Series([j, 1, 0], index=["J-sim", "p-val", "n-boot"])
         return pd.Series([j, 1], index=["J-sim", "p-val"])
-    if px == 0 or py == 0 or x.sum() == 0 or y.sum() == 0:
-        logger.warning("Bootstrap is degenerate as at least one vector is all 0.")
+
+    p_val, used = _bootstrap_p(
+        np.asarray(x),
+        np.asarray(y),
+        j_obs,
+        n,
+        seed,
+        block,
+        sampler,
+        strategy,
+        alpha,
+        h,
+        cache,
+    )
+    if strategy == "sequential":
+        return pd.Series([j, p_val, used], index=["J-sim", "p-val", "n-boot"])
+    return pd.Series([j, p_val], index=["J-sim", "p-val"])
+
+
+def exact(
+    x: np.ndarray,
+    y: np.ndarray,
+    px: Optional[float] = None,
+    py: Optional[float] = None,
+) -> pd.Series:
+    """Exact p-value for Jaccard similarity.
+
+    Under independence,
+    each position is True in both vectors with probability ``px * py``,
+    and in exactly one with probability ``px + py - 2 * px * py``.
+    The null distribution of the centered similarity is therefore
+    a function of the counts of both categories,
+    which follow a multinomial distribution over the vector length.
+    This enumerates every pair of counts,
+    so the p-value has no Monte-Carlo error.
+    Where no position is True in either vector,
+    the similarity is taken to be its expectation,
+    as in ``similarity``.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    px : Optional[float]
+        The probability of a True in x. Defaults to the mean of x.
+    py : Optional[float]
+        The probability of a True in y. Defaults to the mean of y.
+
+    Returns
+    -------
+    pd.Series
+        The Jaccard similarity and p-value, labelled "J-sim" and "p-val".
+    """
+    j, j_obs, px, py = _observed(x, y, px, py)
+    if _degenerate(x, y, px, py, "Exact test"):
         return pd.Series([j, 1], index=["J-sim", "p-val"])
 
-    j_obs = similarity(x, y, center=True, px=px, py=py)
+    return pd.Series([j, _exact_p(j_obs, len(x), px, py)], index=["J-sim", "p-val"])
 
-    rng = np.random.default_rng(seed)
-    vals = (
-        similarity(
-            rng.choice(x, size=len(x), replace=True, shuffle=False),
-            rng.choice(y, size=len(y), replace=True, shuffle=False),
-            center=True,
+
+def _exact_p(j_obs: float, m: int, px: float, py: float) -> float:
+    """Calculate an exact p-value for an observed centered similarity.
+
+    Parameters
+    ----------
+    j_obs : float
+        The centered similarity that was observed.
+    m : int
+        The length of the vectors.
+    px : float
+        The probability of a True in x.
+    py : float
+        The probability of a True in y.
+
+    Returns
+    -------
+    float
+        The probability of a centered similarity at least as extreme.
+    """
+    # A relative tolerance stops rounding deciding ties, as in scipy's exact tests
+    j_obs = abs(j_obs) * (1 - 1e-7)
+    both = px * py
+    one = px + py - 2 * both
+    expected = both / (px + py - both)
+    log_q = (math.log(both), math.log(one), math.log1p(-both - one))
+
+    b = np.arange(m + 1)
+    log_b = np.array([math.lgamma(k + 1) for k in range(m + 1)])
+    # Each row of outcomes holds about four float64 arrays of length m + 1
+    block = _block_size(4 * 8 * (m + 1), BLOCK_BYTES)
+    p_val = 0.0
+    for start in range(0, m + 1, block):
+        a = np.arange(start, min(start + block, m + 1))[:, None]
+        rest = m - a - b
+        valid = rest >= 0
+        rest = np.where(valid, rest, 0)
+        log_pmf = (
+            log_b[m]
+            - log_b[a]
+            - log_b[b]
+            - log_b[rest]
+            + a * log_q[0]
+            + b * log_q[1]
+            + rest * log_q[2]
         )
-        for _ in range(n)
-    )
-    j_null = np.fromiter(vals, dtype=np.float32, count=n)
-    np.abs(j_null, dtype=np.float32, out=j_null)
-    p_val = (j_null >= np.abs(j_obs)).sum() / n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            j_null = np.where(a + b == 0, expected, a / (a + b)) - expected
+        p_val += float(np.exp(log_pmf[valid & (np.abs(j_null) >= j_obs)]).sum())
+    return min(p_val, 1.0)
+
+
+def asymptotic(
+    x: np.ndarray,
+    y: np.ndarray,
+    px: Optional[float] = None,
+    py: Optional[float] = None,
+) -> pd.Series:
+    """Asymptotic p-value for Jaccard similarity.
+
+    By the delta method,
+    the centered similarity is asymptotically normal with mean 0
+    and variance ``q1 * q2 / (m * (q1 + q2) ** 3)``,
+    where ``q1 = px * py`` is the probability a position is True in both vectors,
+    ``q2 = px + py - 2 * px * py`` that it is True in exactly one,
+    and ``m`` is the vector length.
+    The two-sided p-value is read from the normal distribution.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    px : Optional[float]
+        The probability of a True in x. Defaults to the mean of x.
+    py : Optional[float]
+        The probability of a True in y. Defaults to the mean of y.
+
+    Returns
+    -------
+    pd.Series
+        The Jaccard similarity and p-value, labelled "J-sim" and "p-val".
+    """
+    j, j_obs, px, py = _observed(x, y, px, py)
+    if _degenerate(x, y, px, py, "Asymptotic test"):
+        return pd.Series([j, 1], index=["J-sim", "p-val"])
+
+    p_val = _asymptotic_p(j_obs, len(x), px, py)
     return pd.Series([j, p_val], index=["J-sim", "p-val"])
+
+
+def _asymptotic_p(j_obs: float, m: int, px: float, py: float) -> float:
+    """Calculate an asymptotic p-value for an observed centered similarity.
+
+    Parameters
+    ----------
+    j_obs : float
+        The centered similarity that was observed.
+    m : int
+        The length of the vectors.
+    px : float
+        The probability of a True in x.
+    py : float
+        The probability of a True in y.
+
+    Returns
+    -------
+    float
+        The two-sided p-value from the normal approximation.
+    """
+    both = px * py
+    one = px + py - 2 * both
+    sigma = math.sqrt(both * one / (both + one) ** 3)
+    z = math.sqrt(m) * j_obs / sigma
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def test(
+    x: np.ndarray,
+    y: np.ndarray,
+    method: Literal["bootstrap", "exact", "asymptotic"] = "bootstrap",
+    px: Optional[float] = None,
+    py: Optional[float] = None,
+    n: int = 1000,
+    seed: Seed = 42,
+    sampler: Literal["index", "counts"] = "index",
+    strategy: Literal["fixed", "sequential"] = "fixed",
+    alpha: float = 0.05,
+    h: Optional[int] = None,
+    cache: Optional[NullCache] = None,
+) -> pd.Series:
+    """Test the significance of a Jaccard similarity.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    method : Literal["bootstrap", "exact", "asymptotic"]
+        How to calculate the p-value.
+    px : Optional[float]
+        The probability of a True in x. Defaults to the mean of x.
+    py : Optional[float]
+        The probability of a True in y. Defaults to the mean of y.
+    n : int
+        The number of bootstrap replicates. Ignored unless bootstrapping.
+    seed : Seed
+        The seed for the random number generator. Ignored unless bootstrapping.
+    sampler : Literal["index", "counts"]
+        How to draw bootstrap replicates. Ignored unless bootstrapping.
+    strategy : Literal["fixed", "sequential"]
+        Whether to stop bootstrapping early. Ignored unless bootstrapping.
+    alpha : float
+        The significance level for the sequential strategy.
+    h : Optional[int]
+        The number of exceedances at which the sequential strategy stops.
+    cache : Optional[NullCache]
+        Where to look for nulls of the "counts" sampler.
+
+    Returns
+    -------
+    pd.Series
+        The Jaccard similarity and p-value, labelled "J-sim" and "p-val".
+
+    Raises
+    ------
+    ValueError
+        If method is not recognised.
+    """
+    if method == "bootstrap":
+        return bootstrap(
+            x,
+            y,
+            px=px,
+            py=py,
+            n=n,
+            seed=seed,
+            sampler=sampler,
+            strategy=strategy,
+            alpha=alpha,
+            h=h,
+            cache=cache,
+        )
+    if method == "exact":
+        return exact(x, y, px=px, py=py)
+    if method == "asymptotic":
+        return asymptotic(x, y, px=px, py=py)
+    logger.error(f"Unknown method for the Jaccard test: {method}.", stack_info=True)
+    raise ValueError(f"Unknown method for the Jaccard test: {method}.")
+
+
+def _segment_counts(
+    data: np.ndarray, codes: np.ndarray, pairs: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Count the Trues of column pairs within each group of rows.
+
+    Rows where both columns of a pair are False are not counted,
+    so the length of each group can differ between pairs.
+    The Trues in both columns of every pair of a group are
+    the product of its rows with themselves,
+    so all pairs are counted at once,
+    with the Trues in each column on the diagonal.
+    Each length then follows by inclusion and exclusion.
+    The products are taken in float64,
+    which is exact for groups of fewer than ``2**53`` rows.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        A boolean matrix of rows by columns.
+    codes : np.ndarray
+        The sorted group code of each row.
+    pairs : np.ndarray
+        The ``(pairs, 2)`` positions of the columns to compare.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The first row of each group,
+        and the length of each group with the number of Trues in x, in y, and in both,
+        stacked into an array of shape ``(4, groups, pairs)``.
+    """
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    gram = np.stack(
+        [
+            segment.T @ segment
+            for segment in np.split(data.astype(np.float64), starts[1:])
+        ]
+    ).astype(np.int64)
+    i, j = pairs.T
+    both = gram[:, i, j]
+    tx = gram[:, i, i]
+    ty = gram[:, j, j]
+    return starts, np.stack([tx + ty - both, tx, ty, both])
+
+
+def _group_vectors(
+    data: np.ndarray,
+    pairs: np.ndarray,
+    bounds: np.ndarray,
+    group: np.ndarray,
+    pair: np.ndarray,
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Extract the vectors of each group and pair, without rows where both are False.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        A boolean matrix of rows by columns.
+    pairs : np.ndarray
+        The ``(pairs, 2)`` positions of the columns to compare.
+    bounds : np.ndarray
+        The first row of each group, followed by the number of rows.
+    group : np.ndarray
+        The group to extract.
+    pair : np.ndarray
+        The pair to extract, for each group.
+
+    Returns
+    -------
+    Tuple[List[np.ndarray], List[np.ndarray]]
+        The first and second vector of each group and pair.
+    """
+    xs, ys = [], []
+    for g, p in zip(group, pair, strict=True):
+        xi = data[bounds[g] : bounds[g + 1], pairs[p, 0]]
+        yi = data[bounds[g] : bounds[g + 1], pairs[p, 1]]
+        kept = xi | yi
+        xs.append(xi[kept])
+        ys.append(yi[kept])
+    return xs, ys
+
+
+def _fused_index_p(
+    x: List[np.ndarray],
+    y: List[np.ndarray],
+    j_obs: np.ndarray,
+    n: int,
+    seed: Union[Seed, Sequence[np.random.SeedSequence]],
+    block: Optional[int],
+) -> np.ndarray:
+    """Bootstrap p-values for pairs of vectors that all have the same length.
+
+    Every block of replicates of every pair is evaluated in one kernel call.
+    With a shared seed, every pair would draw the same resample indices,
+    so they are drawn once and applied to all pairs together.
+    Given the stream of each pair,
+    each draws its own indices from its stream,
+    with the same p-value as bootstrapping it alone.
+
+    Parameters
+    ----------
+    x : List[np.ndarray]
+        The first boolean vector of each pair.
+    y : List[np.ndarray]
+        The second boolean vector of each pair.
+    j_obs : np.ndarray
+        The centered similarity observed for each pair.
+    n : int
+        The number of bootstrap replicates.
+    seed : Union[Seed, Sequence[np.random.SeedSequence]]
+        The seed shared by every pair, or the stream of each pair.
+    block : Optional[int]
+        The number of replicates to evaluate at once.
+
+    Returns
+    -------
+    np.ndarray
+        The p-value of each pair.
+    """
+    xs = np.stack(x)
+    ys = np.stack(y)
+    g, m = xs.shape
+    j_obs = np.abs(j_obs)
+    exceed = np.zeros(g, dtype=np.int64)
+    if isinstance(seed, Sequence):
+        if block is None:
+            # Each replicate holds two int64 resample indices and bools per pair
+            block = _block_size(2 * m * g * (8 + 1), BLOCK_BYTES)
+        rngs = [np.random.default_rng(s) for s in seed]
+        for k in _schedule(n, block, block):
+            idx = np.stack([rng.integers(0, m, size=(k, 2, m)) for rng in rngs])
+            exceed += kernels.exceedances_each(xs, ys, idx, j_obs)
+        return exceed / n
+    if block is None:
+        # Each replicate holds two int64 resample indices and a bool per vector
+        block = _block_size(2 * m * (8 + g), BLOCK_BYTES)
+    rng = np.random.default_rng(seed)
+    for k in _schedule(n, block, block):
+        exceed += kernels.exceedances(xs, ys, rng.integers(0, m, size=(k, 2, m)), j_obs)
+    return exceed / n
+
+
+def _bootstrap_many_p(
+    x: List[np.ndarray],
+    y: List[np.ndarray],
+    j_obs: np.ndarray,
+    n: int,
+    seed: Union[int, List[np.random.SeedSequence]],
+    block: Optional[int],
+    sampler: Literal["index", "counts"],
+    strategy: Literal["fixed", "sequential"],
+    alpha: float,
+    h: Optional[int],
+    cache: Optional[NullCache],
+) -> np.ndarray:
+    """Calculate bootstrap p-values for many pairs of vectors.
+
+    Under the "index" sampler and "fixed" strategy,
+    pairs of the same length are bootstrapped together by ``_fused_index_p``.
+    Otherwise, each pair is bootstrapped on its own.
+
+    Parameters
+    ----------
+    x : List[np.ndarray]
+        The first boolean vector of each pair.
+    y : List[np.ndarray]
+        The second boolean vector of each pair.
+    j_obs : np.ndarray
+        The centered similarity observed for each pair.
+    n : int
+        The number of bootstrap replicates.
+    seed : Union[int, List[np.random.SeedSequence]]
+        The seed shared by every pair, or the stream of each pair.
+    block : Optional[int]
+        The number of replicates to evaluate at once.
+    sampler : Literal["index", "counts"]
+        How to draw bootstrap replicates.
+    strategy : Literal["fixed", "sequential"]
+        Whether to stop early once the p-value is settled.
+    alpha : float
+        The significance level for the sequential strategy.
+    h : Optional[int]
+        The number of exceedances at which the sequential strategy stops.
+    cache : Optional[NullCache]
+        Where to look for nulls of the "counts" sampler.
+
+    Returns
+    -------
+    np.ndarray
+        The p-value and number of replicates used for each pair.
+    """
+    results = np.full((len(x), 2), float(n))
+    seeds = [seed] * len(x) if isinstance(seed, int) else seed
+    if sampler == "index" and strategy == "fixed":
+        lengths = np.array([len(v) for v in x])
+        for length in np.unique(lengths):
+            same = np.flatnonzero(lengths == length)
+            results[same, 0] = _fused_index_p(
+                [x[i] for i in same],
+                [y[i] for i in same],
+                j_obs[same],
+                n,
+                seed if isinstance(seed, int) else [seed[i] for i in same],
+                block,
+            )
+        return results
+    for i, (xi, yi) in enumerate(zip(x, y, strict=True)):
+        results[i] = _bootstrap_p(
+            xi, yi, j_obs[i], n, seeds[i], block, sampler, strategy, alpha, h, cache
+        )
+    return results
+
+
+def _streams(
+    seed: int,
+    shared: bool,
+    pair_keys: Sequence[Tuple[str, ...]],
+    group_names: Sequence[str],
+    pair: np.ndarray,
+    code: np.ndarray,
+    stats: np.ndarray,
+) -> List[np.random.SeedSequence]:
+    """Derive the random stream of each group and pair.
+
+    Each stream is keyed by the pair and group it tests,
+    so every test is independent.
+    Under the "counts" sampler,
+    the null depends only on the vector length and the counts of Trues,
+    so these can be ``shared`` as the key instead.
+    Tests with the same statistics then draw the same null,
+    which is only drawn once given a cache.
+
+    Parameters
+    ----------
+    seed : int
+        The seed of the whole run.
+    shared : bool
+        Whether to key streams by the statistics of each test.
+    pair_keys : Sequence[Tuple[str, ...]]
+        A stable key for each pair.
+    group_names : Sequence[str]
+        The name of each group code.
+    pair : np.ndarray
+        The position of the pair of each test.
+    code : np.ndarray
+        The group code of each test.
+    stats : np.ndarray
+        The vector length and counts of Trues of each test.
+
+    Returns
+    -------
+    List[np.random.SeedSequence]
+        The stream of each test.
+    """
+    if shared:
+        return [stream(seed, "counts", *map(int, row)) for row in stats.T]
+    return [
+        stream(seed, *pair_keys[p], group_names[c])
+        for p, c in zip(pair, code, strict=True)
+    ]
+
+
+def bootstrap_many(
+    data: np.ndarray,
+    codes: np.ndarray,
+    pairs: Sequence[Tuple[int, int]],
+    method: Literal["bootstrap", "exact", "asymptotic"] = "bootstrap",
+    n: int = 1000,
+    seed: int = 42,
+    block: Optional[int] = None,
+    sampler: Literal["index", "counts"] = "index",
+    strategy: Literal["fixed", "sequential"] = "fixed",
+    alpha: float = 0.05,
+    h: Optional[int] = None,
+    cache: Optional[NullCache] = None,
+    pair_keys: Optional[Sequence[Tuple[str, ...]]] = None,
+    group_names: Optional[Sequence[str]] = None,
+    share_nulls: bool = False,
+) -> pd.DataFrame:
+    """Test the Jaccard similarity of many column pairs within groups of rows.
+
+    For each pair of columns,
+    rows where both are False are dropped,
+    and the remaining rows are tested group by group,
+    with the same results as calling ``test`` on each.
+    The rows are sorted by group once,
+    and the counts of every pair are taken together by one matrix product per group,
+    which settles the similarities and degenerate groups without a loop over pairs.
+    So testing every pair of k columns costs little more than testing k pairs.
+    Under the "index" sampler and "fixed" strategy,
+    groups of the same length are bootstrapped together,
+    sharing their resample indices.
+    Given ``pair_keys`` and ``group_names``,
+    every group and pair instead draws from its own stream,
+    derived by ``stream`` from ``seed``, the key of the pair, and the name of the group,
+    so its p-value does not depend on what else is tested, or in which order.
+    Given ``share_nulls`` as well,
+    the "counts" sampler keys each stream by the vector length and counts of Trues,
+    so that tests with the same statistics share a null through ``cache``.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        A boolean matrix of rows by columns.
+    codes : np.ndarray
+        The group code of each row. Rows with a negative code are dropped.
+    pairs : Sequence[Tuple[int, int]]
+        The positions of the columns to compare.
+    method : Literal["bootstrap", "exact", "asymptotic"]
+        How to calculate the p-value.
+    n : int
+        The number of bootstrap replicates. Ignored unless bootstrapping.
+    seed : int
+        The seed for the random number generator. Ignored unless bootstrapping.
+    block : Optional[int]
+        The number of replicates to evaluate at once.
+        If not given, it is chosen to keep each block within ``BLOCK_BYTES``.
+    sampler : Literal["index", "counts"]
+        How to draw bootstrap replicates. Ignored unless bootstrapping.
+    strategy : Literal["fixed", "sequential"]
+        Whether to stop bootstrapping early. Ignored unless bootstrapping.
+    alpha : float
+        The significance level for the sequential strategy.
+    h : Optional[int]
+        The number of exceedances at which the sequential strategy stops.
+    cache : Optional[NullCache]
+        Where to look for nulls of the "counts" sampler.
+    pair_keys : Optional[Sequence[Tuple[str, ...]]]
+        A stable key for each pair, such as its lipid set, mode, and condition.
+        If not given, every group and pair is bootstrapped with ``seed`` itself.
+    group_names : Optional[Sequence[str]]
+        The name of each group code. Required with ``pair_keys``.
+    share_nulls : bool
+        Whether tests with the same statistics share a null,
+        under the "counts" sampler with ``pair_keys``.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per pair and group with at least one True,
+        sorted by pair then group.
+        "pair" is the position of the pair in ``pairs``,
+        and "code" is the group code.
+        "J-sim" and "p-val" are as for ``test``,
+        with "n-boot" as well under the sequential strategy.
+
+    Raises
+    ------
+    ValueError
+        If method is not recognised.
+    """
+    if method not in ("bootstrap", "exact", "asymptotic"):
+        logger.error(f"Unknown method for the Jaccard test: {method}.", stack_info=True)
+        raise ValueError(f"Unknown method for the Jaccard test: {method}.")
+    metrics = ["J-sim", "p-val"]
+    if method == "bootstrap" and strategy == "sequential":
+        metrics.append("n-boot")
+
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    if not len(order):
+        empty = {"pair": np.zeros(0, dtype=np.intp), "code": codes[:0]}
+        return pd.DataFrame(empty | {metric: np.zeros(0) for metric in metrics})
+    data = np.asarray(data, dtype=bool)[order]
+    codes = codes[order]
+    columns = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+    starts, sums = _segment_counts(data, codes, columns)
+
+    pair, group = np.nonzero(sums[0].T)
+    m, tx, ty, both = sums[:, group, pair]
+    results = np.zeros((len(group), len(metrics)))
+    results[:, 0] = both / m
+    results[:, 1] = 1
+    degenerate = (tx == 0) | (ty == 0) | (tx == m) | (ty == m)
+    if degenerate.any():
+        logger.warning(
+            f"The Jaccard test is degenerate for {degenerate.sum()} of {len(m)} groups "
+            "as at least one vector is all 1 or all 0."
+        )
+    j_obs = kernels.centered(both, tx, ty, m)
+    todo = np.flatnonzero(~degenerate)
+
+    if method == "bootstrap":
+        xs, ys = _group_vectors(
+            data, columns, np.r_[starts, len(codes)], group[todo], pair[todo]
+        )
+        seeds: Union[int, List[np.random.SeedSequence]] = seed
+        if pair_keys is not None and group_names is not None:
+            seeds = _streams(
+                seed,
+                share_nulls and sampler == "counts",
+                pair_keys,
+                group_names,
+                pair[todo],
+                codes[starts][group[todo]],
+                np.stack([m, tx, ty])[:, todo],
+            )
+        p_vals = _bootstrap_many_p(
+            xs, ys, j_obs[todo], n, seeds, block, sampler, strategy, alpha, h, cache
+        )
+        results[todo, 1:] = p_vals[:, : len(metrics) - 1]
+    else:
+        p_val = _exact_p if method == "exact" else _asymptotic_p
+        for i in todo:
+            results[i, 1] = p_val(j_obs[i], m[i], tx[i] / m[i], ty[i] / m[i])
+
+    tidy = pd.DataFrame(results, columns=metrics)
+    tidy.insert(0, "pair", pair)
+    tidy.insert(1, "code", codes[starts][group])
+    return tidy
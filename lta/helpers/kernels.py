@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""Unchecked numerical kernels for Jaccard similarities.
+
+These do no input validation,
+which is done once by the public functions of ``lta.helpers.jaccard``.
+If numba is installed,
+the kernels that resample and count are compiled loops,
+which never hold the resampled vectors in memory.
+Otherwise,
+they fall back to vectorised NumPy.
+Both backends give bit-identical results.
+
+Attributes
+----------
+BACKEND : Literal["numba", "numpy"]
+    Which implementation of the kernels is active.
+PACK_MIN : int
+    The number of elements above which boolean counts use packed bitsets.
+"""
+
+from typing import Any, Callable, Literal, Tuple, TypeVar, Union, cast
+
+import numpy as np
+
+BACKEND: Literal["numba", "numpy"]
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover
+    BACKEND = "numpy"
+else:
+    BACKEND = "numba"
+
+PACK_MIN = 2**14
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _jit(func: F) -> F:
+    """Compile a kernel if numba is installed.
+
+    Parameters
+    ----------
+    func : F
+        The kernel, written in the subset of Python that numba supports.
+
+    Returns
+    -------
+    F
+        The compiled kernel, or ``func`` unchanged.
+    """
+    if BACKEND == "numba":
+        return cast(F, njit(cache=True, nogil=True)(func))
+    return func
+
+
+def pack(x: np.ndarray) -> np.ndarray:
+    """Pack boolean vectors into uint64 words along the last axis.
+
+    The last axis is zero-padded to a whole number of words,
+    which leaves all popcounts unchanged.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        A boolean array of one or more vectors.
+
+    Returns
+    -------
+    np.ndarray
+        The packed words, with the same leading shape as ``x``.
+    """
+    packed = np.packbits(x, axis=-1)
+    n_bytes = packed.shape[-1]
+    if n_bytes % 8:
+        padded = np.zeros(packed.shape[:-1] + (n_bytes + (-n_bytes % 8),), np.uint8)
+        padded[..., :n_bytes] = packed
+        packed = padded
+    return packed.view(np.uint64)
+
+
+def packed_counts(
+    xw: np.ndarray, yw: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Count intersections and marginals of packed bitsets.
+
+    Parameters
+    ----------
+    xw : np.ndarray
+        The packed words of x, as returned by ``pack``.
+    yw : np.ndarray
+        The packed words of y, as returned by ``pack``.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+        The number of Trues in both, in x, and in y, per vector.
+    """
+    return (
+        np.bitwise_count(xw & yw).sum(axis=-1, dtype=np.int64),
+        np.bitwise_count(xw).sum(axis=-1, dtype=np.int64),
+        np.bitwise_count(yw).sum(axis=-1, dtype=np.int64),
+    )
+
+
+def counts(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Count intersections and marginals of boolean vectors.
+
+    Vectors spanning at least one word are packed into bitsets
+    when there are more than ``PACK_MIN`` elements,
+    which reads an eighth of the memory of the boolean reductions.
+    Smaller inputs are not worth the cost of packing.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        A boolean array of one or more vectors.
+    y : np.ndarray
+        A boolean array of the same shape as x.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+        The number of Trues in both, in x, and in y, per vector.
+    """
+    if x.shape[-1] >= 64 and x.size >= PACK_MIN:
+        return packed_counts(pack(x), pack(y))
+    return (x & y).sum(axis=-1), x.sum(axis=-1), y.sum(axis=-1)
+
+
+@_jit
+def similarity(intersect: int, union: int, px: float, py: float, center: bool) -> float:
+    """Calculate Jaccard similarity from counts.
+
+    Parameters
+    ----------
+    intersect : int
+        The number of positions that are True in both vectors.
+    union : int
+        The number of positions that are True in either vector.
+    px : float
+        The probability of a True in x.
+    py : float
+        The probability of a True in y.
+    center : bool
+        Whether to subtract the expected similarity.
+
+    Returns
+    -------
+    float
+        The similarity, NaN where both probabilities are 0.
+    """
+    denominator = px + py - (px * py)
+    if denominator == 0:
+        return np.nan
+    if union == 0:
+        j = (px * py) / denominator
+    else:
+        j = intersect / union
+    if center:
+        return j - ((px * py) / denominator)
+    return j
+
+
+@_jit
+def centered_similarity(intersect: int, sx: int, sy: int, m: int) -> float:
+    """Calculate centered Jaccard similarity from counts.
+
+    Parameters
+    ----------
+    intersect : int
+        The number of positions that are True in both vectors.
+    sx : int
+        The number of positions that are True in x.
+    sy : int
+        The number of positions that are True in y.
+    m : int
+        The length of the vectors.
+
+    Returns
+    -------
+    float
+        The centered similarity, NaN where both vectors are all False.
+    """
+    return similarity(intersect, sx + sy - intersect, sx / m, sy / m, True)
+
+
+def centered(
+    intersect: np.ndarray, sx: np.ndarray, sy: np.ndarray, m: Union[int, np.ndarray]
+) -> np.ndarray:
+    """Calculate centered Jaccard similarities from arrays of counts.
+
+    The arithmetic mirrors ``similarity`` operation for operation,
+    so that each element is bit-identical to the scalar result.
+    This is already vectorised, so is NumPy under either backend.
+
+    Parameters
+    ----------
+    intersect : np.ndarray
+        The number of positions that are True in both vectors.
+    sx : np.ndarray
+        The number of positions that are True in x.
+    sy : np.ndarray
+        The number of positions that are True in y.
+    m : Union[int, np.ndarray]
+        The length of the vectors.
+
+    Returns
+    -------
+    np.ndarray
+        The centered similarities, NaN where both vectors are all False.
+    """
+    px = sx / m
+    py = sy / m
+    union = sx + sy - intersect
+    denominator = px + py - (px * py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = (px * py) / denominator
+        j = np.where(union == 0, expected, intersect / union)
+    j_centered = j - expected
+    j_centered[denominator == 0] = np.nan
+    return j_centered
+
+
+@_jit
+def _replicate(x: np.ndarray, y: np.ndarray, ix: np.ndarray, iy: np.ndarray) -> float:
+    """Calculate the absolute centered similarity of one bootstrap replicate.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector.
+    y : np.ndarray
+        The second boolean vector.
+    ix : np.ndarray
+        The resample indices of x.
+    iy : np.ndarray
+        The resample indices of y.
+
+    Returns
+    -------
+    float
+        The absolute centered similarity, rounded to float32.
+    """
+    m = len(ix)
+    intersect = sx = sy = 0
+    for i in range(m):
+        xi = x[ix[i]]
+        yi = y[iy[i]]
+        if xi:
+            sx += 1
+        if yi:
+            sy += 1
+        if xi and yi:
+            intersect += 1
+    return float(abs(np.float32(centered_similarity(intersect, sx, sy, m))))
+
+
+@_jit
+def _null_block_loop(x: np.ndarray, y: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """Calculate absolute centered similarities of replicates by looping.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        A matrix of first boolean vectors.
+    y : np.ndarray
+        A matrix of second boolean vectors.
+    idx : np.ndarray
+        The ``(k, 2, m)`` resample indices of x and y.
+
+    Returns
+    -------
+    np.ndarray
+        A float32 matrix of vectors by replicates.
+    """
+    out = np.empty((x.shape[0], idx.shape[0]), np.float32)
+    for p in range(x.shape[0]):
+        for r in range(idx.shape[0]):
+            out[p, r] = _replicate(x[p], y[p], idx[r, 0], idx[r, 1])
+    return out
+
+
+@_jit
+def _exceedances_loop(
+    x: np.ndarray, y: np.ndarray, idx: np.ndarray, j_obs: np.ndarray
+) -> np.ndarray:
+    """Count replicates at least as extreme as observed by looping.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        A matrix of first boolean vectors.
+    y : np.ndarray
+        A matrix of second boolean vectors.
+    idx : np.ndarray
+        The ``(k, 2, m)`` resample indices of x and y.
+    j_obs : np.ndarray
+        The absolute centered similarity observed for each vector.
+
+    Returns
+    -------
+    np.ndarray
+        The number of exceedances for each vector.
+    """
+    out = np.zeros(x.shape[0], np.int64)
+    for p in range(x.shape[0]):
+        for r in range(idx.shape[0]):
+            if _replicate(x[p], y[p], idx[r, 0], idx[r, 1]) >= j_obs[p]:
+                out[p] += 1
+    return out
+
+
+@_jit
+def _exceedances_each_loop(
+    x: np.ndarray, y: np.ndarray, idx: np.ndarray, j_obs: np.ndarray
+) -> np.ndarray:
+    """Count replicates at least as extreme as observed by looping, per vector.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        A matrix of first boolean vectors.
+    y : np.ndarray
+        A matrix of second boolean vectors.
+    idx : np.ndarray
+        The ``(g, k, 2, m)`` resample indices of each pair of vectors.
+    j_obs : np.ndarray
+        The absolute centered similarity observed for each vector.
+
+    Returns
+    -------
+    np.ndarray
+        The number of exceedances for each vector.
+    """
+    out = np.zeros(x.shape[0], np.int64)
+    for p in range(x.shape[0]):
+        for r in range(idx.shape[1]):
+            if _replicate(x[p], y[p], idx[p, r, 0], idx[p, r, 1]) >= j_obs[p]:
+                out[p] += 1
+    return out
+
+
+def null_block(x: np.ndarray, y: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """Calculate absolute centered similarities of a block of bootstrap replicates.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector, or a stack of them.
+    y : np.ndarray
+        The second boolean vector, or a stack of them.
+    idx : np.ndarray
+        The ``(k, 2, m)`` resample indices of x and y.
+
+    Returns
+    -------
+    np.ndarray
+        A float32 array of absolute centered similarities,
+        with replicates along the last axis.
+    """
+    m = x.shape[-1]
+    if BACKEND == "numba":
+        j_null = _null_block_loop(x.reshape(-1, m), y.reshape(-1, m), idx)
+        return j_null.reshape(x.shape[:-1] + (len(idx),))
+    xs = x[..., idx[:, 0]]
+    ys = y[..., idx[:, 1]]
+    j_null = centered(*counts(xs, ys), m).astype(np.float32)
+    return np.abs(j_null, dtype=np.float32, out=j_null)
+
+
+def exceedances(
+    x: np.ndarray, y: np.ndarray, idx: np.ndarray, j_obs: np.ndarray
+) -> np.ndarray:
+    """Count bootstrap replicates at least as extreme as observed.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The first boolean vector, or a stack of them.
+    y : np.ndarray
+        The second boolean vector, or a stack of them.
+    idx : np.ndarray
+        The ``(k, 2, m)`` resample indices of x and y.
+    j_obs : np.ndarray
+        The absolute centered similarity observed for each vector.
+
+    Returns
+    -------
+    np.ndarray
+        The number of exceedances for each vector.
+    """
+    if BACKEND == "numba":
+        m = x.shape[-1]
+        j_flat = np.broadcast_to(j_obs, x.shape[:-1]).reshape(-1).astype(np.float64)
+        hits = _exceedances_loop(x.reshape(-1, m), y.reshape(-1, m), idx, j_flat)
+        return hits.reshape(x.shape[:-1])
+    return (null_block(x, y, idx) >= np.expand_dims(j_obs, -1)).sum(axis=-1)
+
+
+def exceedances_each(
+    x: np.ndarray, y: np.ndarray, idx: np.ndarray, j_obs: np.ndarray
+) -> np.ndarray:
+    """Count bootstrap replicates at least as extreme as observed, per vector.
+
+    Unlike ``exceedances``,
+    each pair of vectors is resampled with its own indices,
+    with the same counts as calling ``exceedances`` on each pair.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        A matrix of first boolean vectors.
+    y : np.ndarray
+        A matrix of second boolean vectors.
+    idx : np.ndarray
+        The ``(g, k, 2, m)`` resample indices of each pair of vectors.
+    j_obs : np.ndarray
+        The absolute centered similarity observed for each vector.
+
+    Returns
+    -------
+    np.ndarray
+        The number of exceedances for each vector.
+    """
+    if BACKEND == "numba":
+        return _exceedances_each_loop(x, y, idx, j_obs.astype(np.float64))
+    xs = np.take_along_axis(x[:, None, :], idx[:, :, 0], axis=-1)
+    ys = np.take_along_axis(y[:, None, :], idx[:, :, 1], axis=-1)
+    j_null = centered(*counts(xs, ys), x.shape[-1]).astype(np.float32)
+    np.abs(j_null, dtype=np.float32, out=j_null)
+    return (j_null >= j_obs[:, None]).sum(axis=-1)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""A cache for bootstrap null distributions.
+
+Under the "counts" sampler,
+the bootstrap null distribution of a Jaccard similarity depends only on
+the vector length,
+the number of Trues in each vector,
+the number of replicates,
+and the seed.
+These repeat constantly across lipid classes, conditions, modes, and lipid sets,
+so when tests share a seed for the same statistics,
+each null is drawn once and reused.
+Otherwise every test has its own seed,
+and the cache only saves drawing nulls again in later runs.
+Nulls are held in memory up to a byte limit,
+evicting the least recently used first,
+and can optionally be stored on disk to be reused by later runs,
+up to a separate byte limit, evicted the same way.
+A null is always drawn whole,
+so the cache is not used by the "sequential" strategy,
+which draws only as many replicates as it needs.
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the sampler or stored layout changes, so old nulls are never read
+_VERSION = 1
+
+Key = Tuple[int, int, int, int, Union[int, str]]
+
+
+@dataclass
+class NullCache:
+    """A least recently used cache of bootstrap null distributions.
+
+    Attributes
+    ----------
+    max_bytes : int
+        The maximum memory to hold in nulls.
+        A null larger than this is never held in memory.
+    directory : Optional[Path]
+        Where to store nulls on disk.
+        If not given, nulls are only held in memory.
+    max_disk_bytes : int
+        The most disk space to take with stored nulls.
+        A null larger than this is never stored.
+    hits : int
+        The number of nulls found in memory.
+    disk_hits : int
+        The number of nulls found on disk.
+    misses : int
+        The number of nulls that had to be drawn.
+    """
+
+    max_bytes: int = 2**28
+    directory: Optional[Path] = None
+    max_disk_bytes: int = 2**30
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    _nulls: "OrderedDict[Key, np.ndarray]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _bytes: int = field(default=0, init=False, repr=False)
+    _stored: "OrderedDict[Path, int]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _disk_bytes: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        """Create the on-disk store, if requested, and list its nulls."""
+        if self.directory is None:
+            return
+        self.directory.mkdir(exist_ok=True, parents=True)
+        stored = [
+            (path.stat().st_mtime, path)
+            for path in self.directory.glob("*.npy")
+            if not path.name.endswith(".partial.npy")
+        ]
+        for _, path in sorted(stored):
+            self._stored[path] = path.stat().st_size
+            self._disk_bytes += self._stored[path]
+
+    def __len__(self) -> int:
+        """Return the number of nulls held in memory.
+
+        Returns
+        -------
+        int
+            The number of nulls held in memory.
+        """
+        return len(self._nulls)
+
+    @property
+    def nbytes(self) -> int:
+        """Return the memory held in nulls.
+
+        Returns
+        -------
+        int
+            The total size of the nulls held in memory, in bytes.
+        """
+        return self._bytes
+
+    def _path(self, key: Key) -> Path:
+        """Return the on-disk location of a null.
+
+        Parameters
+        ----------
+        key : Key
+            The vector length, counts of Trues, replicates, and seed.
+
+        Returns
+        -------
+        Path
+            Where the null is stored.
+        """
+        name = "_".join(map(str, (f"v{_VERSION}", *key)))
+        return Path(self.directory or ".", f"{name}.npy")
+
+    def _hold(self, key: Key, null: np.ndarray) -> None:
+        """Hold a null in memory, evicting the least recently used as needed.
+
+        Parameters
+        ----------
+        key : Key
+            The vector length, counts of Trues, replicates, and seed.
+        null : np.ndarray
+            The null distribution.
+        """
+        if null.nbytes > self.max_bytes:
+            return
+        self._nulls[key] = null
+        self._bytes += null.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._nulls.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def _store(self, path: Path, null: np.ndarray) -> None:
+        """Store a null on disk, evicting the least recently used as needed.
+
+        Parameters
+        ----------
+        path : Path
+            Where to store the null.
+        null : np.ndarray
+            The null distribution.
+        """
+        if null.nbytes > self.max_disk_bytes:
+            return
+        # Write then rename, so concurrent runs never read a partial file
+        partial = path.with_name(f"{path.stem}.{os.getpid()}.partial.npy")
+        np.save(partial, null)
+        partial.replace(path)
+        self._disk_bytes += path.stat().st_size - self._stored.pop(path, 0)
+        self._stored[path] = path.stat().st_size
+        # The new null is last, so is never evicted
+        while self._disk_bytes > self.max_disk_bytes and len(self._stored) > 1:
+            evicted, size = self._stored.popitem(last=False)
+            logger.debug(f"Evicting {evicted.name} from the null cache...")
+            evicted.unlink(missing_ok=True)
+            self._disk_bytes -= size
+
+    def fetch(self, key: Key, draw: Callable[[], np.ndarray]) -> np.ndarray:
+        """Return the null for ``key``, drawing it only if it is not cached.
+
+        Parameters
+        ----------
+        key : Key
+            The vector length, counts of Trues, replicates, and seed.
+        draw : Callable[[], np.ndarray]
+            Draws the null when it is not cached.
+
+        Returns
+        -------
+        np.ndarray
+            The null distribution.
+        """
+        if key in self._nulls:
+            self.hits += 1
+            self._nulls.move_to_end(key)
+            return self._nulls[key]
+        path = self._path(key)
+        if self.directory is not None and path.exists():
+            self.disk_hits += 1
+            null = np.load(path, mmap_mode="r")
+            os.utime(path)
+            if path in self._stored:
+                self._stored.move_to_end(path)
+        else:
+            self.misses += 1
+            null = draw()
+            if self.directory is not None:
+                self._store(path, null)
+        self._hold(key, null)
+        return null
+
+    def log_stats(self) -> None:
+        """Log how often nulls were found in the cache."""
+        logger.info(
+            f"Null cache: {self.hits} hits, {self.disk_hits} disk hits, "
+            f"{self.misses} misses, {len(self)} nulls held in {self.nbytes} bytes."
+        )
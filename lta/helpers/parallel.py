@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""Run Jaccard tests over a pool of processes.
+
+Every lipid set, mode, and condition is tested independently,
+so they can be spread over several processes.
+The boolean matrix of each lipid set and mode is placed in shared memory once,
+and workers read it from there,
+rather than each receiving a pickled copy.
+Every test draws from its own keyed stream,
+so the results are identical to a serial run.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from lta.helpers import jaccard as jac
+from lta.helpers.null_cache import NullCache
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+Pairs = List[Tuple[int, int]]
+Stats = Tuple[int, int, int]
+
+_cache: Optional[NullCache] = None
+
+
+@dataclass(frozen=True)
+class Matrix:
+    """A boolean matrix to test, with the group of each row.
+
+    Attributes
+    ----------
+    data : np.ndarray
+        A boolean matrix of rows by columns.
+    codes : np.ndarray
+        The group code of each row.
+    pairs : Pairs
+        The positions of the columns to compare.
+    pair_keys : Optional[List[Tuple[str, ...]]]
+        A stable key for each pair, from which its random streams are derived.
+    group_names : Optional[List[str]]
+        The name of each group code.
+    """
+
+    data: np.ndarray
+    codes: np.ndarray
+    pairs: Pairs
+    pair_keys: Optional[List[Tuple[str, ...]]] = None
+    group_names: Optional[List[str]] = None
+
+
+@dataclass(frozen=True)
+class Task:
+    """A Jaccard test of some column pairs of a shared matrix.
+
+    Attributes
+    ----------
+    name : str
+        The name of the shared memory holding the matrix.
+    rows : int
+        The number of rows in the matrix.
+    columns : int
+        The number of columns in the matrix.
+    pairs : Pairs
+        The positions of the columns to compare.
+    pair_keys : Optional[List[Tuple[str, ...]]]
+        A stable key for each pair.
+    group_names : Optional[List[str]]
+        The name of each group code.
+    options : Dict[str, Any]
+        Keyword arguments for ``jaccard.bootstrap_many``.
+    """
+
+    name: str
+    rows: int
+    columns: int
+    pairs: Pairs
+    pair_keys: Optional[List[Tuple[str, ...]]]
+    group_names: Optional[List[str]]
+    options: Dict[str, Any]
+
+
+def _views(shm: SharedMemory, rows: int, columns: int) -> Tuple[np.ndarray, np.ndarray]:
+    """View shared memory as a boolean matrix and its group codes.
+
+    The codes come first, so that they are aligned.
+
+    Parameters
+    ----------
+    shm : SharedMemory
+        The shared memory.
+    rows : int
+        The number of rows in the matrix.
+    columns : int
+        The number of columns in the matrix.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The boolean matrix and the group code of each row.
+    """
+    codes = np.ndarray((rows,), dtype=np.int64, buffer=shm.buf)
+    data = np.ndarray((rows, columns), dtype=bool, buffer=shm.buf, offset=8 * rows)
+    return data, codes
+
+
+def share(data: np.ndarray, codes: np.ndarray) -> SharedMemory:
+    """Copy a boolean matrix and its group codes into shared memory.
+
+    The caller is responsible for closing and unlinking the shared memory.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        A boolean matrix of rows by columns.
+    codes : np.ndarray
+        The group code of each row.
+
+    Returns
+    -------
+    SharedMemory
+        The shared memory holding both.
+    """
+    rows, columns = data.shape
+    shm = SharedMemory(create=True, size=max(1, rows * (8 + columns)))
+    shared_data, shared_codes = _views(shm, rows, columns)
+    shared_data[:] = data
+    shared_codes[:] = codes
+    return shm
+
+
+def _init_worker(cache: Optional[NullCache]) -> None:
+    """Give a worker its own cache of bootstrap nulls.
+
+    Parameters
+    ----------
+    cache : Optional[NullCache]
+        The cache to copy into the worker.
+    """
+    global _cache
+    _cache = cache
+
+
+def _stats(cache: Optional[NullCache]) -> Stats:
+    """Read how often a cache has found nulls so far.
+
+    Parameters
+    ----------
+    cache : Optional[NullCache]
+        The cache, if any.
+
+    Returns
+    -------
+    Stats
+        The hits, disk hits, and misses of the cache, or zeros without one.
+    """
+    if cache is None:
+        return 0, 0, 0
+    return cache.hits, cache.disk_hits, cache.misses
+
+
+def _test(shm: SharedMemory, task: Task) -> Tuple[pd.DataFrame, Stats]:
+    """Run a task on shared memory.
+
+    The views of the shared memory are released on return,
+    so that it can be closed.
+
+    Parameters
+    ----------
+    shm : SharedMemory
+        The shared memory holding the matrix.
+    task : Task
+        The task to run.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, Stats]
+        The results of ``jaccard.bootstrap_many``,
+        and the hits, disk hits, and misses of the worker's cache during the task.
+    """
+    data, codes = _views(shm, task.rows, task.columns)
+    before = _stats(_cache)
+    result = jac.bootstrap_many(
+        data,
+        codes,
+        task.pairs,
+        cache=_cache,
+        pair_keys=task.pair_keys,
+        group_names=task.group_names,
+        **task.options,
+    )
+    hits, disk_hits, misses = (
+        after - start for after, start in zip(_stats(_cache), before, strict=True)
+    )
+    return result, (hits, disk_hits, misses)
+
+
+def run_task(task: Task) -> Tuple[pd.DataFrame, Stats]:
+    """Attach to shared memory and run a task.
+
+    Parameters
+    ----------
+    task : Task
+        The task to run.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, Stats]
+        The results of ``jaccard.bootstrap_many``,
+        and the hits, disk hits, and misses of the worker's cache during the task.
+    """
+    shm = SharedMemory(name=task.name)
+    try:
+        return _test(shm, task)
+    finally:
+        shm.close()
+
+
+def run_tests(
+    matrices: Dict[K, Matrix],
+    jobs: int = 1,
+    cache: Optional[NullCache] = None,
+    **options: Any,  # noqa: ANN401
+) -> Dict[K, pd.DataFrame]:
+    """Test the Jaccard similarities of several matrices.
+
+    With more than one job,
+    every column pair of every matrix is a separate task,
+    and each worker has its own copy of ``cache``,
+    whose hits and misses are added to ``cache`` once the tasks are done.
+    The results are identical either way.
+
+    Parameters
+    ----------
+    matrices : Dict[K, Matrix]
+        The boolean matrices to test.
+    jobs : int
+        The number of processes to use.
+    cache : Optional[NullCache]
+        Where to look for nulls of the "counts" sampler.
+    **options : Any
+        Keyword arguments for ``jaccard.bootstrap_many``.
+
+    Returns
+    -------
+    Dict[K, pd.DataFrame]
+        The results of ``jaccard.bootstrap_many`` for each matrix.
+
+    Raises
+    ------
+    ValueError
+        If jobs is less than 1.
+    """
+    if jobs < 1:
+        logger.error(f"At least one job is needed, not {jobs}.", stack_info=True)
+        raise ValueError(f"At least one job is needed, not {jobs}.")
+    if jobs == 1 or not matrices:
+        return {
+            key: jac.bootstrap_many(
+                matrix.data,
+                matrix.codes,
+                matrix.pairs,
+                cache=cache,
+                pair_keys=matrix.pair_keys,
+                group_names=matrix.group_names,
+                **options,
+            )
+            for key, matrix in matrices.items()
+        }
+
+    shared: List[SharedMemory] = []
+    keys: List[K] = []
+    tasks: List[Task] = []
+    try:
+        for key, matrix in matrices.items():
+            shm = share(matrix.data, matrix.codes)
+            shared.append(shm)
+            rows, columns = matrix.data.shape
+            for i in range(len(matrix.pairs)) or [0]:
+                pair_keys = matrix.pair_keys and matrix.pair_keys[i : i + 1]
+                task = Task(
+                    shm.name,
+                    rows,
+                    columns,
+                    matrix.pairs[i : i + 1],
+                    pair_keys,
+                    matrix.group_names,
+                    options,
+                )
+                keys.append(key)
+                tasks.append(task)
+        logger.debug(f"Running {len(tasks)} Jaccard tasks over {jobs} processes...")
+        with ProcessPoolExecutor(
+            min(jobs, len(tasks)), initializer=_init_worker, initargs=(cache,)
+        ) as pool:
+            done = list(pool.map(run_task, tasks))
+    finally:
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+    results = [result for result, _ in done]
+    if cache is not None:
+        hits, disk_hits, misses = np.sum([stats for _, stats in done], axis=0)
+        cache.hits += int(hits)
+        cache.disk_hits += int(disk_hits)
+        cache.misses += int(misses)
+
+    frames: Dict[K, List[pd.DataFrame]] = {key: [] for key in matrices}
+    for key, result in zip(keys, results, strict=True):
+        result["pair"] = len(frames[key])
+        frames[key].append(result)
+    return {key: pd.concat(parts, ignore_index=True) for key, parts in frames.items()}
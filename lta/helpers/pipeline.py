@@ -3,23 +3,171 @@
 
 import itertools
 import logging
-from dataclasses import dataclass
+from dataclasses import KW_ONLY, dataclass
 from pathlib import Path
-from typing import Dict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
+import numpy as np
 import pandas as pd
 
 import lta.helpers.data_handling as dh
-from lta.helpers import jaccard as jac
-from lta.helpers import utils
+from lta.helpers import parallel, tables, utils
+from lta.helpers.input_cache import InputCache
+from lta.helpers.null_cache import NullCache
 
 logger = logging.getLogger(__name__)
 
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+W = TypeVar("W")
+
+
+@dataclass
+class Results:
+    """The results of the pipeline for some lipids, before they are written.
+
+    Attributes
+    ----------
+    enfc : Dict[str, Dict[str, pd.DataFrame]]
+        The ENFC of each condition and mode, as tables of lipids by compartments.
+    class_enfc : Dict[str, Dict[str, pd.DataFrame]]
+        As ``enfc``, for lipid classes.
+    enfc_pairs : Dict[str, pd.DataFrame]
+        The ENFC between every pair of conditions of each mode, as long tables.
+        Empty unless every pair of conditions is compared.
+    class_enfc_pairs : Dict[str, pd.DataFrame]
+        As ``enfc_pairs``, for lipid classes.
+    lipids : Dict[str, Dict[str, pd.DataFrame]]
+        Keys are groups of lipids, such as A-lipids,
+        then their compartments and mode.
+        Values are the tables of lipids in each condition.
+    jaccard : Dict[str, Dict[Tuple[str, str], Dict[str, pd.DataFrame]]]
+        The Jaccard similarity of each group of lipids, as from ``_jaccard_pairs``.
+    compartment_jaccard : Dict[Tuple[Hashable, ...], pd.DataFrame]
+        The Jaccard similarity of each mode, condition, and pair of compartments.
+        Empty unless compartments are compared.
+    """
+
+    enfc: Dict[str, Dict[str, pd.DataFrame]]
+    class_enfc: Dict[str, Dict[str, pd.DataFrame]]
+    enfc_pairs: Dict[str, pd.DataFrame]
+    class_enfc_pairs: Dict[str, pd.DataFrame]
+    lipids: Dict[str, Dict[str, pd.DataFrame]]
+    jaccard: Dict[str, Dict[Tuple[str, str], Dict[str, pd.DataFrame]]]
+    compartment_jaccard: Dict[Tuple[Hashable, ...], pd.DataFrame]
+
+
+@dataclass
+class Prepared:
+    """The lipids, once their samples are reduced, ready to be analysed.
+
+    Attributes
+    ----------
+    binary : Dict[Hashable, pd.DataFrame]
+        The binary data of each mode, from ``dh.binarize``.
+    moments : Dict[str, dh.Moments]
+        The moments of the lipids kept in ``binary``, for each mode.
+    class_moments : Dict[str, dh.Moments]
+        As ``moments``, for lipid classes.
+    """
+
+    binary: Dict[Hashable, pd.DataFrame]
+    moments: Dict[str, dh.Moments]
+    class_moments: Dict[str, dh.Moments]
+
+    def take(self, lipids: pd.Index) -> "Prepared":
+        """Keep some lipids, with their classes.
+
+        Every lipid is reduced on its own,
+        so these are as if only those lipids had been read,
+        as long as no class is split.
+
+        Parameters
+        ----------
+        lipids : pd.Index
+            The lipids to keep.
+
+        Returns
+        -------
+        Prepared
+            The lipids kept.
+        """
+        classes = lipids.get_level_values("Category")
+        return Prepared(
+            {mode: df.loc[df.index.isin(lipids)] for mode, df in self.binary.items()},
+            {mode: m.take(m.index.isin(lipids)) for mode, m in self.moments.items()},
+            {
+                mode: m.take(m.index.isin(classes))
+                for mode, m in self.class_moments.items()
+            },
+        )
+
+
+def _concat(frames: List[pd.DataFrame], order: pd.Index) -> pd.DataFrame:
+    """Join the rows of tables from several shards, in their original order.
+
+    Empty tables are only kept if every table is empty.
+
+    Parameters
+    ----------
+    frames : List[pd.DataFrame]
+        The tables, whose first index levels are labels of ``order``.
+    order : pd.Index
+        The rows in their original order.
+
+    Returns
+    -------
+    pd.DataFrame
+        The joined table.
+    """
+    frames = [df for df in frames if not df.empty] or frames[:1]
+    joined = pd.concat(frames) if len(frames) > 1 else frames[0]
+    labels = joined.index
+    if labels.nlevels > order.nlevels:
+        labels = labels.droplevel(list(range(order.nlevels, labels.nlevels)))
+    return joined.iloc[np.argsort(order.get_indexer(labels), kind="stable")]
+
+
+def _merge(parts: List[Dict[K, V]], merge: Callable[[List[V]], W]) -> Dict[K, W]:
+    """Merge dictionaries from several shards.
+
+    Keys are kept in the order they first appear,
+    and the values under each key are merged by ``merge``.
+
+    Parameters
+    ----------
+    parts : List[Dict[K, V]]
+        The dictionary of each shard.
+    merge : Callable[[List[V]], W]
+        Merges the values of a key, such as ``_concat`` or another ``_merge``.
+
+    Returns
+    -------
+    Dict[K, W]
+        The merged dictionary.
+    """
+    keys = dict.fromkeys(key for part in parts for key in part)
+    return {key: merge([part[key] for part in parts if key in part]) for key in keys}
+
 
 @dataclass
 class Pipeline:
     """The Lipid Traffic Analysis pipeline.
 
+    Every option after ``save_align_files`` is keyword-only,
+    so that options of the same type can never be passed in the wrong order.
+
     Attributes
     ----------
     file : Path
@@ -43,6 +191,67 @@ class Pipeline:
         The fraction of samples that are 0 above which a lipid will be called 0 for a compartment.
     n : int
         Number of bootstrap replicates.
+    save_align_files : bool
+        Whether to save the Jaccard similarities for each condition.
+    method : Literal["bootstrap", "exact", "asymptotic"]
+        How to calculate Jaccard p-values.
+    sampler : Literal["index", "counts"]
+        How to draw bootstrap replicates.
+    strategy : Literal["fixed", "sequential"]
+        Whether to stop bootstrapping once the p-value is settled.
+    alpha : float
+        The significance level for the sequential strategy.
+    exceedances : Optional[int]
+        The number of exceedances at which the sequential strategy stops.
+    null_cache_size : Optional[int]
+        The memory, in MiB, for holding shared bootstrap nulls.
+        Only used with ``share_nulls``.
+        If not given, 256 MiB.
+    null_cache_dir : Optional[Path]
+        Where to store bootstrap nulls on disk, for reuse by later runs.
+        Nulls are only cached by the "counts" sampler with the "fixed" strategy.
+    null_cache_disk_size : int
+        The disk space, in MiB, for stored bootstrap nulls.
+    share_nulls : bool
+        Whether tests with the same statistics share a null under the "counts" sampler,
+        rather than each drawing its own.
+        Nulls are only held in memory when shared.
+    jobs : int
+        The number of processes for the Jaccard tests.
+    seed : int
+        The seed from which every bootstrap draws its own random stream.
+    network : Optional[Path]
+        An edge list of adjacent compartments.
+        If given, B- and N-lipids are only found for connected compartments.
+    all_pairs : bool
+        Whether to also write the ENFC and Jaccard similarity
+        between every pair of conditions.
+    compartment_jaccard : bool
+        Whether to also write the Jaccard similarity between every pair of compartments,
+        per condition.
+    column_chunk : Optional[int]
+        The number of samples to read at a time.
+        If not given, the whole data is read into memory.
+    row_chunk : Optional[int]
+        The number of lipids to analyse at a time,
+        in shards of whole categories.
+        If not given, every lipid is analysed at once.
+    modes : Optional[List[str]]
+        The lipidomics modes to analyse.
+        If not given, every mode is analysed.
+    compartments : Optional[List[str]]
+        The compartments to analyse.
+        If not given, every compartment is analysed.
+    groups : Optional[List[str]]
+        The experimental conditions to analyse, including the control.
+        If not given, every condition is analysed.
+    input_cache_dir : Optional[Path]
+        Where to store the parsed data file, for reuse by later runs.
+        If not given, the file is parsed every run.
+    input_cache_size : int
+        The disk space, in MiB, for stored data files.
+    refresh_input_cache : bool
+        Whether to parse the data file again, replacing any stored copy.
     """
 
     file: Path
@@ -56,6 +265,29 @@ class Pipeline:
     thresh: float
     n: int
     save_align_files: bool
+    _: KW_ONLY
+    method: Literal["bootstrap", "exact", "asymptotic"] = "bootstrap"
+    sampler: Literal["index", "counts"] = "index"
+    strategy: Literal["fixed", "sequential"] = "fixed"
+    alpha: float = 0.05
+    exceedances: Optional[int] = None
+    null_cache_size: Optional[int] = None
+    null_cache_dir: Optional[Path] = None
+    null_cache_disk_size: int = 1024
+    share_nulls: bool = False
+    jobs: int = 1
+    seed: int = 42
+    network: Optional[Path] = None
+    all_pairs: bool = False
+    compartment_jaccard: bool = False
+    column_chunk: Optional[int] = None
+    row_chunk: Optional[int] = None
+    modes: Optional[List[str]] = None
+    compartments: Optional[List[str]] = None
+    groups: Optional[List[str]] = None
+    input_cache_dir: Optional[Path] = None
+    input_cache_size: int = 4096
+    refresh_input_cache: bool = False
 
     def __post_init__(self) -> None:
         """Post-process parameters.
@@ -64,9 +296,16 @@ class Pipeline:
         The post-init method allows for much of the processing normally required.
         Several things happen here.
         The file is read into a dataframe,
-        which is split by ``Mode``,
-        and stored twice as binary data (for Switch Analysis)
-        and filtered counts (for ENFC Analysis).
+        which is reduced by ``self._reduce`` to binary data and moments,
+        and then dropped.
+        Given ``self.column_chunk``,
+        the file is instead streamed by ``self._stream``,
+        and the whole data never held at once.
+        These are prepared by ``self._prepare``,
+        or, given ``self.row_chunk``,
+        split into shards of whole lipid categories to be prepared in turn.
+        Only the samples of ``self.modes``, ``self.compartments``, and ``self.groups``
+        are read.
         Any sample which contains all 0-values is dropped.
         Should the file not exist,
         not contain any data,
@@ -83,18 +322,13 @@ class Pipeline:
         pd.errors.EmptyDataError
             If there is no data in self.file.
         """
+        self.filters = self._filters()
         try:
             logger.debug(f"Reading data from {self.file}...")
-            data = dh.construct_df(
-                self.file,
-                self.n_rows_metadata,
-                [self.mode, self.level, self.compartment, self.sample_id],
-                index_names=["Lipid", "Category", "m/z"],
-                index_col=[0, 1, 2],
-                header=None,
-            ).pipe(
-                lambda x: x.loc[:, x.any()]
-            )  # Drop all-0 samples
+            if self.column_chunk is None:
+                samples, prepared = self._reduce(self._read())
+            else:
+                samples, prepared = self._stream(self.column_chunk)
         except FileNotFoundError:
             logger.exception(f"{self.file} does not exist. A full traceback follows...")
             raise
@@ -106,35 +340,352 @@ class Pipeline:
                 f"{self.file} contains no data. A full traceback follows..."
             )
             raise
-        logger.debug("Binarizing data...")
-        self.binary = {
-            group: dh.not_zero(
-                df,
-                axis="columns",
-                level=self.level,
-                compartment=self.compartment,
-                thresh=self.thresh,
-            )
-            for group, df in data.groupby(axis="columns", level=self.mode)
-        }
-        logger.debug("Filtering data...")
-        self.filtered = {
-            group: df.loc[self.binary[group].index, :]
-            for group, df in data.groupby(axis="columns", level=self.mode)
-        }
+        self.edges = self._read_network(samples)
         Path(self.output, "enfc").mkdir(exist_ok=True, parents=True)
-        if self.save_align_files:
+        if self.save_align_files or self.all_pairs or self.compartment_jaccard:
             Path(self.output, "jaccard").mkdir(exist_ok=True, parents=True)
 
-        conditions = [
-            df.columns.get_level_values(self.level).unique()
-            for df in self.filtered.values()
-        ]
+        self.null_cache = self._null_cache()
+
+        conditions = (
+            pd.Series(samples.get_level_values(self.level))
+            .groupby(samples.get_level_values(self.mode))
+            .unique()
+        )
         self.conditions = [
             val for mode in conditions for val in mode if val != self.control
         ]
 
-    def _calculate_enfc(self) -> Dict[str, Dict[str, pd.DataFrame]]:
+        self.shards: Optional[List[np.ndarray]] = None
+        if self.row_chunk is None:
+            self._prepare(prepared)
+        else:
+            self.prepared = prepared
+            self.shards = dh.shards(self.rows, level="Category", size=self.row_chunk)
+
+    def _null_cache(self) -> Optional[NullCache]:
+        """Make the cache of bootstrap nulls, if any are cached.
+
+        Returns
+        -------
+        Optional[NullCache]
+            The cache, or None if no nulls are cached.
+        """
+        if self.share_nulls and self.sampler != "counts":
+            logger.warning("Bootstrap nulls are only shared by the 'counts' sampler.")
+        cached = self.sampler == "counts" and self.strategy == "fixed"
+        # Unless shared, every null is drawn once per run, so is not held
+        held = cached and self.share_nulls
+        if self.null_cache_size is not None and not held:
+            logger.warning(
+                "The null cache size is ignored, as bootstrap nulls are only held "
+                "in memory when shared by the 'counts' sampler "
+                "with the 'fixed' strategy."
+            )
+        if cached and (self.share_nulls or self.null_cache_dir is not None):
+            size = 256 if self.null_cache_size is None else self.null_cache_size
+            size = size if held else 0
+            return NullCache(
+                size * 2**20, self.null_cache_dir, self.null_cache_disk_size * 2**20
+            )
+        if self.null_cache_dir is not None:
+            logger.warning(
+                "Bootstrap nulls are only cached by the 'counts' sampler "
+                "with the 'fixed' strategy. Nothing will be stored in "
+                f"{self.null_cache_dir}."
+            )
+        return None
+
+    def _read(self) -> pd.DataFrame:
+        """Read the data file, or its stored copy from ``self.input_cache_dir``.
+
+        All-0 samples are dropped before a copy is stored,
+        so that a stored copy is used as it is mapped,
+        rather than copied into memory to drop them.
+
+        Returns
+        -------
+        pd.DataFrame
+            The data of every lipid and sample, without all-0 samples.
+        """
+        options: Dict[str, Any] = {
+            "n_rows": self.n_rows_metadata,
+            "metadata": [self.mode, self.level, self.compartment, self.sample_id],
+            "index_names": ["Lipid", "Category", "m/z"],
+            "filters": self.filters,
+            "drop_zero_samples": True,
+        }
+
+        def read() -> pd.DataFrame:
+            data = dh.construct_df(
+                self.file,
+                options["n_rows"],
+                options["metadata"],
+                index_names=options["index_names"],
+                filters=options["filters"],
+                index_col=[0, 1, 2],
+                header=None,
+            )
+            return data.loc[:, data.any()]
+
+        if self.input_cache_dir is None:
+            return read()
+        cache = InputCache(
+            self.input_cache_dir,
+            self.input_cache_size * 2**20,
+            refresh=self.refresh_input_cache,
+        )
+        return cache.fetch(self.file, options, read)
+
+    def _filters(self) -> Dict[str, List[str]]:
+        """Collect the samples to analyse, by their metadata.
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            Keys are metadata rows, values are the values to keep from that row.
+
+        Raises
+        ------
+        ValueError
+            If ``self.groups`` leaves out the control condition.
+        """
+        if self.groups is not None and self.control not in self.groups:
+            logger.error(
+                f"The control condition {self.control} must be one of the groups "
+                f"analysed, not only {self.groups}.",
+                stack_info=True,
+            )
+            raise ValueError(
+                f"The control condition {self.control} must be one of the groups "
+                f"analysed, not only {self.groups}."
+            )
+        filters = {
+            self.mode: self.modes,
+            self.compartment: self.compartments,
+            self.level: self.groups,
+        }
+        return {row: values for row, values in filters.items() if values is not None}
+
+    def _read_network(self, columns: pd.Index) -> Optional[List[Tuple[str, str]]]:
+        """Read ``self.network``, warning of compartments that are not in the data.
+
+        Parameters
+        ----------
+        columns : pd.Index
+            The samples of the data.
+
+        Returns
+        -------
+        Optional[List[Tuple[str, str]]]
+            The pairs of adjacent compartments, or None if there is no network.
+        """
+        if self.network is None:
+            return None
+        logger.debug(f"Reading compartment network from {self.network}...")
+        edges = dh.read_network(self.network)
+        known = {str(c) for c in columns.get_level_values(self.compartment)}
+        unknown = sorted({c for edge in edges for c in edge} - known)
+        if unknown:
+            logger.warning(
+                f"Compartments in {self.network} are not in the data: {unknown}."
+            )
+        return edges
+
+    def _reduce(self, data: pd.DataFrame) -> Tuple[pd.Index, Prepared]:
+        """Binarize and filter lipid data, and reduce it to moments.
+
+        The data is reduced twice,
+        to binary data (for Switch Analysis)
+        and to the moments of the filtered counts (for ENFC Analysis),
+        both split by ``Mode``.
+        The lipids are kept in ``self.rows``,
+        and their rollup into classes in ``self.categories``.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The lipid data, without all-0 samples.
+
+        Returns
+        -------
+        Tuple[pd.Index, Prepared]
+            The samples, and the binary data and moments of every lipid.
+        """
+        self.rows = data.index
+        self.categories = dh.rollup(self.rows, level="Category")
+        logger.debug("Binarizing data...")
+        binary = dh.binarize(
+            data,
+            mode=self.mode,
+            level=self.level,
+            compartment=self.compartment,
+            thresh=self.thresh,
+        )
+        logger.debug("Filtering data...")
+        filtered = {
+            group: df.loc[binary[group].index, :]
+            for group, df in data.groupby(axis="columns", level=self.mode)
+        }
+        return data.columns, Prepared(
+            binary,
+            self._moments(filtered),
+            self._moments(
+                {mode: self.categories.apply(df) for mode, df in filtered.items()}
+            ),
+        )
+
+    def _stream(self, chunk: int) -> Tuple[pd.Index, Prepared]:
+        """Binarize lipid data, and reduce it to moments, a chunk of samples at a time.
+
+        As ``self._reduce``,
+        but the samples are read from disk ``chunk`` at a time, in two passes:
+        one counts the zeros of each group for the binary data,
+        and the other finds the moments of the lipids kept.
+        So only one chunk of samples is held at once,
+        and the moments match ``self._moments`` to floating-point tolerance.
+
+        Parameters
+        ----------
+        chunk : int
+            The number of samples to read at a time.
+
+        Returns
+        -------
+        Tuple[pd.Index, Prepared]
+            The samples, and the binary data and moments of every lipid.
+        """
+        if self.input_cache_dir is not None:
+            logger.warning(
+                "Streamed samples are read from the data file, "
+                f"not from {self.input_cache_dir}."
+            )
+        if not tables.is_table(self.file):
+            logger.warning(
+                f"{self.file} is parsed whole twice for every {chunk} samples. "
+                "Convert it with lta convert to stream it faster."
+            )
+        logger.debug("Binarizing data...")
+        running = dh.RunningBinary(self.mode, self.level, self.compartment, self.thresh)
+        samples = []
+        for df in self._read_chunks(chunk):
+            running.update(df)
+            samples.append(df.columns)
+        binary = running.finalize()
+        self.rows = running.index if running.index is not None else pd.Index([])
+        self.categories = dh.rollup(self.rows, level="Category")
+        lipids = {str(mode): df.index for mode, df in binary.items()}
+        return samples[0].append(samples[1:]), Prepared(
+            binary, *self._stream_moments(chunk, lipids)
+        )
+
+    def _prepare(self, prepared: Prepared) -> None:
+        """Hold prepared lipids, ready to be analysed.
+
+        Parameters
+        ----------
+        prepared : Prepared
+            The lipids to analyse.
+        """
+        self.binary = prepared.binary
+        self.moments = prepared.moments
+        self.class_moments = prepared.class_moments
+        self.presence = {
+            mode: dh.presence(df, compartment=self.compartment, level=self.level)
+            for mode, df in self.binary.items()
+        }
+        self.neighbours: Optional[Dict[Hashable, np.ndarray]] = None
+        if self.edges is not None:
+            self.neighbours = {
+                mode: dh.adjacency(self.edges, p.compartments)
+                for mode, p in self.presence.items()
+            }
+
+    def _moments(self, data: Dict[str, pd.DataFrame]) -> Dict[str, dh.Moments]:
+        """Calculate the moments of every compartment and condition of each mode.
+
+        Parameters
+        ----------
+        data : Dict[str, pd.DataFrame]
+            Keys are modes, values are the lipid data.
+
+        Returns
+        -------
+        Dict[str, dh.Moments]
+            Keys are modes, values are the moments of the lipid data.
+        """
+        return {
+            mode: dh.moments(df, compartment=self.compartment, level=self.level)
+            for mode, df in data.items()
+        }
+
+    def _read_chunks(self, chunk: int) -> Iterator[pd.DataFrame]:
+        """Read the data file a chunk of samples at a time.
+
+        Parameters
+        ----------
+        chunk : int
+            The number of samples to read at a time.
+
+        Yields
+        ------
+        pd.DataFrame
+            The data of each chunk of samples, without all-0 samples.
+        """
+        chunks = dh.read_column_chunks(
+            self.file,
+            self.n_rows_metadata,
+            [self.mode, self.level, self.compartment, self.sample_id],
+            chunk,
+            index_names=["Lipid", "Category", "m/z"],
+            filters=self.filters,
+            index_col=[0, 1, 2],
+            header=None,
+        )
+        for samples in chunks:
+            yield samples.loc[:, samples.any()]  # Drop all-0 samples
+
+    def _stream_moments(
+        self, chunk: int, lipids: Dict[str, pd.Index]
+    ) -> Tuple[Dict[str, dh.Moments], Dict[str, dh.Moments]]:
+        """Calculate the moments of each mode from chunks of samples read from disk.
+
+        Each chunk updates the moments of the lipids and of their classes,
+        so the file is only read once for both.
+
+        Parameters
+        ----------
+        chunk : int
+            The number of samples to read at a time.
+        lipids : Dict[str, pd.Index]
+            Keys are modes, values are the lipids kept by binarizing.
+
+        Returns
+        -------
+        Tuple[Dict[str, dh.Moments], Dict[str, dh.Moments]]
+            Keys are modes,
+            values are the moments of the lipids and of their classes.
+        """
+        logger.debug("Calculating moments...")
+        running = {
+            mode: dh.RunningMoments(self.compartment, self.level) for mode in lipids
+        }
+        classes = {
+            mode: dh.RunningMoments(self.compartment, self.level) for mode in lipids
+        }
+        for samples in self._read_chunks(chunk):
+            for mode, df in samples.groupby(axis="columns", level=self.mode):
+                df = df.loc[lipids[mode], :]
+                running[mode].update(df)
+                classes[mode].update(self.categories.apply(df))
+        return (
+            {mode: r.finalize() for mode, r in running.items()},
+            {mode: r.finalize() for mode, r in classes.items()},
+        )
+
+    def _calculate_enfc(
+        self, moments: Optional[Dict[str, dh.Moments]] = None
+    ) -> Dict[str, Dict[str, pd.DataFrame]]:
         """Calculate error-normalised fold change.
 
         Calculates the ENFC for each compartment across modes.
@@ -143,6 +694,15 @@ class Pipeline:
         This will report fold-change as
         ``condition / self.control`` for all conditions
         except control within self.value.
+        The moments of every compartment and condition of a mode are
+        calculated once,
+        and shared by all of the conditions.
+
+        Parameters
+        ----------
+        moments : Optional[Dict[str, dh.Moments]]
+            Keys are modes, values are the moments of the lipid data.
+            If not given, ``self.moments``.
 
         Returns
         -------
@@ -151,20 +711,38 @@ class Pipeline:
             mapped to a dictionary of modes and ENFC results
         """
         logger.info("Calculating ENFC...")
+        conditions = list(dict.fromkeys(self.conditions))
+        if moments is None:
+            moments = self.moments
+        enfcs = {
+            mode: dh.enfcs(m, conditions, self.control) for mode, m in moments.items()
+        }
         enfc = {
-            group: {
-                mode: df.groupby(axis="columns", level=self.compartment).agg(
-                    dh.enfc,
-                    axis="columns",
-                    level=self.level,
-                    order=(group, self.control),
-                )
-                for mode, df in self.filtered.items()
-            }
-            for group in self.conditions
+            group: {mode: results[group] for mode, results in enfcs.items()}
+            for group in conditions
         }
         return enfc
 
+    def _connected(self, mode: Hashable, mask: int) -> bool:
+        """Check whether compartments are connected in ``self.network``.
+
+        Parameters
+        ----------
+        mode : Hashable
+            The lipidomics mode, which fixes the bits of each compartment.
+        mask : int
+            The bitmask of the compartments.
+
+        Returns
+        -------
+        bool
+            Whether the compartments are connected,
+            or True if there is no network.
+        """
+        if self.neighbours is None:
+            return True
+        return dh.connected(mask, self.neighbours[mode])
+
     def _get_a_lipids(self) -> Dict[str, pd.DataFrame]:
         """Extract A-lipids from the dataset.
 
@@ -181,11 +759,11 @@ class Pipeline:
         logger.info("Calculating A-lipids...")
         results = {
             f"a_{mode}": (
-                df.groupby(axis="columns", level=self.level)
-                .all()
-                .pipe(lambda x: x.loc[x.any(axis="columns"), :])
+                p.all(int(np.bitwise_or.reduce(p.exists))).pipe(
+                    lambda x: x.loc[x.any(axis="columns"), :]
+                )
             )
-            for mode, df in self.binary.items()
+            for mode, p in self.presence.items()
         }
         return results
 
@@ -196,6 +774,8 @@ class Pipeline:
         is considered a total 0 for that lipid.
         Lipids that are non-0 for any pair of compartments within any Phenotype
         are considered B-lipids.
+        Given ``self.network``,
+        only pairs of adjacent compartments are considered.
 
         Notes
         -----
@@ -231,46 +811,42 @@ class Pipeline:
             logger.exception("You must find A-lipids before B-lipids.")
             raise
         else:
-            # This assumes that self.binary and a_lip will have the same keys
+            # This assumes that self.presence and a_lip will have the same keys
             # Which is definitely True
-            if picky:
-                data = {
-                    mode: df.drop(index=a_lip[f"a_{mode}"])
-                    for mode, df in self.binary.items()
-                }
-                subtype = "p"
-            else:
-                data = {
-                    mode: df.loc[a_lip[f"a_{mode}"], :]
-                    for mode, df in self.binary.items()
-                }
-                subtype = "c"
+            rows = {
+                mode: p.index.isin(a_lip[f"a_{mode}"]) != picky
+                for mode, p in self.presence.items()
+            }
+            subtype = "p" if picky else "c"
 
         logger.info(f"Calculating B{subtype}-lipids...")
         results = {}
-        for mode, df in data.items():
+        for mode, p in self.presence.items():
             logger.debug(f"Calculating B{subtype}-lipids for {mode}...")
-            compartments = df.columns.get_level_values(self.compartment)
-            pairs = itertools.combinations(compartments.unique(), 2)
-            for group in pairs:
-                logger.debug(f"Calculating B{subtype}-lipids for {group}...")
-                unified = (
-                    df.loc[:, compartments.isin(group)]
-                    .groupby(axis="columns", level=self.level)
-                    .all()
-                    .pipe(lambda x: x.loc[x.any(axis="columns"), :])
+            for i, j in itertools.combinations(range(len(p.compartments)), 2):
+                mask = 1 << i | 1 << j
+                if not self._connected(mode, mask):
+                    continue
+                group = p.names(mask)
+                logger.debug(f"Calculating B{subtype}-lipids for {tuple(group)}...")
+                unified = p.all(mask, rows[mode]).pipe(
+                    lambda x: x.loc[x.any(axis="columns"), :]
                 )
                 pairing = "_".join([x.upper() for x in group])
                 results[f"b{subtype}_{pairing}_{mode}"] = unified
         return results
 
-    def _get_n_lipids(self, n: int) -> Dict[str, pd.DataFrame]:
+    def _get_n_lipids(
+        self, n: int, keep_empty: bool = False
+    ) -> Dict[str, pd.DataFrame]:
         r"""Extract N-lipids from the dataset.
 
         Any compartment where more than self.thresh of the samples are 0
         is considered a total 0 for that lipid.
         Lipids that are non-0 for ``n`` compartments in any Phenotype
         are considered N-lipids.
+        Given ``self.network``,
+        only groups of compartments that form a connected subgraph are kept.
 
         Notes
         -----
@@ -285,6 +861,10 @@ class Pipeline:
         ----------
         n : int
             The number of compartments to limit the search to
+        keep_empty : bool
+            default=False
+            If true, also give groups of compartments without N-lipids,
+            so that every shard of lipids gives the same groups
 
         Returns
         -------
@@ -294,51 +874,58 @@ class Pipeline:
         """
         logger.info(f"Calculating N{n}-lipids...")
         results = {}
-        for mode, df in self.binary.items():
+        for mode, p in self.presence.items():
             logger.debug(f"Calculating N{n}-lipids for {mode}...")
-            compartments = df.columns.get_level_values(self.compartment)
-            # Mask required to prevent dropping levels
-            # The initial check must be done with all compartments (only n)...
-            mask = (
-                df.groupby(axis="columns", level=self.compartment)
-                .any()
-                .sum(axis="columns")
-                == n
-            )
-
-            data = [
-                (group, df.loc[mask, compartments.isin(group)])
-                for group in itertools.combinations(compartments.unique(), n)
-            ]
-            logger.debug(
-                f"N{n} compartment groups before filtering: {[group for group, _ in data]}"
+            spread = p.spread
+            if keep_empty:
+                masks = [
+                    sum(1 << k for k in group)
+                    for group in itertools.combinations(range(len(p.compartments)), n)
+                ]
+            else:
+                # Only the combinations of compartments that lipids are found in
+                found = np.unique(spread[np.bitwise_count(spread) == n])
+                masks = [int(mask) for mask in found]
+            groups = dh.combinations(
+                [mask for mask in masks if self._connected(mode, mask)]
             )
-            # ...which necessitates a second check to drop those that are not
-            # Again, mask necessary for keeping info
-            # Also, we only care for groups with lipids
-            masks = [
-                df.groupby(axis="columns", level=self.compartment)
-                .any()
-                .sum(axis="columns")
-                == n
-                for _, df in data
-            ]
-            data = [
-                (group, df.loc[mask, :].groupby(axis="columns", level=self.level).all())
-                for (group, df), mask in zip(  # noqa: B905
-                    data,
-                    masks,
-                    #  strict=False, TODO: Remove this when python3.9 is suppport is dropped
-                )
-                if mask.sum() != 0
-            ]
             logger.debug(
-                f"N{n} compartment groups after filtering: {[group for group, _ in data]}"
+                f"N{n} compartment groups: {[tuple(p.names(g)) for g in groups]}"
             )
-            for compartments, df in data:
+            for mask in groups:
                 n_type = "u" if n == 1 else f"n{n}"
-                group = "_".join([x.upper() for x in compartments])
-                results[f"{n_type}_{group}_{mode}"] = df
+                group = "_".join([x.upper() for x in p.names(mask)])
+                results[f"{n_type}_{group}_{mode}"] = p.all(mask, spread == mask)
+        return results
+
+    def _run_tests(self, matrices: Dict[K, parallel.Matrix]) -> Dict[K, pd.DataFrame]:
+        """Test the Jaccard similarities of several matrices.
+
+        Parameters
+        ----------
+        matrices : Dict[K, parallel.Matrix]
+            The boolean matrices to test.
+
+        Returns
+        -------
+        Dict[K, pd.DataFrame]
+            The results of ``jaccard.bootstrap_many`` for each matrix.
+        """
+        results = parallel.run_tests(
+            matrices,
+            jobs=self.jobs,
+            cache=self.null_cache,
+            seed=self.seed,
+            method=self.method,
+            n=self.n,
+            sampler=self.sampler,
+            strategy=self.strategy,
+            alpha=self.alpha,
+            h=self.exceedances,
+            share_nulls=self.share_nulls,
+        )
+        if self.null_cache is not None:
+            self.null_cache.log_stats()
         return results
 
     def _jaccard(
@@ -352,7 +939,11 @@ class Pipeline:
 
         Notes
         -----
-        The P-values are calculated using a bootstrap approach on a centered Jaccard similarity.
+        The P-values are calculated on a centered Jaccard similarity,
+        using the approach given by ``self.method``.
+        Every condition and lipid category of a mode is tested
+        in a single call to ``jaccard.bootstrap_many``.
+        To test several groups of lipids together, use ``self._jaccard_sets``.
 
         Parameters
         ----------
@@ -368,59 +959,257 @@ class Pipeline:
             Keys are the compartment group and mode.
             Values are the table of Jaccard similarity and p-values.
         """
-        logger.info(f"Calculating Jaccard similarity for {group}...")
-        jaccard = {
-            g: {
-                mode: lipids.loc[:, [g, self.control]]
-                .pipe(lambda df: df.loc[df.sum(axis=1) != 0, :])
-                .groupby(axis="index", level="Category", group_keys=False)
-                .apply(
-                    lambda x, g=g: jac.bootstrap(
-                        x.loc[:, g], x.loc[:, self.control], n=self.n
-                    )
+        return self._jaccard_sets({group: data})[group]
+
+    def _jaccard_sets(
+        self, sets: Dict[str, Dict[str, pd.DataFrame]]
+    ) -> Dict[str, Dict[str, Dict[str, pd.DataFrame]]]:
+        """Calculate jaccard similarity and p-values for several groups of lipids.
+
+        Every condition is compared with ``self.control``.
+        To compare other pairs of conditions, use ``self._jaccard_pairs``.
+
+        Parameters
+        ----------
+        sets : Dict[str, Dict[str, pd.DataFrame]]
+            Keys are which lipids are being checked, used by logging only.
+            Values are dictionaries of modes and lipid data.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Dict[str, pd.DataFrame]]]
+            Keys are the lipid groups of ``sets``.
+            Values are as for ``self._jaccard``.
+        """
+        conditions = list(dict.fromkeys(self.conditions))
+        jaccard = self._jaccard_pairs(sets, [(g, self.control) for g in conditions])
+        return {
+            group: {g: tables[g, self.control] for g in conditions}
+            for group, tables in jaccard.items()
+        }
+
+    def _jaccard_pairs(
+        self, sets: Dict[str, Dict[str, pd.DataFrame]], pairs: List[Tuple[str, str]]
+    ) -> Dict[str, Dict[Tuple[str, str], Dict[str, pd.DataFrame]]]:
+        """Calculate jaccard similarity and p-values between pairs of conditions.
+
+        The tests of every group, mode, and pair are independent,
+        so they are run together,
+        over ``self.jobs`` processes.
+        Each is keyed by its group, mode, conditions, and category,
+        so it draws the same random stream whatever else is run.
+        A comparison with ``self.control`` is keyed by the other condition alone.
+        Comparisons with a condition that has no samples in the compartments of a group,
+        and so no column, give an empty table.
+
+        Parameters
+        ----------
+        sets : Dict[str, Dict[str, pd.DataFrame]]
+            Keys are which lipids are being checked, used by logging only.
+            Values are dictionaries of modes and lipid data.
+        pairs : List[Tuple[str, str]]
+            The condition and reference of each comparison.
+
+        Returns
+        -------
+        Dict[str, Dict[Tuple[str, str], Dict[str, pd.DataFrame]]]
+            Keys are the lipid groups of ``sets``, then the pairs.
+            Values are dictionaries of modes and
+            the table of Jaccard similarity and p-values.
+        """
+        matrices = {}
+        categories = {}
+        tested = {}
+        for group, data in sets.items():
+            logger.info(f"Calculating Jaccard similarity for {group}...")
+            for mode, lipids in data.items():
+                codes, categories[group, mode] = pd.factorize(
+                    lipids.index.get_level_values("Category"), sort=True
                 )
-                for mode, lipids in data.items()
-            }
-            for g in self.conditions
+                tested[group, mode] = [
+                    (a, b)
+                    for a, b in pairs
+                    if a in lipids.columns and b in lipids.columns
+                ]
+                matrices[group, mode] = parallel.Matrix(
+                    lipids.to_numpy(dtype=bool),
+                    codes,
+                    [
+                        (lipids.columns.get_loc(a), lipids.columns.get_loc(b))
+                        for a, b in tested[group, mode]
+                    ],
+                    pair_keys=[
+                        (group, mode, a) if b == self.control else (group, mode, a, b)
+                        for a, b in tested[group, mode]
+                    ],
+                    group_names=[str(c) for c in categories[group, mode]],
+                )
+        results = self._run_tests(matrices)
+
+        jaccard: Dict[str, Dict[Tuple[str, str], Dict[str, pd.DataFrame]]] = {
+            group: {pair: {} for pair in pairs} for group in sets
         }
+        for (group, mode), result in results.items():
+            lipids = sets[group][mode]
+            position = {pair: i for i, pair in enumerate(tested[group, mode])}
+            for a, b in pairs:
+                table = result.loc[result["pair"] == position.get((a, b), -1)]
+                if table.empty:
+                    # Keep the empty table a groupby would give for no lipids
+                    jaccard[group][a, b][mode] = pd.DataFrame(
+                        index=pd.Index([], dtype=object, name="Category"),
+                        columns=pd.Index([a, b], name=lipids.columns.name),
+                        dtype=bool,
+                    )
+                    continue
+                jaccard[group][a, b][mode] = table.drop(
+                    columns=["pair", "code"]
+                ).set_axis(
+                    pd.Index(categories[group, mode][table["code"]], name="Category")
+                )
         return jaccard
 
-    def _generate_enfc_summary(self) -> pd.DataFrame:
-        logger.debug("Generating ENFC summary files...")
-        enfcs = self._calculate_enfc()
-        frames = []
-        levels = set()
-        for phenotype, data in enfcs.items():
-            df = pd.concat(data, axis="columns")
-            df.to_csv(
-                self.output
-                / "enfc"
-                / f"{phenotype}_by_{self.control}_individual_lipids.csv"
-            )
-            df.columns = utils.add_level_to_index(
-                index=df.columns, new_level=phenotype, new_level_name="Phenotype"
-            )
-            frames.append(df)
-            levels.update(df.index.names)
-        summary = utils.merge_dataframe_by_columns(datas=frames)
-        summary.to_csv(self.output / "enfc" / "individual_lipids.csv")
-        return summary
+    def _write_jaccard_pairs(
+        self, jaccard: Dict[str, Dict[Tuple[str, str], Dict[str, pd.DataFrame]]]
+    ) -> None:
+        """Write the Jaccard similarity between pairs of conditions as a long table.
 
-    def _generate_enfc_class_summary(self) -> pd.DataFrame:
-        logger.debug("Generating class ENFC summary files...")
-        self.filtered = {
-            mode: df.groupby(axis="index", level="Category").sum()
-            for mode, df in self.filtered.items()
+        Parameters
+        ----------
+        jaccard : Dict[str, Dict[Tuple[str, str], Dict[str, pd.DataFrame]]]
+            The results of ``self._jaccard_pairs``.
+        """
+        logger.debug("Generating all-pairs Jaccard similarity file...")
+        tables = {
+            (mode, a, b): table
+            for pairs in jaccard.values()
+            for (a, b), modes in pairs.items()
+            for mode, table in modes.items()
+            if not table.empty
         }
-        self.enfcs = self._calculate_enfc()
+        if not tables:
+            logger.warning("No lipids to write all-pairs Jaccard similarities for.")
+            return
+        pd.concat(
+            tables, names=["type_compartment_mode", self.level, "Reference"]
+        ).to_csv(self.output / "jaccard" / "all_pairs_jaccard_similarity.csv")
+
+    def _compartment_jaccard(self) -> Dict[Tuple[Hashable, ...], pd.DataFrame]:
+        """Calculate the Jaccard similarity between every pair of compartments.
+
+        For each mode and condition,
+        the presence of every lipid in every compartment with samples
+        is unpacked from ``self.presence`` into one boolean matrix,
+        and all pairs of its columns are tested by ``jaccard.bootstrap_many``,
+        which counts them together with one matrix product per category.
+        Each test is keyed by its mode, condition, compartments, and category.
+
+        Returns
+        -------
+        Dict[Tuple[Hashable, ...], pd.DataFrame]
+            Keys are the mode, condition, and pair of compartments.
+            Values are the table of Jaccard similarity and p-values.
+        """
+        logger.info("Calculating Jaccard similarity between compartments...")
+        matrices = {}
+        categories = {}
+        for mode, p in self.presence.items():
+            codes, categories[mode] = pd.factorize(
+                p.index.get_level_values("Category"), sort=True
+            )
+            for c, condition in enumerate(p.conditions):
+                present = [
+                    k for k in range(len(p.compartments)) if p.exists[c] >> k & 1
+                ]
+                pairs = list(itertools.combinations(present, 2))
+                matrices[mode, condition] = parallel.Matrix(
+                    p.unpack(c),
+                    codes,
+                    pairs,
+                    pair_keys=[
+                        (
+                            "compartments",
+                            str(mode),
+                            str(condition),
+                            str(p.compartments[a]),
+                            str(p.compartments[b]),
+                        )
+                        for a, b in pairs
+                    ],
+                    group_names=[str(g) for g in categories[mode]],
+                )
+        results = self._run_tests(matrices)
+
+        tables: Dict[Tuple[Hashable, ...], pd.DataFrame] = {}
+        for (mode, condition), result in results.items():
+            p = self.presence[mode]
+            pairs = matrices[mode, condition].pairs
+            for i, (a, b) in enumerate(pairs):
+                table = result.loc[result["pair"] == i]
+                tables[mode, condition, p.compartments[a], p.compartments[b]] = (
+                    table.drop(columns=["pair", "code"]).set_axis(
+                        pd.Index(categories[mode][table["code"]], name="Category")
+                    )
+                )
+        return tables
+
+    def _write_compartment_jaccard(
+        self, tables: Dict[Tuple[Hashable, ...], pd.DataFrame]
+    ) -> None:
+        """Write the Jaccard similarity between compartments as a long table.
+
+        Parameters
+        ----------
+        tables : Dict[Tuple[Hashable, ...], pd.DataFrame]
+            The results of ``self._compartment_jaccard``.
+        """
+        logger.debug("Generating compartment Jaccard similarity file...")
+        if not tables:
+            logger.warning("There are no pairs of compartments to compare.")
+            return
+        pd.concat(
+            tables, names=[self.mode, self.level, self.compartment, "Reference"]
+        ).to_csv(self.output / "jaccard" / "compartment_jaccard_similarity.csv")
+
+    def _write_enfc_pairs(self, pairs: Dict[str, pd.DataFrame], name: str) -> None:
+        """Write the ENFC between every pair of conditions as a long table.
+
+        Parameters
+        ----------
+        pairs : Dict[str, pd.DataFrame]
+            Keys are modes, values are the results of ``dh.enfc_pairs``.
+        name : str
+            What the lipid data are, used to name the file.
+        """
+        logger.debug(f"Generating all-pairs ENFC file for {name}...")
+        pd.concat(pairs, names=[self.mode]).to_csv(
+            self.output / "enfc" / f"all_pairs_{name}.csv"
+        )
+
+    def _write_enfc(
+        self, enfcs: Dict[str, Dict[str, pd.DataFrame]], name: str
+    ) -> pd.DataFrame:
+        """Write the ENFC of each condition, and a summary of them all.
+
+        Parameters
+        ----------
+        enfcs : Dict[str, Dict[str, pd.DataFrame]]
+            The results of ``self._calculate_enfc``.
+        name : str
+            What the lipid data are, used to name the files.
+
+        Returns
+        -------
+        pd.DataFrame
+            The summary of every condition.
+        """
+        logger.debug(f"Generating ENFC summary files for {name}...")
         frames = []
         levels = set()
-        for phenotype, data in self.enfcs.items():
+        for phenotype, data in enfcs.items():
             df = pd.concat(data, axis="columns")
             df.to_csv(
-                self.output
-                / "enfc"
-                / f"{phenotype}_by_{self.control}_lipid_classes.csv"
+                self.output / "enfc" / f"{phenotype}_by_{self.control}_{name}.csv"
             )
             df.columns = utils.add_level_to_index(
                 index=df.columns, new_level=phenotype, new_level_name="Phenotype"
@@ -428,89 +1217,181 @@ class Pipeline:
             frames.append(df)
             levels.update(df.index.names)
         summary = utils.merge_dataframe_by_columns(datas=frames)
-        summary.to_csv(self.output / "enfc" / "lipid_classes.csv")
+        summary.to_csv(self.output / "enfc" / f"{name}.csv")
         return summary
 
-    def _generate_jaccard_distance_summary(self) -> pd.DataFrame:
+    def _generate_jaccard_distance_summary(
+        self, jaccard: Dict[str, Dict[str, Dict[str, pd.DataFrame]]]
+    ) -> pd.DataFrame:
         logger.debug("Generating Jaccard distance summary files...")
         frames = []
         levels = set()
         for phenotype in set(self.conditions):
-            jaccard = pd.concat(
+            tables = pd.concat(
                 {
-                    **self.a_jaccard[phenotype],
-                    **self.bc_jaccard[phenotype],
-                    **self.bp_jaccard[phenotype],
-                    **self.n2_jaccard[phenotype],
-                    **self.u_jaccard[phenotype],
+                    **jaccard["A-lipids"][phenotype],
+                    **jaccard["Bc-lipids"][phenotype],
+                    **jaccard["Bp-lipids"][phenotype],
+                    **jaccard["N2-lipids"][phenotype],
+                    **jaccard["U-lipids"][phenotype],
                 },
                 axis="columns",
             )
-            jaccard.columns.names = ["type_compartment_mode", "Metrics"]
+            tables.columns.names = ["type_compartment_mode", "Metrics"]
             if self.save_align_files:
-                jaccard.to_csv(
+                tables.to_csv(
                     self.output
                     / "jaccard"
                     / f"{phenotype}_to_{self.control}_jaccard_similarity.csv"
                 )
-            jaccard.columns = utils.add_level_to_index(
-                index=jaccard.columns, new_level=phenotype, new_level_name="Phenotype"
+            tables.columns = utils.add_level_to_index(
+                index=tables.columns, new_level=phenotype, new_level_name="Phenotype"
             )
-            frames.append(jaccard)
-            levels.update(jaccard.index.names)
+            frames.append(tables)
+            levels.update(tables.index.names)
         summary = utils.merge_dataframe_by_columns(datas=frames)
         if self.save_align_files:
             summary.to_csv(self.output / "jaccard" / "jaccard_similarity.csv")
         return summary
 
-    def run(self) -> None:
-        """Run the full LTA pipeline.
+    def _analyse(self) -> Results:
+        """Analyse the lipids prepared by ``self._prepare``.
 
-        This:
+        Returns
+        -------
+        Results
+            The results, ready to be written.
+        """
+        moments, class_moments = self.moments, self.class_moments
+        sharded = self.shards is not None
+        self.a_lipids = self._get_a_lipids()
+        lipids = {
+            "A-lipids": self.a_lipids,
+            "U-lipids": self._get_n_lipids(1, keep_empty=sharded),
+            "Bc-lipids": self._get_b_lipids(picky=False),
+            "Bp-lipids": self._get_b_lipids(picky=True),
+            "N2-lipids": self._get_n_lipids(2, keep_empty=sharded),
+        }
+        conditions = list(dict.fromkeys(self.conditions))
+        pairs = [(g, self.control) for g in conditions]
+        if self.all_pairs:
+            pairs += itertools.combinations(conditions, 2)
 
-        #. Calculates error-normalised fold change for all conditions relatve to control
-        #. Finds A-lipids and Jaccard distances.
-        #. Finds U-lipids and Jaccard distances.
-        #. Finds B-lipids (both picky and consistent) and Jaccard distances.
-        #. Finds N2-lipids and Jaccard distances.
-        #. Writes combined results.
+        return Results(
+            enfc=self._calculate_enfc(moments),
+            class_enfc=self._calculate_enfc(class_moments),
+            enfc_pairs=(
+                {mode: dh.enfc_pairs(m) for mode, m in moments.items()}
+                if self.all_pairs
+                else {}
+            ),
+            class_enfc_pairs=(
+                {mode: dh.enfc_pairs(m) for mode, m in class_moments.items()}
+                if self.all_pairs
+                else {}
+            ),
+            lipids=lipids,
+            jaccard=self._jaccard_pairs(lipids, pairs),
+            compartment_jaccard=(
+                self._compartment_jaccard() if self.compartment_jaccard else {}
+            ),
+        )
+
+    def _merge(self, parts: List[Results]) -> Results:
+        """Merge the results of several shards.
+
+        Every table is joined across shards,
+        with its rows back in the order of the input.
+        Each shard gives every group of compartments for N-lipids,
+        so that they keep their order,
+        and those without N-lipids in any shard are then dropped.
+
+        Parameters
+        ----------
+        parts : List[Results]
+            The results of each shard.
+
+        Returns
+        -------
+        Results
+            The results of every lipid.
         """
-        self._generate_enfc_summary()
+        logger.debug(f"Merging the results of {len(parts)} shards...")
 
-        self._generate_enfc_class_summary()
+        def by_row(frames: List[pd.DataFrame]) -> pd.DataFrame:
+            return _concat(frames, self.rows)
 
-        self.a_lipids = self._get_a_lipids()
-        self.a_jaccard = self._jaccard(self.a_lipids, "A-lipids")
+        def by_class(frames: List[pd.DataFrame]) -> pd.DataFrame:
+            return _concat(frames, self.categories.labels)
 
-        self.u_lipids = self._get_n_lipids(1)
-        self.u_jaccard = self._jaccard(self.u_lipids, "U-lipids")
+        def nested(
+            merge: Callable[[List[pd.DataFrame]], pd.DataFrame],
+        ) -> Callable[[List[Dict[str, pd.DataFrame]]], Dict[str, pd.DataFrame]]:
+            return lambda dicts: _merge(dicts, merge)
 
-        self.bc_lipids = self._get_b_lipids(picky=False)
-        self.bc_jaccard = self._jaccard(self.bc_lipids, "Bc-lipids")
+        lipids = _merge([r.lipids for r in parts], nested(by_row))
+        jaccard = _merge(
+            [r.jaccard for r in parts],
+            lambda pairs: _merge(pairs, nested(by_class)),
+        )
+        for group in ["U-lipids", "N2-lipids"]:
+            for key in [key for key, df in lipids[group].items() if df.empty]:
+                del lipids[group][key]
+                for frames in jaccard[group].values():
+                    del frames[key]
+        return Results(
+            enfc=_merge([r.enfc for r in parts], nested(by_row)),
+            class_enfc=_merge([r.class_enfc for r in parts], nested(by_class)),
+            enfc_pairs=_merge([r.enfc_pairs for r in parts], by_row),
+            class_enfc_pairs=_merge([r.class_enfc_pairs for r in parts], by_class),
+            lipids=lipids,
+            jaccard=jaccard,
+            compartment_jaccard=_merge(
+                [r.compartment_jaccard for r in parts], by_class
+            ),
+        )
 
-        self.bp_lipids = self._get_b_lipids(picky=True)
-        self.bp_jaccard = self._jaccard(self.bp_lipids, "Bp-lipids")
+    def _write(self, results: Results) -> None:
+        """Write results, with the combined summaries.
 
-        self.n2_lipids = self._get_n_lipids(2)
-        self.n2_jaccard = self._jaccard(self.n2_lipids, "N2-lipids")
+        Parameters
+        ----------
+        results : Results
+            The results to write.
+        """
+        self._write_enfc(results.enfc, "individual_lipids")
+        self._write_enfc(results.class_enfc, "lipid_classes")
+        if self.all_pairs:
+            self._write_enfc_pairs(results.enfc_pairs, "individual_lipids")
+            self._write_enfc_pairs(results.class_enfc_pairs, "lipid_classes")
+            self._write_jaccard_pairs(results.jaccard)
+        if self.compartment_jaccard:
+            self._write_compartment_jaccard(results.compartment_jaccard)
 
         logger.debug("Generating Switch Analysis (lipid-type) summary files...")
+        lipids = results.lipids
         summary = pd.concat(
             {
-                **self.a_lipids,
-                **self.bc_lipids,
-                **self.bp_lipids,
-                **self.n2_lipids,
-                **self.u_lipids,
+                **lipids["A-lipids"],
+                **lipids["Bc-lipids"],
+                **lipids["Bp-lipids"],
+                **lipids["N2-lipids"],
+                **lipids["U-lipids"],
             },
             axis="columns",
         ).fillna(False)
         summary.columns.names = ["type_compartment_mode", "Phenotype"]
         summary.to_csv(self.output / "switch_individual_lipids.csv")
-        lipid_classes = summary.groupby(axis="index", level="Category").sum()
+        lipid_classes = self.categories.apply(summary.astype(np.int64))
         lipid_classes.to_csv(self.output / "switch_lipid_classes.csv")
 
-        jaccard_similarity = self._generate_jaccard_distance_summary()
+        conditions = list(dict.fromkeys(self.conditions))
+        jaccard_similarity = self._generate_jaccard_distance_summary(
+            {
+                group: {g: by_pair[g, self.control] for g in conditions}
+                for group, by_pair in results.jaccard.items()
+            }
+        )
 
         lipid_classes.columns = utils.add_level_to_index(
             index=lipid_classes.columns, new_level="-", new_level_name="Metrics"
@@ -538,3 +1419,35 @@ class Pipeline:
             data=merged_lipid_classes, level="Metrics", pressing=["-"]
         )
         merged_lipid_classes.to_csv(self.output / "switch_lipid_classes_with_stats.csv")
+
+    def run(self) -> None:
+        """Run the full LTA pipeline.
+
+        This:
+
+        #. Calculates error-normalised fold change for all conditions relatve to control
+        #. Finds A-lipids, U-lipids, B-lipids (both picky and consistent), and N2-lipids.
+        #. Finds the Jaccard distances of all of them, over ``self.jobs`` processes,
+           between every pair of conditions if ``self.all_pairs``.
+        #. Finds the Jaccard distances between compartments,
+           if ``self.compartment_jaccard``.
+        #. Writes combined results.
+
+        Given ``self.row_chunk``,
+        the first four steps are run on each shard of lipids in turn,
+        and only their results are kept,
+        which are merged before being written.
+        """
+        if self.shards is None:
+            results = self._analyse()
+        else:
+            parts = []
+            for i, rows in enumerate(self.shards):
+                logger.info(
+                    f"Analysing shard {i + 1} of {len(self.shards)} "
+                    f"({len(rows)} lipids)..."
+                )
+                self._prepare(self.prepared.take(self.rows[rows]))
+                parts.append(self._analyse())
+            results = self._merge(parts)
+        self._write(results)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""Read and write data as Parquet or Feather tables.
+
+A CSV data file holds its sample metadata as rows above the data,
+so every read must parse text.
+These tables instead hold the data as typed columns,
+one per sample,
+with the row metadata as text columns.
+The sample metadata are kept in the schema,
+so they are read without touching the data,
+and only the samples needed are then read,
+memory-mapped where possible.
+
+Both formats need pyarrow,
+installed with the "arrow" extra.
+
+Attributes
+----------
+FORMATS : Dict[str, Literal["parquet", "feather"]]
+    The format of each file extension that is read as a table.
+HAS_ARROW : bool
+    Whether pyarrow is installed.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+    from pyarrow import parquet as pq
+except ImportError:  # pragma: no cover
+    HAS_ARROW = False
+else:
+    HAS_ARROW = True
+
+logger = logging.getLogger(__name__)
+
+FORMATS: Dict[str, Literal["parquet", "feather"]] = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+}
+
+_KEY = b"lta"
+
+
+def is_table(file: Path) -> bool:
+    """Check whether a file is read as a table, by its extension.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the data file.
+
+    Returns
+    -------
+    bool
+        Whether the file is Parquet or Feather.
+    """
+    return file.suffix.lower() in FORMATS
+
+
+def _format(file: Path) -> Literal["parquet", "feather"]:
+    """Find the format of a table from its extension.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the table.
+
+    Returns
+    -------
+    Literal["parquet", "feather"]
+        The format of the table.
+
+    Raises
+    ------
+    ValueError
+        If the extension is not that of a table.
+    ImportError
+        If pyarrow is not installed.
+    """
+    if not is_table(file):
+        logger.error(
+            f"{file} is not a table, with one of {list(FORMATS)}.", stack_info=True
+        )
+        raise ValueError(f"{file} is not a table, with one of {list(FORMATS)}.")
+    if not HAS_ARROW:
+        logger.error("Tables need pyarrow, from the 'arrow' extra.", stack_info=True)
+        raise ImportError("Tables need pyarrow, from the 'arrow' extra.")
+    return FORMATS[file.suffix.lower()]
+
+
+def write_table(data: pd.DataFrame, file: Path) -> None:
+    """Write a dataframe as a table.
+
+    The column multiindex is kept as the sample metadata,
+    and samples are named by their position.
+    Feather tables are written uncompressed,
+    so that memory-mapped reads do not copy them.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The data, as given by ``data_handling.construct_df``.
+    file : Path
+        Where to write the table.
+        Its format is given by its extension.
+    """
+    fmt = _format(file)
+    index = [str(name) for name in data.index.names]
+    samples = [str(i) for i in range(data.shape[1])]
+    columns = {
+        str(name): [None if pd.isna(x) else str(x) for x in values]
+        for name, values in zip(
+            data.columns.names,
+            (data.columns.get_level_values(i) for i in range(data.columns.nlevels)),
+            strict=True,
+        )
+    }
+    frame = data.set_axis(samples, axis="columns").astype(np.float64)
+    frame.index.names = index
+    table = pa.Table.from_pandas(frame.reset_index(), preserve_index=False)
+    metadata = json.dumps({"index": index, "columns": columns}).encode()
+    table = table.replace_schema_metadata({**table.schema.metadata, _KEY: metadata})
+    if fmt == "parquet":
+        pq.write_table(table, file)
+    else:
+        feather.write_feather(table, file, compression="uncompressed")
+
+
+def _schema_metadata(file: Path) -> Dict:
+    """Read the metadata that ``write_table`` keeps in the schema.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the table.
+
+    Returns
+    -------
+    Dict
+        The names of the row metadata, under "index",
+        and the sample metadata, under "columns".
+
+    Raises
+    ------
+    ValueError
+        If the table was not written by ``write_table``.
+    """
+    if _format(file) == "parquet":
+        schema = pq.read_schema(file)
+    else:
+        with pa.memory_map(str(file)) as source:
+            schema = pa.ipc.open_file(source).schema
+    if not schema.metadata or _KEY not in schema.metadata:
+        logger.error(f"{file} has no LTA metadata.", stack_info=True)
+        raise ValueError(f"{file} has no LTA metadata.")
+    return json.loads(schema.metadata[_KEY])
+
+
+def _header(stored: Dict) -> pd.DataFrame:
+    """Arrange the sample metadata from the schema.
+
+    Parameters
+    ----------
+    stored : Dict
+        The metadata, as given by ``_schema_metadata``.
+
+    Returns
+    -------
+    pd.DataFrame
+        The metadata of each sample, indexed by the name of each row.
+    """
+    header = pd.DataFrame.from_dict(stored["columns"], orient="index")
+    return header.rename(columns=str)
+
+
+def read_header(file: Path) -> pd.DataFrame:
+    """Read the sample metadata of a table, without its data.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the table.
+
+    Returns
+    -------
+    pd.DataFrame
+        The metadata of each sample, indexed by the name of each row.
+    """
+    return _header(_schema_metadata(file))
+
+
+def count_rows(file: Path) -> int:
+    """Count the lipids in a table, from its metadata.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the table.
+
+    Returns
+    -------
+    int
+        The number of rows.
+    """
+    if _format(file) == "parquet":
+        return pq.read_metadata(file).num_rows
+    with pa.memory_map(str(file)) as source:
+        reader = pa.ipc.open_file(source)
+        return sum(
+            reader.get_batch(i).num_rows for i in range(reader.num_record_batches)
+        )
+
+
+def read_table(
+    file: Path,
+    metadata: List[str],
+    samples: Optional[Sequence[str]] = None,
+    index_names: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Read the data of a table.
+
+    Parameters
+    ----------
+    file : Path
+        The path to the table.
+    metadata : List[str]
+        The metadata rows to include.
+    samples : Optional[Sequence[str]]
+        The samples to read, as named by ``read_header``.
+        If not given, every sample is read.
+    index_names : Optional[List[str]]
+        Names for the data frame multi-index.
+
+    Returns
+    -------
+    pd.DataFrame
+        The data, as ``data_handling.construct_df`` gives for a CSV.
+    """
+    stored = _schema_metadata(file)
+    header = _header(stored)
+    if samples is not None:
+        header = header.loc[:, list(samples)]
+    columns = [*stored["index"], *header.columns]
+    if _format(file) == "parquet":
+        table = pq.read_table(file, columns=columns, memory_map=True)
+    else:
+        table = feather.read_table(file, columns=columns, memory_map=True)
+
+    data: pd.DataFrame = table.to_pandas().set_index(stored["index"])
+    data.columns = pd.MultiIndex.from_frame(header.loc[metadata, :].transpose())
+    if index_names:
+        data.index.names = index_names
+    return data
@@ -15,6 +15,52 @@ The number of bootstrap replicates to use for estimating the p-values
 can be specified with ``-b/--boot-reps``.
 Generally, higher repetitions increases accuracy,
 A deault of 1000 is used to provide a balance between speed and accuracy.
+By default,
+each replicate resamples the lipids of a class.
+Passing ``--boot-sampler counts`` instead draws only the number of lipids
+present in each condition, and shared between them,
+which is much faster for large lipid classes.
+Passing ``--boot-strategy sequential`` stops bootstrapping a lipid class
+once its p-value is certain to exceed ``--boot-alpha``,
+and reports the number of replicates used as "n-boot".
+Raising ``--boot-exceedances`` makes those p-values more precise.
+Every test draws its own null distribution.
+Passing ``--share-nulls`` instead shares one null between the tests
+of the "counts" sampler with the same counts,
+caching them in up to ``--null-cache-size`` MiB of memory,
+unless the strategy is "sequential".
+Otherwise nulls are not cached in memory, and ``--null-cache-size`` is ignored.
+Passing ``--null-cache-dir`` stores the nulls of the "counts" sampler on disk
+for later runs, using up to ``--null-cache-disk-size`` MiB.
+Alternatively,
+the p-values can be calculated without resampling
+by passing ``--jaccard-method exact`` or ``--jaccard-method asymptotic``.
+The Jaccard tests of every lipid set, mode, and condition are independent,
+so can be spread over several processes with ``-j/--jobs``.
+Each draws its own random stream from ``--seed``,
+so the results do not depend on the number of processes.
+By default, B- and N2-lipids are found for every pair of compartments.
+Passing ``--network`` with an edge list of adjacent compartments
+limits them to pairs and groups of compartments that are connected.
+Passing ``--all-pairs`` also writes the ENFC and Jaccard similarity
+between every pair of conditions,
+not just against ``--control``.
+Passing ``--compartment-jaccard`` also tests the Jaccard similarity
+between every pair of compartments within each condition.
+Passing ``--column-chunk`` streams the samples from disk,
+that many at a time,
+rather than holding the whole data in memory.
+A CSV is parsed whole twice for every chunk,
+so convert it with ``lta convert`` first.
+Passing ``--row-chunk`` analyses the lipids in shards of about that many,
+never splitting a category,
+and merges the results.
+Passing ``--modes``, ``--compartments``, or ``--groups``
+reads and analyses only the samples of those modes, compartments, or conditions.
+Passing ``--input-cache-dir`` stores the parsed data file there,
+so later runs on the same file skip parsing it,
+using up to ``--input-cache-size`` MiB of disk.
+Passing ``--refresh-input-cache`` parses the file again regardless.
 
 Many calculations are dependent on knowing where certain metadata is stored.
 Namely, the experimental conditions (specified with ``--group``),
@@ -48,43 +94,208 @@ and values passed to the CLI override the config file.
 Like all good CLIs,
 ``-V`` returns the version while ``-h/--help`` returns help.
 
+Besides the analysis,
+``lta convert FILE OUTPUT`` converts a CSV data file
+into a Parquet or Feather table,
+chosen by the extension of ``OUTPUT``.
+The table holds the data as numbers and the metadata in its schema,
+so it is read far faster than the CSV,
+and can be passed to ``lta`` in its place.
+``lta inspect FILE`` reads only the metadata rows of a data file,
+and estimates its number of lipids from its size,
+or counts them exactly with ``--count-rows``.
+It prints the number of samples of each condition in each compartment and mode,
+and checks the metadata options and ``--control`` against the file.
+A first argument naming a command is always taken as that command,
+so ``lta run FILE OUTPUT`` runs the analysis on a data file named like a command.
+
 Attributes
 ----------
 lta_parser : argparse.ArgumentParser
     The argument parser for the root command.
+convert_parser : argparse.ArgumentParser
+    The argument parser for ``lta convert``.
+inspect_parser : argparse.ArgumentParser
+    The argument parser for ``lta inspect``.
+commands : Dict[str, argparse.ArgumentParser]
+    The parser of each command, by name,
+    including ``run`` for the root command.
+    Each parser sets ``command`` to the name of the module in ``lta.commands``,
+    and of the function in it,
+    that runs the command.
 """
 
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 import configargparse
 
 from lta import __version__
-from lta.commands.run import run
 from lta.helpers.custom_types import FloatRange
 
-lta_parser = configargparse.ArgumentParser(
-    prog="lta",
-    description="Lipid Traffic Analysis",
-    allow_abbrev=False,
-    add_config_file_help=True,
-    default_config_files=["lta_conf.txt"],
-    config_arg_is_required=False,
-    ignore_unknown_config_file_keys=True,
-    formatter_class=configargparse.ArgumentDefaultsRawHelpFormatter,
-)
 
-lta_parser.add_argument(
-    "-c",
-    "--config",
-    required=False,
-    is_config_file=True,
-    help="Config file location.",
-)
+def _parser(
+    prog: str, description: str, epilog: Optional[str] = None
+) -> configargparse.ArgumentParser:
+    """Make the parser of a command, reading ``lta_conf.txt`` by default.
 
-lta_parser.add_argument(
-    "file",
-    type=Path,
-    help="Location of the input data csv file.",
+    Parameters
+    ----------
+    prog : str
+        The name of the command.
+    description : str
+        What the command does.
+    epilog : Optional[str]
+        What to print after the arguments in the help.
+
+    Returns
+    -------
+    configargparse.ArgumentParser
+        The parser, with the config file and data file arguments.
+    """
+    parser = configargparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog=epilog,
+        allow_abbrev=False,
+        add_config_file_help=True,
+        default_config_files=["lta_conf.txt"],
+        config_arg_is_required=False,
+        ignore_unknown_config_file_keys=True,
+        formatter_class=configargparse.ArgumentDefaultsRawHelpFormatter,
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        required=False,
+        is_config_file=True,
+        help="Config file location.",
+    )
+    parser.add_argument(
+        "file",
+        type=Path,
+        help="Location of the input data csv file.",
+    )
+    return parser
+
+
+def _add_filters(parser: configargparse.ArgumentParser) -> None:
+    """Add the arguments choosing which samples to read.
+
+    Parameters
+    ----------
+    parser : configargparse.ArgumentParser
+        The parser to add them to.
+    """
+    parser.add_argument(
+        "--modes",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Lipidomics modes to analyse",
+    )
+    parser.add_argument(
+        "--compartments",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Compartments to analyse",
+    )
+    parser.add_argument(
+        "--groups",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Experimental conditions to analyse, including the control",
+    )
+
+
+def _add_n_rows(parser: configargparse.ArgumentParser) -> None:
+    """Add the number of rows of metadata.
+
+    Parameters
+    ----------
+    parser : configargparse.ArgumentParser
+        The parser to add it to.
+    """
+    parser.add_argument(
+        "-n",
+        "--n-rows-metadata",
+        type=int,
+        default=11,
+        help="Number of rows in column metadata",
+    )
+
+
+def _add_metadata(parser: configargparse.ArgumentParser) -> None:
+    """Add the labels of the metadata rows, and the control condition.
+
+    Parameters
+    ----------
+    parser : configargparse.ArgumentParser
+        The parser to add them to.
+    """
+    parser.add_argument(
+        "--group",
+        type=str,
+        default="Group",
+        help="Metadata label for experimental conditions",
+    )
+    parser.add_argument(
+        "--control",
+        type=str,
+        default="control",
+        help="Control group for fold-change",
+    )
+    parser.add_argument(
+        "--compartment",
+        type=str,
+        default="Compartment",
+        help="Metadata label for sample compartment",
+    )
+    parser.add_argument(
+        "--mode",
+        type=str,
+        default="Mode",
+        help="Metadata label for lipidomics mode",
+    )
+    parser.add_argument(
+        "--sample-id",
+        type=str,
+        default="SampleID",
+        help="Metadata label for Sample IDs",
+    )
+
+
+def _add_logging(parser: configargparse.ArgumentParser) -> None:
+    """Add the verbosity and logfiles.
+
+    Parameters
+    ----------
+    parser : configargparse.ArgumentParser
+        The parser to add them to.
+    """
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Increase verbosity.",
+    )
+    parser.add_argument(
+        "-l",
+        "--logfile",
+        action="append",
+        help="Location of logfile. May also be 'term' for Std.Out.",
+    )
+
+
+lta_parser = _parser(
+    "lta",
+    "Lipid Traffic Analysis",
+    "Other commands: lta convert, lta inspect.\n"
+    "A file named like a command is taken as that command;\n"
+    "to analyse it, run: lta run FILE OUTPUT",
 )
 
 lta_parser.add_argument(
@@ -113,48 +324,150 @@ lta_parser.add_argument(
 )
 
 lta_parser.add_argument(
-    "-n",
-    "--n-rows-metadata",
-    type=int,
-    default=11,
-    help="Number of rows in column metadata",
+    "--boot-sampler",
+    type=str,
+    choices=["index", "counts"],
+    default="index",
+    help="How to draw bootstrap replicates",
 )
 
 lta_parser.add_argument(
-    "--group",
+    "--boot-strategy",
     type=str,
-    default="Group",
-    help="Metadata label for experimental conditions",
+    choices=["fixed", "sequential"],
+    default="fixed",
+    help="Whether to stop bootstrapping early",
 )
 
 lta_parser.add_argument(
-    "--control",
-    type=str,
-    default="control",
-    help="Control group for fold-change",
+    "--boot-alpha",
+    type=float,
+    choices=FloatRange(0, 1),  # type: ignore
+    default=0.05,
+    help="Significance level for sequential bootstrapping",
 )
 
 lta_parser.add_argument(
-    "--compartment",
-    type=str,
-    default="Compartment",
-    help="Metadata label for sample compartment",
+    "--boot-exceedances",
+    type=int,
+    default=None,
+    help="Exceedances at which sequential bootstrapping stops",
 )
 
 lta_parser.add_argument(
-    "--mode",
-    type=str,
-    default="Mode",
-    help="Metadata label for lipidomics mode",
+    "--null-cache-size",
+    type=int,
+    default=None,
+    help="Memory in MiB for caching shared bootstrap nulls (256 if not given); "
+    "ignored without --share-nulls",
+)
+
+lta_parser.add_argument(
+    "--null-cache-dir",
+    type=Path,
+    default=None,
+    help="Where to store bootstrap nulls for later runs",
+)
+
+lta_parser.add_argument(
+    "--null-cache-disk-size",
+    type=int,
+    default=1024,
+    help="Disk space in MiB for storing bootstrap nulls",
+)
+
+lta_parser.add_argument(
+    "--share-nulls",
+    default=False,
+    action="store_true",
+    help="Share one bootstrap null between tests with the same counts",
 )
 
 lta_parser.add_argument(
-    "--sample-id",
+    "--jaccard-method",
     type=str,
-    default="SampleID",
-    help="Metadata label for Sample IDs",
+    choices=["bootstrap", "exact", "asymptotic"],
+    default="bootstrap",
+    help="How to calculate Jaccard p-values",
+)
+
+lta_parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=1,
+    help="Number of processes for the Jaccard tests",
+)
+
+lta_parser.add_argument(
+    "--seed",
+    type=int,
+    default=42,
+    help="Seed for the bootstrap random number generators",
 )
 
+lta_parser.add_argument(
+    "--network",
+    type=Path,
+    default=None,
+    help="Edge list of adjacent compartments",
+)
+
+lta_parser.add_argument(
+    "--all-pairs",
+    default=False,
+    action="store_true",
+    help="Also compare every pair of conditions",
+)
+
+lta_parser.add_argument(
+    "--compartment-jaccard",
+    default=False,
+    action="store_true",
+    help="Also compare every pair of compartments within each condition",
+)
+
+lta_parser.add_argument(
+    "--column-chunk",
+    type=int,
+    default=None,
+    help="Number of samples to read at a time; "
+    "a CSV is parsed twice per chunk, so convert it with lta convert first",
+)
+
+lta_parser.add_argument(
+    "--row-chunk",
+    type=int,
+    default=None,
+    help="Number of lipids to analyse at a time, in whole categories",
+)
+
+_add_filters(lta_parser)
+
+lta_parser.add_argument(
+    "--input-cache-dir",
+    type=Path,
+    default=None,
+    help="Where to store parsed data files between runs",
+)
+
+lta_parser.add_argument(
+    "--input-cache-size",
+    type=int,
+    default=4096,
+    help="Disk space in MiB for storing parsed data files",
+)
+
+lta_parser.add_argument(
+    "--refresh-input-cache",
+    default=False,
+    action="store_true",
+    help="Parse the data file again, replacing any stored copy",
+)
+
+_add_n_rows(lta_parser)
+_add_metadata(lta_parser)
+
 lta_parser.add_argument(
     "-V",
     "--version",
@@ -163,26 +476,74 @@ lta_parser.add_argument(
     help="Display version information and exit.",
 )
 
+_add_logging(lta_parser)
+
 lta_parser.add_argument(
-    "-v",
-    "--verbose",
-    action="count",
-    default=0,
-    help="Increase verbosity.",
+    "--savealignfiles",
+    default=False,
+    action="store_true",
+    help="Keep a copy of alignment files.",
 )
 
-lta_parser.add_argument(
-    "-l",
-    "--logfile",
-    action="append",
-    help="Location of logfile. May also be 'term' for Std.Out.",
+lta_parser.set_defaults(command="run")
+
+convert_parser = _parser(
+    "lta convert", "Convert a CSV data file into a Parquet or Feather table"
 )
 
-lta_parser.add_argument(
-    "--savealignfiles",
+convert_parser.add_argument(
+    "output",
+    type=Path,
+    help="Where to write the table, ending .parquet, .pq, .feather, or .arrow.",
+)
+
+_add_n_rows(convert_parser)
+_add_logging(convert_parser)
+
+convert_parser.set_defaults(command="convert")
+
+inspect_parser = _parser("lta inspect", "Check a data file against the configuration")
+_add_filters(inspect_parser)
+_add_n_rows(inspect_parser)
+_add_metadata(inspect_parser)
+
+inspect_parser.add_argument(
+    "--count-rows",
     default=False,
     action="store_true",
-    help="Keep a copy of alignment files.",
+    help="Count the lipids of a CSV exactly, reading the whole file",
 )
 
-lta_parser.set_defaults(func=run)
+_add_logging(inspect_parser)
+
+inspect_parser.set_defaults(command="inspect")
+
+commands: Dict[str, configargparse.ArgumentParser] = {
+    "run": lta_parser,
+    "convert": convert_parser,
+    "inspect": inspect_parser,
+}
+
+
+def select(argv: List[str]) -> Tuple[configargparse.ArgumentParser, List[str]]:
+    """Find the parser for some command line arguments.
+
+    If the first argument names a command,
+    its parser is used for the rest,
+    even if a data file of that name exists.
+    Otherwise, the arguments are for the root command,
+    which can also be named explicitly as ``run``.
+
+    Parameters
+    ----------
+    argv : List[str]
+        The command line arguments, less the program name.
+
+    Returns
+    -------
+    Tuple[configargparse.ArgumentParser, List[str]]
+        The parser, and the arguments for it.
+    """
+    if argv and argv[0] in commands:
+        return commands[argv[0]], argv[1:]
+    return lta_parser, argv
@@ -15,14 +15,13 @@ import pytest
 from _pytest import capture
 
 from lta.cli import main
-from lta.commands.run import run
 
 
 @pytest.mark.xfail
 def test_echoes_text(capsys: capture.CaptureFixture) -> None:
     """The CLI prints text passed to it."""
     args = argparse.Namespace(
-        func=run, folder=Path("data"), output=Path("results"), threshold=[0.2]
+        command="run", folder=Path("data"), output=Path("results"), threshold=[0.2]
     )
     main(args)
     out, err = capsys.readouterr()
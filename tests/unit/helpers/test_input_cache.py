@@ -0,0 +1,91 @@
+"""Unit tests for the parsed input cache."""
+
+import os
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lta.helpers.input_cache import InputCache
+
+
+def _frame(value: float) -> pd.DataFrame:
+    """Construct a small dataframe with multiindexes on both axes."""
+    return pd.DataFrame(
+        np.full((2, 3), value),
+        index=pd.MultiIndex.from_tuples([("a", "A"), ("b", None)], names=["l", "c"]),
+        columns=pd.MultiIndex.from_tuples(
+            [("x", "1"), ("y", "2"), ("z", "3")], names=["g", "s"]
+        ),
+    )
+
+
+def _reader(value: float, calls: List[int]) -> Callable[[], pd.DataFrame]:
+    """Construct a reader that counts its calls."""
+
+    def read() -> pd.DataFrame:
+        calls.append(1)
+        return _frame(value)
+
+    return read
+
+
+def test_fetch_parses_once(tmp_path: Path) -> None:
+    """A second fetch should load the stored copy, memory-mapped."""
+    file = tmp_path / "data.csv"
+    file.write_text("spam")
+    cache = InputCache(tmp_path / "cache")
+    calls: List[int] = []
+    first = cache.fetch(file, {"n": 1}, _reader(1.5, calls))
+    second = InputCache(tmp_path / "cache").fetch(file, {"n": 1}, _reader(1.5, calls))
+    assert len(calls) == 1
+    assert_frame_equal(second, first)
+    assert not second.to_numpy().flags.writeable
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_fetch_invalidates(tmp_path: Path) -> None:
+    """Changed contents, changed options, or a refresh should parse again."""
+    file = tmp_path / "data.csv"
+    file.write_text("spam")
+    calls: List[int] = []
+    cache = InputCache(tmp_path / "cache")
+    cache.fetch(file, {"n": 1}, _reader(1, calls))
+    cache.fetch(file, {"n": 2}, _reader(2, calls))
+    file.write_text("eggs")
+    cache.fetch(file, {"n": 1}, _reader(3, calls))
+    refresh = InputCache(tmp_path / "cache", refresh=True)
+    result = refresh.fetch(file, {"n": 1}, _reader(4, calls))
+    assert len(calls) == 4
+    assert (result == 4).all().all()
+    assert (cache.fetch(file, {"n": 1}, _reader(5, calls)) == 4).all().all()
+
+
+def test_evicts_least_recently_used(tmp_path: Path) -> None:
+    """Exceeding the size limit should evict the least recently used entry."""
+    files = [tmp_path / f"{i}.csv" for i in range(3)]
+    for i, file in enumerate(files):
+        file.write_text(str(i))
+    calls: List[int] = []
+    cache = InputCache(tmp_path / "cache")
+    cache.fetch(files[0], {}, _reader(0, calls))
+    entry = next((tmp_path / "cache").iterdir())
+    size = sum(f.stat().st_size for f in entry.iterdir())
+    os.utime(entry, (0, 0))
+    cache.max_bytes = 2 * size
+    cache.fetch(files[1], {}, _reader(1, calls))
+    cache.fetch(files[2], {}, _reader(2, calls))
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+    cache.fetch(files[0], {}, _reader(0, calls))
+    assert len(calls) == 4
+
+
+def test_skips_large_entries(tmp_path: Path) -> None:
+    """An entry larger than the size limit should not be stored."""
+    file = tmp_path / "data.csv"
+    file.write_text("spam")
+    cache = InputCache(tmp_path / "cache", max_bytes=8)
+    cache.fetch(file, {}, _reader(1, []))
+    assert not list((tmp_path / "cache").iterdir())
@@ -1,5 +1,6 @@
 """Unit tests for Jaccard similarity helpers."""
 
+import itertools
 import logging
 
 import numpy as np
@@ -7,6 +8,7 @@ import pandas as pd
 import pytest
 
 from lta.helpers import jaccard
+from lta.helpers.null_cache import NullCache
 
 
 def b(*vals: int) -> np.ndarray:
@@ -179,3 +181,344 @@ def test_bootstrap_jsim_matches_similarity() -> None:
     result = jaccard.bootstrap(x, y, seed=42)
     expected_jsim = jaccard.similarity(x, y)
     assert result["J-sim"] == pytest.approx(expected_jsim)
+
+
+def _legacy_bootstrap(x: np.ndarray, y: np.ndarray, n: int, seed: int) -> float:
+    """Compute the p-value one replicate at a time, as before batching."""
+    j_obs = jaccard.similarity(x, y, center=True)
+    rng = np.random.default_rng(seed)
+    vals = (
+        jaccard.similarity(
+            rng.choice(x, size=len(x), replace=True, shuffle=False),
+            rng.choice(y, size=len(y), replace=True, shuffle=False),
+            center=True,
+        )
+        for _ in range(n)
+    )
+    j_null = np.abs(np.fromiter(vals, dtype=np.float32, count=n))
+    return float((j_null >= np.abs(j_obs)).sum() / n)
+
+
+@pytest.mark.parametrize("block", [None, 1, 7, 1000])
+def test_bootstrap_matches_per_replicate_draws(block: int) -> None:
+    """Batched replicates should reproduce the per-replicate p-value exactly."""
+    rng = np.random.default_rng(0)
+    x = rng.random(37) < 0.4
+    y = rng.random(37) < 0.6
+    result = jaccard.bootstrap(x, y, n=250, seed=3, block=block)
+    assert result["p-val"] == _legacy_bootstrap(x, y, n=250, seed=3)
+
+
+def test_bootstrap_counts_sampler_independent_of_block() -> None:
+    """The counts sampler should not depend on how replicates are blocked."""
+    rng = np.random.default_rng(5)
+    x = rng.random(80) < 0.3
+    y = rng.random(80) < 0.5
+    whole = jaccard.bootstrap(x, y, n=500, seed=2, sampler="counts")
+    blocked = jaccard.bootstrap(x, y, n=500, seed=2, sampler="counts", block=33)
+    assert whole.equals(blocked)
+
+
+def test_bootstrap_counts_sampler_matches_index_sampler() -> None:
+    """Both samplers should estimate the same p-value."""
+    rng = np.random.default_rng(6)
+    x = rng.random(120) < 0.3
+    y = np.where(rng.random(120) < 0.2, x, rng.random(120) < 0.5)
+    index = jaccard.bootstrap(x, y, n=20000, seed=1)
+    counts = jaccard.bootstrap(x, y, n=20000, seed=1, sampler="counts")
+    assert counts["J-sim"] == index["J-sim"]
+    assert counts["p-val"] == pytest.approx(index["p-val"], abs=0.02)
+
+
+@pytest.mark.parametrize("sampler", ["index", "counts"])
+def test_bootstrap_sequential_stops_early(sampler: str) -> None:
+    """Clearly non-significant results should stop after few replicates."""
+    x = b(1, 0, 1, 0, 1, 0, 1, 0, 1, 0)
+    y = b(1, 1, 0, 0, 1, 1, 0, 0, 1, 1)
+    result = jaccard.bootstrap(
+        x, y, n=10000, sampler=sampler, strategy="sequential"  # type: ignore[arg-type]
+    )
+    assert list(result.index) == ["J-sim", "p-val", "n-boot"]
+    assert result["n-boot"] < 10000
+    assert result["p-val"] == (0.05 * 10000 + 1) / result["n-boot"]
+
+
+def test_bootstrap_sequential_matches_fixed_when_significant() -> None:
+    """Significant results should use every replicate and match the fixed p-value."""
+    x = b(*[1] * 10, *[0] * 30)
+    y = b(*[1] * 9, 0, *[0] * 29, 1)
+    fixed = jaccard.bootstrap(x, y, n=2000, seed=4)
+    sequential = jaccard.bootstrap(x, y, n=2000, seed=4, strategy="sequential")
+    assert fixed["p-val"] <= 0.05
+    assert sequential["p-val"] == fixed["p-val"]
+    assert sequential["n-boot"] == 2000
+
+
+def test_bootstrap_sequential_independent_of_block() -> None:
+    """The point at which the sequential bootstrap stops should not depend on blocks."""
+    x = b(1, 0, 1, 0, 1, 0, 1, 0, 1, 0)
+    y = b(1, 1, 0, 0, 1, 1, 0, 0, 1, 1)
+    whole = jaccard.bootstrap(x, y, n=5000, strategy="sequential", h=40)
+    blocked = jaccard.bootstrap(x, y, n=5000, strategy="sequential", h=40, block=3)
+    assert whole.equals(blocked)
+
+
+def test_bootstrap_cache_matches_uncached() -> None:
+    """Cached nulls should give the same result as drawing them afresh."""
+    rng = np.random.default_rng(7)
+    x = rng.random(50) < 0.4
+    y = rng.random(50) < 0.4
+    cache = NullCache()
+    kwargs = {"n": 3000, "sampler": "counts"}
+    uncached = jaccard.bootstrap(x, y, **kwargs)  # type: ignore[arg-type]
+    cached = jaccard.bootstrap(x, y, cache=cache, **kwargs)  # type: ignore[arg-type]
+    order = rng.permutation(len(x))
+    reused = jaccard.bootstrap(
+        x[order], y[order], cache=cache, **kwargs  # type: ignore[arg-type]
+    )
+    assert cached.equals(uncached)
+    assert reused["p-val"] == cached["p-val"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_bootstrap_sequential_skips_cache() -> None:
+    """The sequential strategy should stop early rather than draw a whole null."""
+    rng = np.random.default_rng(7)
+    x = rng.random(50) < 0.4
+    y = rng.random(50) < 0.4
+    cache = NullCache()
+    kwargs = {"n": 3000, "sampler": "counts", "strategy": "sequential"}
+    uncached = jaccard.bootstrap(x, y, **kwargs)  # type: ignore[arg-type]
+    cached = jaccard.bootstrap(x, y, cache=cache, **kwargs)  # type: ignore[arg-type]
+    assert cached.equals(uncached)
+    assert cached["n-boot"] < 3000
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+
+def test_bootstrap_accepts_series() -> None:
+    """Bootstrap should accept boolean Series as well as arrays."""
+    x = b(1, 0, 1, 0, 1, 0, 1, 1)
+    y = b(0, 1, 0, 1, 1, 0, 1, 0)
+    result = jaccard.bootstrap(pd.Series(x), pd.Series(y), n=100, seed=1)
+    assert result.equals(jaccard.bootstrap(x, y, n=100, seed=1))
+
+
+# ---------------------------------------------------------------------------
+# exact and asymptotic
+# ---------------------------------------------------------------------------
+
+
+def test_exact_small_vectors_by_enumeration() -> None:
+    """The exact p-value should match brute-force enumeration of all outcomes."""
+    x = b(1, 1, 0, 1, 0)
+    y = b(1, 0, 0, 1, 1)
+    px, py = x.mean(), y.mean()
+    j_obs = abs(jaccard.similarity(x, y, center=True))
+    p_val = 0.0
+    for bits in range(4 ** len(x)):
+        pairs = [(bits >> (2 * i)) & 3 for i in range(len(x))]
+        xs = np.array([p & 1 for p in pairs], dtype=bool)
+        ys = np.array([p >> 1 for p in pairs], dtype=bool)
+        prob = np.prod(np.where(xs, px, 1 - px) * np.where(ys, py, 1 - py))
+        j_null = jaccard.similarity(xs, ys, center=True, px=px, py=py)
+        if abs(j_null) >= j_obs * (1 - 1e-7):
+            p_val += prob
+    result = jaccard.exact(x, y)
+    assert result["J-sim"] == pytest.approx(jaccard.similarity(x, y))
+    assert result["p-val"] == pytest.approx(p_val)
+
+
+def test_asymptotic_approaches_exact() -> None:
+    """For long vectors, the asymptotic p-value should approach the exact one."""
+    rng = np.random.default_rng(4)
+    x = rng.random(600) < 0.4
+    y = np.where(rng.random(600) < 0.1, x, rng.random(600) < 0.5)
+    exact = jaccard.exact(x, y)["p-val"]
+    assert jaccard.asymptotic(x, y)["p-val"] == pytest.approx(exact, abs=0.02)
+
+
+@pytest.mark.parametrize("method", ["exact", "asymptotic"])
+def test_analytical_degenerate(method: str, caplog: pytest.LogCaptureFixture) -> None:
+    """Degenerate vectors should return p-val=1 for the analytical tests."""
+    x = b(1, 1, 1, 1)
+    y = b(1, 0, 1, 0)
+    with caplog.at_level(logging.WARNING, logger="lta.helpers.jaccard"):
+        result = jaccard.test(x, y, method=method)  # type: ignore[arg-type]
+    assert result["p-val"] == pytest.approx(1.0)
+    assert "degenerate" in caplog.text
+
+
+def test_test_dispatches_bootstrap() -> None:
+    """The bootstrap method should match calling bootstrap directly."""
+    x = b(1, 0, 1, 0, 1, 0)
+    y = b(1, 1, 0, 0, 1, 0)
+    result = jaccard.test(x, y, method="bootstrap", n=100, seed=1)
+    assert result.equals(jaccard.bootstrap(x, y, n=100, seed=1))
+
+
+def test_test_raises_on_unknown_method() -> None:
+    """Unknown methods should raise ValueError."""
+    with pytest.raises(ValueError, match="Unknown method"):
+        jaccard.test(b(1, 0), b(0, 1), method="magic")  # type: ignore[arg-type]
+
+
+# ---------------------------------------------------------------------------
+# bootstrap_many
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"block": 7},
+        {"sampler": "counts"},
+        {"strategy": "sequential"},
+        {"method": "exact"},
+        {"method": "asymptotic"},
+    ],
+)
+def test_bootstrap_many_matches_test_per_group(kwargs: dict) -> None:
+    """Every group and pair should match testing it on its own."""
+    rng = np.random.default_rng(3)
+    data = rng.random((200, 3)) < 0.4
+    data[:15, 1] = True
+    codes = rng.integers(0, 5, 200)
+    pairs = [(0, 2), (1, 2), (0, 1)]
+    result = jaccard.bootstrap_many(data, codes, pairs, n=100, **kwargs)
+    assert len(result) == 15
+    options = {k: v for k, v in kwargs.items() if k != "block"}
+    for _, row in result.iterrows():
+        i, j = pairs[int(row["pair"])]
+        rows = (codes == row["code"]) & (data[:, i] | data[:, j])
+        expected = jaccard.test(data[rows, i], data[rows, j], n=100, **options)
+        np.testing.assert_array_equal(row[expected.index], expected)
+
+
+def test_bootstrap_many_every_pair() -> None:
+    """Counts of every pair of columns should match counting each pair directly."""
+    rng = np.random.default_rng(5)
+    data = rng.random((300, 5)) < 0.3
+    codes = rng.integers(0, 4, 300)
+    pairs = list(itertools.combinations(range(5), 2)) + [(3, 1)]
+    result = jaccard.bootstrap_many(data, codes, pairs, method="asymptotic")
+    assert len(result) == len(pairs) * 4
+    for _, row in result.iterrows():
+        i, j = pairs[int(row["pair"])]
+        x, y = data[codes == row["code"]][:, [i, j]].T
+        assert row["J-sim"] == (x & y).sum() / (x | y).sum()
+
+
+@pytest.mark.parametrize("sampler", ["index", "counts"])
+def test_bootstrap_many_keyed_streams_independent_of_order(sampler: str) -> None:
+    """Keyed groups should give the same p-values whatever else is tested."""
+    rng = np.random.default_rng(3)
+    data = rng.random((200, 3)) < 0.4
+    codes = rng.integers(0, 5, 200)
+    pairs = [(0, 2), (1, 2), (0, 1)]
+    keys = [("A", "LCMS", "x"), ("A", "LCMS", "y"), ("A", "LCMS", "z")]
+    names = list("abcde")
+    options: dict = {"n": 100, "sampler": sampler, "group_names": names}
+    together = jaccard.bootstrap_many(data, codes, pairs, pair_keys=keys, **options)
+    for p in [2, 0, 1]:
+        alone = jaccard.bootstrap_many(
+            data, codes, pairs[p : p + 1], pair_keys=keys[p : p + 1], **options
+        )
+        expected = together.loc[together["pair"] == p]
+        np.testing.assert_array_equal(alone["p-val"], expected["p-val"])
+
+
+@pytest.mark.parametrize("share_nulls", [False, True])
+def test_bootstrap_many_counts_streams_keyed_by_test(share_nulls: bool) -> None:
+    """Tests with the same counts should only share a null if asked to."""
+    data = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [1, 1, 1, 1]] * 20, dtype=bool)
+    codes = np.zeros(60, dtype=int)
+    pairs = [(0, 1), (2, 3)]
+    cache = NullCache()
+    result = jaccard.bootstrap_many(
+        data,
+        codes,
+        pairs,
+        n=200,
+        sampler="counts",
+        cache=cache,
+        pair_keys=[("A",), ("B",)],
+        group_names=["a"],
+        share_nulls=share_nulls,
+    )
+    assert len(result) == 2
+    assert (cache.hits, cache.misses) == ((1, 1) if share_nulls else (0, 2))
+
+
+def test_bootstrap_many_keyed_index_streams_batched() -> None:
+    """Keyed groups of the same length should match bootstrapping each alone."""
+    rng = np.random.default_rng(11)
+    data = rng.random((90, 4)) < 0.5
+    codes = np.repeat([0, 1, 2], 30)
+    pairs = [(0, 1), (2, 3)]
+    options: dict = {"n": 300, "group_names": list("abc"), "block": 7}
+    keys = [("A",), ("B",)]
+    together = jaccard.bootstrap_many(data, codes, pairs, pair_keys=keys, **options)
+    for i, row in together.iterrows():
+        x, y = data[codes == row["code"]][:, list(pairs[int(row["pair"])])].T
+        kept = x | y
+        seed = jaccard.stream(42, *keys[int(row["pair"])], "abc"[int(row["code"])])
+        alone = jaccard.bootstrap(x[kept], y[kept], n=300, seed=seed)
+        assert row["p-val"] == alone["p-val"], i
+
+
+def test_bootstrap_many_keyed_streams_follow_seed() -> None:
+    """Keyed groups should draw different replicates for different seeds."""
+    rng = np.random.default_rng(3)
+    data = rng.random((60, 2)) < 0.5
+    codes = np.zeros(60, dtype=int)
+    options: dict = {"n": 200, "pair_keys": [("A",)], "group_names": ["a"]}
+    p_vals = {
+        seed: jaccard.bootstrap_many(data, codes, [(0, 1)], seed=seed, **options)[
+            "p-val"
+        ].item()
+        for seed in [1, 2, 1]
+    }
+    assert len(p_vals) == 2
+    assert p_vals[1] != p_vals[2]
+
+
+def test_stream() -> None:
+    """Streams should depend on the seed and every part of the key."""
+    state = jaccard.stream(42, "A", "LCMS", 3).generate_state(4)
+    np.testing.assert_array_equal(
+        jaccard.stream(42, "A", "LCMS", 3).generate_state(4), state
+    )
+    for other in [
+        jaccard.stream(43, "A", "LCMS", 3),
+        jaccard.stream(42, "U", "LCMS", 3),
+        jaccard.stream(42, "A", "LCMS", 4),
+        jaccard.stream(42, "LCMS", "A", 3),
+    ]:
+        assert not np.array_equal(other.generate_state(4), state)
+
+
+def test_bootstrap_many_drops_empty_groups_and_negative_codes() -> None:
+    """Groups with no Trues in a pair and rows without a group are left out."""
+    data = np.array([[1, 1], [0, 0], [1, 0], [0, 1], [1, 1]], dtype=bool)
+    codes = np.array([2, 0, 2, -1, 2])
+    result = jaccard.bootstrap_many(data, codes, [(0, 1)], n=10)
+    assert result["code"].tolist() == [2]
+    assert result["J-sim"].tolist() == [pytest.approx(2 / 3)]
+
+
+def test_bootstrap_many_empty() -> None:
+    """No rows should give an empty frame with the usual columns."""
+    result = jaccard.bootstrap_many(
+        np.zeros((0, 2), dtype=bool), np.zeros(0, dtype=int), [(0, 1)]
+    )
+    assert result.empty
+    assert result.columns.tolist() == ["pair", "code", "J-sim", "p-val"]
+
+
+def test_bootstrap_many_raises_on_unknown_method() -> None:
+    """Unknown methods should raise ValueError."""
+    with pytest.raises(ValueError, match="Unknown method"):
+        jaccard.bootstrap_many(
+            np.ones((2, 2), dtype=bool), np.zeros(2), [(0, 1)], method="magic"  # type: ignore[arg-type]
+        )
@@ -0,0 +1,131 @@
+"""Unit tests for the Jaccard kernels."""
+
+import numpy as np
+import pytest
+
+from lta.helpers import kernels
+
+
+def test_backend_is_known() -> None:
+    """The active backend should be one of the two implementations."""
+    assert kernels.BACKEND in ("numba", "numpy")
+
+
+# ---------------------------------------------------------------------------
+# counts
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("shape", [(1,), (9,), (64,), (130,), (3, 70), (2, 5, 200)])
+def test_packed_counts_match_boolean(shape: tuple) -> None:
+    """Popcounts of packed words should equal boolean reductions."""
+    rng = np.random.default_rng(1)
+    x = rng.random(shape) < 0.3
+    y = rng.random(shape) < 0.6
+    intersect, sx, sy = kernels.packed_counts(kernels.pack(x), kernels.pack(y))
+    np.testing.assert_array_equal(intersect, (x & y).sum(axis=-1))
+    np.testing.assert_array_equal(sx, x.sum(axis=-1))
+    np.testing.assert_array_equal(sy, y.sum(axis=-1))
+
+
+def test_counts_packed_path(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Counts should agree whether or not the inputs are packed."""
+    rng = np.random.default_rng(2)
+    x = rng.random((4, 100)) < 0.5
+    y = rng.random((4, 100)) < 0.5
+    unpacked = kernels.counts(x, y)
+    monkeypatch.setattr(kernels, "PACK_MIN", 0)
+    for left, right in zip(kernels.counts(x, y), unpacked, strict=True):
+        np.testing.assert_array_equal(left, right)
+
+
+# ---------------------------------------------------------------------------
+# similarity
+# ---------------------------------------------------------------------------
+
+
+def test_centered_matches_scalar() -> None:
+    """Vectorised centered similarities should equal the scalar kernel exactly."""
+    m = 6
+    intersect, sx, sy = np.array(
+        [
+            (i, a, b)
+            for a in range(m + 1)
+            for b in range(m + 1)
+            for i in range(max(0, a + b - m), min(a, b) + 1)
+        ]
+    ).T
+    expected = [
+        kernels.centered_similarity(*c, m) for c in zip(intersect, sx, sy, strict=True)
+    ]
+    np.testing.assert_array_equal(kernels.centered(intersect, sx, sy, m), expected)
+
+
+def test_similarity_all_false_is_nan() -> None:
+    """Two all False vectors have no defined similarity."""
+    assert np.isnan(kernels.similarity(0, 0, 0.0, 0.0, False))
+
+
+# ---------------------------------------------------------------------------
+# bootstrap replicates
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture()
+def replicates() -> tuple:
+    """Two stacks of vectors and a block of resample indices."""
+    rng = np.random.default_rng(4)
+    x = rng.random((3, 40)) < 0.3
+    y = rng.random((3, 40)) < 0.5
+    idx = rng.integers(0, 40, size=(25, 2, 40))
+    return x, y, idx
+
+
+def test_null_block_loop_matches_numpy(
+    replicates: tuple, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The looping kernel should be bit-identical to the NumPy fallback."""
+    x, y, idx = replicates
+    monkeypatch.setattr(kernels, "BACKEND", "numpy")
+    expected = kernels.null_block(x, y, idx)
+    assert expected.dtype == np.float32
+    np.testing.assert_array_equal(kernels._null_block_loop(x, y, idx), expected)
+
+
+def test_null_block_single_vector(replicates: tuple) -> None:
+    """A single pair of vectors should give one row of a stack."""
+    x, y, idx = replicates
+    np.testing.assert_array_equal(
+        kernels.null_block(x[1], y[1], idx), kernels.null_block(x, y, idx)[1]
+    )
+
+
+@pytest.mark.parametrize("backend", ["numba", "numpy"])
+def test_exceedances_match_null_block(
+    replicates: tuple, backend: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Exceedances should count the replicates of the null at least as extreme."""
+    if backend == "numba":
+        pytest.importorskip("numba")
+    monkeypatch.setattr(kernels, "BACKEND", backend)
+    x, y, idx = replicates
+    j_null = kernels.null_block(x, y, idx)
+    j_obs = np.median(j_null, axis=-1).astype(np.float64)
+    np.testing.assert_array_equal(
+        kernels.exceedances(x, y, idx, j_obs), (j_null >= j_obs[:, None]).sum(axis=-1)
+    )
+
+
+@pytest.mark.parametrize("backend", ["numba", "numpy"])
+def test_exceedances_each_match_exceedances(
+    replicates: tuple, backend: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Resampling each pair with its own indices should match one pair at a time."""
+    if backend == "numba":
+        pytest.importorskip("numba")
+    monkeypatch.setattr(kernels, "BACKEND", backend)
+    x, y, idx = replicates
+    each = np.stack([idx, idx[::-1], idx[:, ::-1]])
+    j_obs = np.array([0.05, 0.1, 0.2])
+    expected = [kernels.exceedances(x[i], y[i], each[i], j_obs[i]) for i in range(3)]
+    np.testing.assert_array_equal(kernels.exceedances_each(x, y, each, j_obs), expected)
@@ -0,0 +1,88 @@
+"""Unit tests for the bootstrap null cache."""
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+from lta.helpers import null_cache
+from lta.helpers.null_cache import NullCache
+
+
+def _null(value: float, size: int = 4) -> np.ndarray:
+    """Construct a constant float32 null distribution."""
+    return np.full(size, value, dtype=np.float32)
+
+
+def test_fetch_draws_once() -> None:
+    """A second fetch should be a hit and not draw again."""
+    cache = NullCache()
+    calls = []
+
+    def draw() -> np.ndarray:
+        calls.append(1)
+        return _null(0.5)
+
+    first = cache.fetch((10, 3, 4, 4, 42), draw)
+    second = cache.fetch((10, 3, 4, 4, 42), draw)
+    assert len(calls) == 1
+    assert first is second
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used() -> None:
+    """Exceeding the memory limit should evict the least recently used null."""
+    cache = NullCache(max_bytes=2 * _null(0).nbytes)
+    cache.fetch((1, 1, 1, 4, 42), lambda: _null(1))
+    cache.fetch((2, 1, 1, 4, 42), lambda: _null(2))
+    cache.fetch((1, 1, 1, 4, 42), lambda: _null(1))
+    cache.fetch((3, 1, 1, 4, 42), lambda: _null(3))
+    assert len(cache) == 2
+    assert cache.nbytes == 2 * _null(0).nbytes
+    cache.fetch((2, 1, 1, 4, 42), lambda: _null(2))
+    assert cache.misses == 4
+
+
+def test_oversized_null_is_not_held() -> None:
+    """Nulls larger than the memory limit should not be held."""
+    cache = NullCache(max_bytes=4)
+    cache.fetch((1, 1, 1, 4, 42), lambda: _null(1))
+    assert len(cache) == 0
+
+
+def test_disk_store_is_reused(tmp_path: Path) -> None:
+    """Nulls stored on disk should be reused by a new cache."""
+    NullCache(directory=tmp_path).fetch((5, 2, 3, 4, 42), lambda: _null(0.25))
+    cache = NullCache(directory=tmp_path)
+    null = cache.fetch((5, 2, 3, 4, 42), lambda: _null(1))
+    np.testing.assert_array_equal(null, _null(0.25))
+    assert (cache.disk_hits, cache.misses) == (1, 0)
+    assert list(tmp_path.glob("*.partial.npy")) == []
+
+
+def test_disk_store_is_versioned(tmp_path: Path) -> None:
+    """Nulls stored on disk should be named with the version of their format."""
+    NullCache(directory=tmp_path).fetch((5, 2, 3, 4, 42), lambda: _null(0.25))
+    assert [path.name for path in tmp_path.iterdir()] == [
+        f"v{null_cache._VERSION}_5_2_3_4_42.npy"
+    ]
+
+
+def test_disk_store_evicts_least_recently_used(tmp_path: Path) -> None:
+    """Exceeding the disk limit should remove the least recently used null."""
+    NullCache(directory=tmp_path).fetch((1, 1, 1, 4, 42), lambda: _null(1))
+    stored = next(tmp_path.iterdir())
+    os.utime(stored, (0, 0))
+    cache = NullCache(directory=tmp_path, max_disk_bytes=2 * stored.stat().st_size)
+    cache.fetch((2, 1, 1, 4, 42), lambda: _null(2))
+    cache.fetch((1, 1, 1, 4, 42), lambda: _null(1))
+    cache.fetch((3, 1, 1, 4, 42), lambda: _null(3))
+    assert sorted(path.name.split("_")[1] for path in tmp_path.iterdir()) == ["1", "3"]
+    assert (cache.disk_hits, cache.misses) == (1, 2)
+
+
+def test_oversized_null_is_not_stored(tmp_path: Path) -> None:
+    """Nulls larger than the disk limit should not be stored."""
+    cache = NullCache(directory=tmp_path, max_disk_bytes=4)
+    cache.fetch((1, 1, 1, 4, 42), lambda: _null(1))
+    assert list(tmp_path.iterdir()) == []
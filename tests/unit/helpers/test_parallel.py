@@ -0,0 +1,80 @@
+"""Unit tests for parallel Jaccard tests."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lta.helpers import parallel
+from lta.helpers.null_cache import NullCache
+
+
+@pytest.fixture()
+def matrices() -> dict:
+    """Boolean matrices with group codes and pairs to test, including empty ones."""
+    rng = np.random.default_rng(5)
+    data = rng.random((120, 3)) < 0.4
+    codes = rng.integers(0, 4, 120)
+    return {
+        ("A", "LCMS"): parallel.Matrix(data, codes, [(0, 2), (1, 2)]),
+        ("A", "GCMS"): parallel.Matrix(data[:40], codes[:40], [(1, 0)]),
+        ("U", "LCMS"): parallel.Matrix(data[:0], codes[:0], [(0, 2), (1, 2)]),
+        ("U", "GCMS"): parallel.Matrix(data, codes, []),
+    }
+
+
+def _keyed(matrices: dict) -> dict:
+    """Key every pair of every matrix by its matrix and position."""
+    return {
+        key: parallel.Matrix(
+            matrix.data,
+            matrix.codes,
+            matrix.pairs,
+            pair_keys=[(*key, str(i)) for i in range(len(matrix.pairs))],
+            group_names=list("abcd"),
+        )
+        for key, matrix in matrices.items()
+    }
+
+
+def test_share_round_trip() -> None:
+    """A shared matrix should read back unchanged."""
+    data = np.array([[1, 0], [0, 1], [1, 1]], dtype=bool)
+    codes = np.array([2, 0, 1])
+    shm = parallel.share(data, codes)
+    try:
+        shared_data, shared_codes = parallel._views(shm, 3, 2)
+        np.testing.assert_array_equal(shared_data, data)
+        np.testing.assert_array_equal(shared_codes, codes)
+        del shared_data, shared_codes
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+@pytest.mark.parametrize("keyed", [False, True])
+@pytest.mark.parametrize("sampler", ["index", "counts"])
+def test_run_tests_matches_serial(matrices: dict, sampler: str, keyed: bool) -> None:
+    """Running over several processes should give the same results as serially."""
+    if keyed:
+        matrices = _keyed(matrices)
+    serial = parallel.run_tests(matrices, jobs=1, n=50, sampler=sampler)
+    pooled = parallel.run_tests(matrices, jobs=2, n=50, sampler=sampler)
+    assert serial.keys() == pooled.keys()
+    for key in serial:
+        pd.testing.assert_frame_equal(pooled[key], serial[key])
+
+
+def test_run_tests_counts_worker_cache_stats(matrices: dict) -> None:
+    """The caches of workers should add their hits and misses to the cache given."""
+    options: dict = {"n": 50, "sampler": "counts"}
+    serial, pooled = NullCache(), NullCache()
+    parallel.run_tests(matrices, jobs=1, cache=serial, **options)
+    parallel.run_tests(matrices, jobs=2, cache=pooled, **options)
+    assert pooled.misses > 0
+    assert pooled.hits + pooled.misses == serial.hits + serial.misses
+
+
+def test_run_tests_raises_without_jobs(matrices: dict) -> None:
+    """At least one job should be needed."""
+    with pytest.raises(ValueError, match="At least one job"):
+        parallel.run_tests(matrices, jobs=0)
@@ -0,0 +1,74 @@
+"""Unit tests for Parquet and Feather tables."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import lta.helpers.data_handling as dh
+from lta.helpers import tables
+
+pa = pytest.importorskip("pyarrow")
+feather = pytest.importorskip("pyarrow.feather")
+
+CSV = (
+    ",,one,1,2,1\n"
+    ",,two,a,a,b\n"
+    "lipid,class,mz,s1,s2,s3\n"
+    "x,X,10,1,2,3\n"
+    "y,Y,20,0,2.5,\n"
+)
+OPTIONS: dict = {"index_col": [0, 1, 2], "header": None}
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".feather"])
+def test_convert_round_trip(tmp_path: Path, suffix: str) -> None:
+    """A converted table reads as the CSV does, with or without filters."""
+    file = tmp_path / "data.csv"
+    file.write_text(CSV)
+    output = tmp_path / f"data{suffix}"
+    dh.convert(file, output, 3, ["a", "b", "c"], **OPTIONS)
+    assert tables.count_rows(output) == 2
+    for filters in [None, {"two": ["a"]}]:
+        exp = dh.construct_df(file, 3, ["two", "one"], ["a", "b", "c"], **OPTIONS)
+        if filters:
+            exp = exp.iloc[:, :2]
+        result = dh.construct_df(output, 3, ["two", "one"], filters=filters)
+        assert_frame_equal(result, exp)
+        chunks = dh.read_column_chunks(output, 3, ["two", "one"], 1, filters=filters)
+        assert_frame_equal(pd.concat(chunks, axis="columns"), result)
+
+
+def test_feather_reads_without_copy(tmp_path: Path) -> None:
+    """A Feather table is memory-mapped without being decompressed into memory."""
+    file = tmp_path / "data.csv"
+    file.write_text(CSV)
+    output = tmp_path / "data.feather"
+    dh.convert(file, output, 3, ["a", "b", "c"], **OPTIONS)
+    before = pa.total_allocated_bytes()
+    table = feather.read_table(output, memory_map=True)
+    assert table.num_rows == 2
+    assert pa.total_allocated_bytes() == before
+
+
+def test_read_header(tmp_path: Path) -> None:
+    """It reads every row of sample metadata."""
+    data = pd.DataFrame(
+        [[1.0, 2.0]],
+        index=pd.MultiIndex.from_tuples([("x", "X")], names=["a", "b"]),
+        columns=pd.MultiIndex.from_tuples([("1", "a"), ("2", None)], names=["n", "m"]),
+    )
+    tables.write_table(data, tmp_path / "data.pq")
+    header = tables.read_header(tmp_path / "data.pq")
+    assert header.to_dict() == {"0": {"n": "1", "m": "a"}, "1": {"n": "2", "m": None}}
+
+
+def test_raises(tmp_path: Path) -> None:
+    """It raises for files that are not tables, or have no LTA metadata."""
+    with pytest.raises(ValueError, match="not a table"):
+        tables.read_header(tmp_path / "data.csv")
+    file = tmp_path / "other.parquet"
+    pd.DataFrame({"a": [1.0]}).to_parquet(file)
+    with pytest.raises(ValueError, match="no LTA metadata"):
+        tables.read_header(file)
@@ -4,6 +4,7 @@
 from pathlib import Path
 from typing import List, Literal, Optional
 
+import numpy as np
 import pandas as pd
 import pytest
 from pandas.testing import assert_frame_equal, assert_series_equal
@@ -14,17 +15,13 @@ import lta.helpers.data_handling as dh
 
 @pytest.mark.parametrize("index_names", [None, ["one", "two", "three"]])
 def test_construct_df(mocker: MockerFixture, index_names: Optional[List[str]]) -> None:
-    """It drops NaNs."""
-    idx = pd.MultiIndex.from_arrays(
-        [
-            [None, None, "a", "a", "b", "b"],
-            [None, None, "e", "e", "f", "f"],
-            ["one", "two", "c", "c", "d", "d"],
-        ]
-    )
-    df = pd.DataFrame(
-        {0: ["e", "f", "1", "2", "3", "4"], 1: ["g", "h", 5, 6, 7, 8]}, index=idx
+    """It reads metadata, then the data as floats."""
+    header_idx = pd.MultiIndex.from_arrays([[None, None], [None, None], ["one", "two"]])
+    header = pd.DataFrame({0: ["e", "f"], 1: ["g", "h"]}, index=header_idx)
+    body_idx = pd.MultiIndex.from_arrays(
+        [["a", "a", "b", "b"], ["e", "e", "f", "f"], ["c", "c", "d", "d"]]
     )
+    body = pd.DataFrame({0: [1, 2, 3, 4], 1: [5.0, 6, 7, 8]}, index=body_idx)
 
     exp_idx = pd.MultiIndex.from_arrays(
         [["a", "a", "b", "b"], ["e", "e", "f", "f"], ["c", "c", "d", "d"]],
@@ -35,15 +32,120 @@ def test_construct_df(mocker: MockerFixture, index_names: Optional[List[str]]) -
         [[1, 5], [2, 6], [3, 7], [4, 8]],
         index=exp_idx,
         columns=exp_col,
+        dtype=float,
     )
 
     # Any attempts to mock pandas in lta.helpers.data_handling
     # Results in a slew of import errors
-    mocker.patch("pandas.read_csv", return_value=df)
+    read_csv = mocker.patch("pandas.read_csv", side_effect=[header, body])
     results = dh.construct_df(
-        Path("foo"), n_rows=2, metadata=["two"], index_names=index_names
+        Path("foo"), n_rows=2, metadata=["two"], index_names=index_names, engine="c"
     )
     assert_frame_equal(results, exp)
+    assert read_csv.call_args_list[0].kwargs == {"nrows": 2}
+    assert read_csv.call_args_list[1].kwargs["skiprows"] == 2
+
+
+def test_construct_df_filters(tmp_path: Path) -> None:
+    """It only reads the samples that match every filter."""
+    file = tmp_path / "data.csv"
+    file.write_text(
+        ",,one,1,2,1,2\n"
+        ",,two,a,a,b,b\n"
+        "lipid,class,mz,s1,s2,s3,s4\n"
+        "x,X,10,1,2,3,4\n"
+        "y,Y,20,5,6,7,8\n"
+    )
+    options: dict = {"index_col": [0, 1, 2], "header": None}
+    exp = dh.construct_df(file, 3, ["one", "two"], **options).iloc[:, [1, 3]]
+    filters = {"one": ["2"]}
+    result = dh.construct_df(file, 3, ["one", "two"], filters=filters, **options)
+    assert_frame_equal(result, exp)
+    chunks = dh.read_column_chunks(
+        file, 3, ["one", "two"], 1, filters=filters, **options
+    )
+    assert_frame_equal(pd.concat(chunks, axis="columns"), exp)
+    with pytest.raises(ValueError, match="No samples match"):
+        dh.construct_df(file, 3, ["one"], filters={"two": ["c"]}, **options)
+    with pytest.raises(ValueError, match="not a row of metadata"):
+        dh.construct_df(file, 3, ["one"], filters={"three": ["a"]}, **options)
+
+
+def test_read_header_and_count_rows(tmp_path: Path) -> None:
+    """It reads only the metadata, and counts the rows after it."""
+    file = tmp_path / "data.csv"
+    text = ",,one,1,2\n,,two,a,b\nlipid,class,mz,s1,s2\nx,X,10,1,2\ny,Y,20,0,3"
+    file.write_text(text)
+    header = dh.read_header(file, 3, index_col=[0, 1, 2], header=None)
+    assert list(header.index) == ["one", "two", "mz"]
+    assert header.loc["two", :].tolist() == ["a", "b"]
+    assert dh.count_rows(file, 3) == (2, True)
+    file.write_text(text + "\n")
+    assert dh.count_rows(file, 3) == (2, True)
+
+
+def test_count_rows_estimates_large_files(tmp_path: Path) -> None:
+    """It estimates the rows of a CSV larger than a MiB, unless asked to count."""
+    file = tmp_path / "data.csv"
+    lines = [",,one,1,2", ",,two,a,b", "lipid,class,mz,s1,s2"]
+    lines += [f"x{i:06d},X,10,1,2" for i in range(100_000)]
+    file.write_text("\n".join(lines) + "\n")
+    assert file.stat().st_size > 2**20
+    assert dh.count_rows(file, 3) == (100_000, False)
+    assert dh.count_rows(file, 3, exact=True) == (100_000, True)
+
+
+def test_design() -> None:
+    """It counts the samples of each condition, compartment, and mode."""
+    header = pd.DataFrame(
+        [["A", "A", "B", "A"], ["c", "d", "c", "c"], ["x", "x", "x", "y"]],
+        index=["Compartment", "Group", "Mode"],
+    )
+    result = dh.design(header, "Group", "Compartment", "Mode")
+    assert result.to_dict() == {
+        "A": {("x", "c"): 1, ("x", "d"): 1, ("y", "c"): 1},
+        "B": {("x", "c"): 1, ("x", "d"): 0, ("y", "c"): 0},
+    }
+
+
+def test_check_design() -> None:
+    """It finds missing rows, controls, and filtered values, and duplicate IDs."""
+    header = pd.DataFrame(
+        [["A", "A", "B"], ["c", "d", "c"], ["x", "x", "y"], ["1", "1", "2"]],
+        index=["Compartment", "Group", "Mode", "ID"],
+    )
+    rows = {"group": "Group", "compartment": "Compartment", "mode": "Mode"}
+    assert dh.check_design(header, {**rows, "sample-id": "Spam"}, "c") == [
+        "--sample-id Spam is not a row of metadata."
+    ]
+    rows["sample-id"] = "ID"
+    assert dh.check_design(header, rows, "c", {"Mode": ["x"]}) == [
+        "Sample IDs are not unique: 1."
+    ]
+    assert dh.check_design(header, rows, "d", {"Mode": ["x", "z"]}) == [
+        "No samples have Mode z.",
+        "Mode y has no samples of control d.",
+        "Sample IDs are not unique: 1.",
+    ]
+
+
+def test_construct_df_engines(tmp_path: Path) -> None:
+    """It reads the same with either parser, keeping row metadata as text."""
+    pytest.importorskip("pyarrow")
+    file = tmp_path / "data.csv"
+    file.write_text(
+        ",,one,1,2\n"
+        ",,two,a,b\n"
+        "lipid,class,mz,s1,s2\n"
+        "x,X,10,1,2.5\n"
+        "y,Y,20,0,\n"
+    )
+    options: dict = {"index_col": [0, 1, 2], "header": None}
+    exp = dh.construct_df(file, 3, ["two"], engine="c", **options)
+    result = dh.construct_df(file, 3, ["two"], engine="pyarrow", **options)
+    assert_frame_equal(result, exp)
+    assert (exp.dtypes == np.float64).all()
+    assert list(exp.index.get_level_values(2)) == ["10", "20"]
 
 
 @pytest.mark.parametrize("axis", ["index", "columns"])
@@ -66,6 +168,137 @@ def test_not_zero(
         assert_frame_equal(df, exp)
 
 
+def test_not_zero_drops_missing_groups() -> None:
+    """Samples missing a group label are left out, as by groupby."""
+    columns = pd.MultiIndex.from_arrays(
+        [["a", "a", None, "b"], ["c", "c", "c", "c"]], names=["y", "z"]
+    )
+    df = pd.DataFrame([[0, 1, 1, 0], [1, 1, 0, 1]], columns=columns)
+    exp = pd.DataFrame(
+        {("c", "a"): [True, True], ("c", "b"): [False, True]}, index=[0, 1]
+    )
+    exp.columns.names = ["z", "y"]
+    assert_frame_equal(dh.not_zero(df, "columns", "y", "z", 0.5), exp)
+
+
+@pytest.mark.parametrize("thresh", [0, 0.5, 1])
+def test_binarize(binary_df: pd.DataFrame, thresh: float) -> None:
+    """It matches not_zero on the samples of each mode."""
+    results = dh.binarize(
+        binary_df, mode="x", level="y", compartment="z", thresh=thresh
+    )
+    assert list(results) == ["a", "b", "c"]
+    for mode, df in binary_df.T.groupby(level="x"):
+        exp = dh.not_zero(
+            df.T.droplevel("x", axis="columns"), "columns", "y", "z", thresh
+        )
+        assert_frame_equal(results[mode], exp)
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 100])
+def test_running_binary_matches_binarize(chunk: int) -> None:
+    """It gives the binary data of all the samples, however they are chunked."""
+    rng = np.random.default_rng(0)
+    columns = pd.MultiIndex.from_arrays(
+        [
+            rng.choice(list("MN"), 30),
+            rng.choice(list("AB"), 30),
+            rng.choice(list("xy"), 30),
+        ],
+        names=["mode", "compartment", "condition"],
+    )
+    df = pd.DataFrame(rng.random((8, 30)) < 0.5, columns=columns).astype(float)
+    running = dh.RunningBinary("mode", "condition", "compartment", 0.5)
+    for start in range(0, 30, chunk):
+        running.update(df.iloc[:, start : start + chunk])
+    results = running.finalize()
+    exp = dh.binarize(
+        df, mode="mode", level="condition", compartment="compartment", thresh=0.5
+    )
+    assert list(results) == list(exp)
+    for mode, table in exp.items():
+        assert_frame_equal(results[mode], table)
+
+
+@pytest.fixture
+def presence() -> dh.Presence:
+    """Presence bitmasks of three lipids in three compartments."""
+    columns = pd.MultiIndex.from_tuples(
+        [("a", "x"), ("a", "y"), ("b", "x"), ("b", "y"), ("c", "x")],
+        names=["z", "y"],
+    )
+    df = pd.DataFrame(
+        [[1, 1, 1, 1, 1], [1, 0, 0, 1, 0], [0, 0, 0, 1, 0]],
+        index=list("lmn"),
+        columns=columns,
+        dtype=bool,
+    )
+    return dh.presence(df, compartment="z", level="y")
+
+
+def test_presence(presence: dh.Presence) -> None:
+    """It encodes compartments as bits per condition."""
+    assert presence.bits.tolist() == [[7, 3], [1, 2], [0, 2]]
+    assert presence.exists.tolist() == [7, 3]
+    assert presence.spread.tolist() == [7, 3, 2]
+    assert presence.names(5) == ["a", "c"]
+
+
+def test_presence_unpack(presence: dh.Presence) -> None:
+    """Unpacking gives the presence of each lipid in each compartment."""
+    exp = np.array([[1, 1, 0], [0, 1, 0], [0, 1, 0]], dtype=bool)
+    np.testing.assert_array_equal(presence.unpack(1), exp)
+
+
+def test_presence_all(presence: dh.Presence) -> None:
+    """It ignores compartments without samples of a condition."""
+    exp = pd.DataFrame(
+        {"x": [True, False, False], "y": [True, False, False]}, index=list("lmn")
+    )
+    exp.columns.name = "y"
+    assert_frame_equal(presence.all(7), exp)
+    exp = pd.DataFrame({"x": [False]}, index=["m"])
+    exp.columns.name = "y"
+    assert_frame_equal(presence.all(4, np.array([False, True, False])), exp)
+    exp = pd.DataFrame({"y": [True]}, index=["n"])
+    exp.columns.name = "y"
+    assert_frame_equal(presence.all(2, np.array([False, False, True]))[["y"]], exp)
+
+
+def test_combinations() -> None:
+    """It orders masks as itertools.combinations orders compartments."""
+    masks = [int(sum(1 << k for k in group)) for group in [(1, 2), (0, 3), (0, 1)]]
+    assert dh.combinations(masks) == [0b11, 0b1001, 0b110]
+
+
+def test_read_network(tmp_path: Path) -> None:
+    """It reads comma or whitespace separated pairs, skipping comments."""
+    file = tmp_path / "network.txt"
+    file.write_text("# tissues\nPla,Liv\n\nLiv  Adi\n")
+    assert dh.read_network(file) == [("Pla", "Liv"), ("Liv", "Adi")]
+
+
+def test_read_network_raises(tmp_path: Path) -> None:
+    """It raises on lines that are not pairs."""
+    file = tmp_path / "network.txt"
+    file.write_text("Pla Liv Adi\n")
+    with pytest.raises(ValueError, match="Line 1"):
+        dh.read_network(file)
+
+
+@pytest.mark.parametrize(
+    ("mask", "exp"),
+    [(0b0001, True), (0b0011, True), (0b0111, True), (0b0101, False), (0b1001, False)],
+)
+def test_connected(mask: int, exp: bool) -> None:
+    """It follows edges between known compartments only."""
+    neighbours = dh.adjacency(
+        [("a", "b"), ("b", "c"), ("x", "d")], pd.Index(list("abcd"))
+    )
+    assert neighbours.tolist() == [0b0010, 0b0101, 0b0010, 0]
+    assert dh.connected(mask, neighbours) is exp
+
+
 @pytest.mark.parametrize("axis", ["index", "columns"])
 def test_enfc_axis(axis: Literal["index", "columns"]) -> None:
     """It respects the axis."""
@@ -107,3 +340,207 @@ def test_enfc_order() -> None:
         df, axis="columns", level="second", order=("control", "experimental")
     )
     assert_series_equal(results, exp)
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 100])
+def test_running_moments_matches_moments(chunk: int) -> None:
+    """It gives the moments of all the samples, however they are chunked."""
+    rng = np.random.default_rng(0)
+    columns = pd.MultiIndex.from_arrays(
+        [rng.choice(list("AB"), 20), rng.choice(list("xyz"), 20), range(20)],
+        names=["compartment", "condition", "sample"],
+    )
+    df = pd.DataFrame(1e6 + rng.random((4, 20)), columns=columns)
+    running = dh.RunningMoments("compartment", "condition")
+    for start in range(0, 20, chunk):
+        running.update(df.iloc[:, start : start + chunk])
+    result = running.finalize()
+    exp = dh.moments(df, compartment="compartment", level="condition")
+    assert result.index.equals(exp.index)
+    assert result.compartments.equals(exp.compartments)
+    assert result.conditions.equals(exp.conditions)
+    np.testing.assert_array_equal(result.count, exp.count)
+    np.testing.assert_allclose(result.mean, exp.mean)
+    np.testing.assert_allclose(result.var, exp.var)
+
+
+def test_running_moments_skips_missing_values() -> None:
+    """It skips missing values, as groupby does, across chunks."""
+    columns = pd.MultiIndex.from_arrays(
+        [["A"] * 4 + ["B"] * 2, ["x"] * 6], names=["compartment", "condition"]
+    )
+    df = pd.DataFrame(
+        [
+            [1.0, np.nan, 3.0, 5.0, 2.0, 4.0],
+            [np.nan, np.nan, 2.0, np.nan, np.nan, np.nan],
+            [1.0, 2.0, np.nan, np.nan, 7.0, np.nan],
+        ],
+        columns=columns,
+    )
+    running = dh.RunningMoments("compartment", "condition")
+    for start in range(0, 6, 2):
+        running.update(df.iloc[:, start : start + 2])
+    result = running.finalize()
+    exp = dh.moments(df, compartment="compartment", level="condition")
+    np.testing.assert_array_equal(result.count, exp.count)
+    np.testing.assert_allclose(result.mean, exp.mean)
+    np.testing.assert_allclose(result.var, exp.var)
+    assert result.mean[0, 0, 0] == 3.0
+
+
+def test_running_moments_raises() -> None:
+    """It raises if chunks have different lipids."""
+    columns = pd.MultiIndex.from_tuples([("A", "x")], names=["c", "l"])
+    running = dh.RunningMoments("c", "l")
+    running.update(pd.DataFrame([[1.0]], index=["a"], columns=columns))
+    with pytest.raises(ValueError, match="same lipids"):
+        running.update(pd.DataFrame([[1.0]], index=["b"], columns=columns))
+
+
+def test_read_column_chunks(tmp_path: Path) -> None:
+    """Its chunks join up to the dataframe from construct_df."""
+    file = tmp_path / "data.csv"
+    file.write_text(
+        ",,one,1,2,3,4,5\n"
+        ",,two,a,b,c,d,e\n"
+        "lipid,class,mz,s1,s2,s3,s4,s5\n"
+        "x,X,10,1,2,3,4,5\n"
+        "y,Y,20,0,0,6,0,7\n"
+    )
+    options: dict = {"index_col": [0, 1, 2], "header": None}
+    exp = dh.construct_df(file, 3, ["one", "two"], **options)
+    chunks = list(dh.read_column_chunks(file, 3, ["one", "two"], 2, **options))
+    assert [chunk.shape[1] for chunk in chunks] == [2, 2, 1]
+    assert_frame_equal(pd.concat(chunks, axis="columns"), exp)
+    with pytest.raises(ValueError, match="at least one sample"):
+        next(dh.read_column_chunks(file, 3, ["one", "two"], 0, **options))
+
+
+@pytest.mark.parametrize(
+    "size,exp",
+    [
+        (1, [[0, 1], [2, 6], [3, 4, 5]]),
+        (3, [[0, 1], [2, 6], [3, 4, 5]]),
+        (4, [[0, 1, 2, 6], [3, 4, 5]]),
+        (10, [list(range(7))]),
+    ],
+)
+def test_shards(size: int, exp: List[List[int]]) -> None:
+    """It packs whole groups into shards, in order of appearance."""
+    index = pd.MultiIndex.from_arrays(
+        [list("abcdefg"), list("xxyzzzy")], names=["lipid", "Category"]
+    )
+    result = dh.shards(index, "Category", size)
+    assert [list(rows) for rows in result] == exp
+
+
+def test_shards_raises() -> None:
+    """It raises if shards have no rows."""
+    index = pd.MultiIndex.from_arrays([["a"], ["x"]], names=["lipid", "Category"])
+    with pytest.raises(ValueError, match="at least one row"):
+        dh.shards(index, "Category", 0)
+
+
+def test_enfcs_matches_enfc() -> None:
+    """It matches enfc in each compartment, with NaN for absent conditions."""
+    df = pd.DataFrame(
+        {
+            ("A", "control", 0): [1.5, 15, 2],
+            ("A", "control", 1): [1.0, 10, 3],
+            ("A", "experimental", 0): [5, 0.5, 0],
+            ("A", "experimental", 1): [15, 1.5, 0],
+            ("A", "other", 0): [2, 2, 2],
+            ("B", "control", 0): [0.5, 5, 1],
+            ("B", "control", 1): [1.5, 3, 2],
+            ("B", "experimental", 0): [3, 1, 4],
+        }
+    )
+    df.columns.names = ["compartment", "condition", "sample"]
+    m = dh.moments(df, compartment="compartment", level="condition")
+    assert m.count.tolist() == [[2, 2, 1], [2, 1, 0]]
+    results = dh.enfcs(m, ["experimental", "other"], "control")
+    for compartment in ["A", "B"]:
+        exp = dh.enfc(
+            df.loc[:, compartment],
+            axis="columns",
+            level="condition",
+            order=("experimental", "control"),
+        )
+        assert_series_equal(
+            results["experimental"][compartment], exp, check_names=False
+        )
+    assert results["other"]["B"].isna().all()
+
+
+def test_enfc_pairs() -> None:
+    """It gives each pair of conditions once, as enfcs would, without NaN."""
+    df = pd.DataFrame(
+        {
+            ("A", "a", 0): [1.5, 15],
+            ("A", "a", 1): [1.0, 10],
+            ("A", "b", 0): [5, 0],
+            ("A", "b", 1): [15, 0],
+            ("A", "c", 0): [2, 2],
+            ("A", "c", 1): [3, 1],
+        }
+    )
+    df.columns.names = ["compartment", "condition", "sample"]
+    m = dh.moments(df, compartment="compartment", level="condition")
+    pairs = dh.enfc_pairs(m)["ENFC"]
+    assert pairs.index.names == [None, "compartment", "condition", "Reference"]
+    assert pairs.index.tolist() == [
+        (0, "A", "a", "b"),
+        (0, "A", "a", "c"),
+        (0, "A", "b", "c"),
+        (1, "A", "a", "c"),
+    ]
+    for condition, reference in [("a", "b"), ("a", "c"), ("b", "c")]:
+        exp = dh.enfcs(m, [condition], reference)[condition]["A"].dropna()
+        result = pairs.xs((condition, reference), level=["condition", "Reference"])
+        np.testing.assert_array_equal(result.to_numpy(), exp.to_numpy())
+        reverse = dh.enfcs(m, [reference], condition)[reference]["A"].dropna()
+        np.testing.assert_allclose(result.to_numpy(), -reverse.to_numpy())
+
+
+@pytest.fixture
+def classed() -> pd.DataFrame:
+    """Lipid levels with a class on the index, including one without a class."""
+    index = pd.MultiIndex.from_arrays(
+        [list("lmnop"), ["PC", "PE", "PC", None, "TG"]], names=["Lipid", "Category"]
+    )
+    return pd.DataFrame({"x": [1, 2, 3, 4, 5], "y": [0, 1, 0, 1, 1]}, index=index)
+
+
+def test_rollup_matches_groupby(classed: pd.DataFrame) -> None:
+    """It sums lipids into classes as groupby does, for any subset of lipids."""
+    categories = dh.rollup(classed.index, level="Category")
+    for rows in [classed, classed.iloc[[4, 1, 0]], classed.iloc[:2]]:
+        assert_frame_equal(categories.apply(rows), rows.groupby(level="Category").sum())
+
+
+def test_rollup_skips_missing_values(classed: pd.DataFrame) -> None:
+    """It skips missing values as groupby does, with a class of only those as 0."""
+    classed = classed.astype(float)
+    classed.iloc[[0, 1], 0] = np.nan
+    categories = dh.rollup(classed.index, level="Category")
+    result = categories.apply(classed)
+    assert_frame_equal(result, classed.groupby(level="Category").sum())
+    assert result.loc[["PC", "PE"], "x"].tolist() == [3.0, 0.0]
+
+
+def test_rollup_raises_on_unknown_lipids(classed: pd.DataFrame) -> None:
+    """It raises for lipids it was not built from."""
+    categories = dh.rollup(classed.index[:2], level="Category")
+    with pytest.raises(KeyError, match="not in any class"):
+        categories.apply(classed)
+
+
+def test_rollup_coarsen(classed: pd.DataFrame) -> None:
+    """It composes class and superclass rollups."""
+    lipid_types = dh.rollup(classed.index, level="Category").coarsen(
+        {"PC": "GP", "PE": "GP", "TG": "GL"}, name="Type"
+    )
+    exp = pd.DataFrame(
+        {"x": [5, 6], "y": [1, 1]}, index=pd.Index(["GL", "GP"], name="Type")
+    )
+    assert_frame_equal(lipid_types.apply(classed), exp)
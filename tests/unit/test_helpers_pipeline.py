@@ -3,22 +3,80 @@
 
 Testing datahandling can be a challenge,
 particularly for tools designed to handle compler, "omics" data.
-At the moment,
-only the basic error handling is tested.
+Besides the basic error handling,
+runs on a small generated data file check that options agree with the default run.
 If you can provide any contributions towards better unit tests for data science,
 please reach out!
 """
 
 import logging
 from pathlib import Path
+from typing import Any, Dict
 
+import numpy as np
 import pandas as pd
 import pytest
+from pandas.testing import assert_frame_equal
 from pytest_mock import MockerFixture
 
 from lta.helpers import pipeline
 
 
+@pytest.fixture
+def data_file(tmp_path: Path) -> Path:
+    """Write a small data file, in which DHA has no samples from Adi."""
+    rng = np.random.default_rng(0)
+    samples = [
+        (mode, group, compartment, f"{mode}_{compartment}_{group}_{i}")
+        for mode in ["LCMS", "GCMS"]
+        for compartment in ["Adi", "Liv", "Pla"]
+        for group in ["CON", "AA", "DHA"]
+        if (group, compartment) != ("DHA", "Adi")
+        for i in range(3)
+    ]
+    categories = np.repeat(["PC", "TG", "PE", "SM", "CE"], 12)
+    present = rng.random((len(categories), len(samples) // 3)) < 0.5
+    values = rng.gamma(2.0, 100.0, (len(categories), len(samples)))
+    values *= np.repeat(present, 3, axis=1)
+    lines = [
+        ",".join(["", "", name, *[sample[i] for sample in samples]])
+        for i, name in enumerate(["Mode", "Group", "Compartment", "SampleID"])
+    ]
+    lines.append(",".join(["Lipid", "Category", "m/z", *[s[3] for s in samples]]))
+    for i, (category, row) in enumerate(zip(categories, values, strict=True)):
+        lines.append(",".join([f"{category}({i})", category, f"m{i}", *map(str, row)]))
+    file = tmp_path / "data.csv"
+    file.write_text("\n".join(lines) + "\n")
+    return file
+
+
+def _pipeline(
+    file: Path, output: Path, **options: Any  # noqa: ANN401
+) -> pipeline.Pipeline:
+    """Set up the pipeline for a data file from ``data_file``."""
+    return pipeline.Pipeline(
+        file,
+        output,
+        5,
+        "Group",
+        "CON",
+        "Compartment",
+        "Mode",
+        "SampleID",
+        0.3,
+        n=50,
+        save_align_files=True,
+        **options,
+    )
+
+
+def _run(file: Path, output: Path, **options: Any) -> pipeline.Pipeline:  # noqa: ANN401
+    """Run the pipeline on a data file from ``data_file``."""
+    pl = _pipeline(file, output, **options)
+    pl.run()
+    return pl
+
+
 def test_raise_NotFound(caplog: pytest.LogCaptureFixture) -> None:
     """It handles FileNotFoundErrors."""
     with pytest.raises(FileNotFoundError):
@@ -100,3 +158,194 @@ def test_raise_Runtime(mocker: MockerFixture, caplog: pytest.LogCaptureFixture)
             "foo.csv contains no data. A full traceback follows...",
         )
     ], "Log record is not correct."
+
+
+def test_raise_no_control(caplog: pytest.LogCaptureFixture) -> None:
+    """It raises if the groups analysed leave out the control."""
+    with pytest.raises(ValueError, match="control condition eggs"):
+        pipeline.Pipeline(
+            Path("foo.csv"),
+            Path("bar"),
+            5,
+            "spam",
+            "eggs",
+            "ham",
+            "green",
+            "sam",
+            0.2,
+            1,
+            True,
+            groups=["toast"],
+        )
+    assert caplog.record_tuples[0][1] == logging.ERROR
+
+
+def test_all_pairs_jaccard_keeps_control_rows(data_file: Path, tmp_path: Path) -> None:
+    """The all-pairs Jaccard table holds the comparisons of the default run."""
+    _run(data_file, tmp_path / "default")
+    _run(data_file, tmp_path / "pairs", all_pairs=True)
+    pairs = pd.read_csv(
+        tmp_path / "pairs" / "jaccard" / "all_pairs_jaccard_similarity.csv",
+        index_col=[0, 1, 2, 3],
+    )
+    assert pairs.index.names == [
+        "type_compartment_mode",
+        "Group",
+        "Reference",
+        "Category",
+    ]
+    assert set(pairs.index.droplevel([0, 3])) == {
+        ("AA", "CON"),
+        ("DHA", "CON"),
+        ("AA", "DHA"),
+    }
+    for condition in ["AA", "DHA"]:
+        name = f"{condition}_to_CON_jaccard_similarity.csv"
+        default = pd.read_csv(
+            tmp_path / "default" / "jaccard" / name, header=[0, 1], index_col=0
+        )
+        assert default.equals(
+            pd.read_csv(
+                tmp_path / "pairs" / "jaccard" / name, header=[0, 1], index_col=0
+            )
+        )
+        expected = (
+            default.stack(0, future_stack=True)
+            .loc[:, ["J-sim", "p-val"]]
+            .dropna(how="all")
+            .swaplevel()
+            .sort_index()
+        )
+        control = pairs.xs(
+            (condition, "CON"), level=["Group", "Reference"]
+        ).sort_index()
+        np.testing.assert_array_equal(control.index, expected.index)
+        np.testing.assert_array_equal(control[["J-sim", "p-val"]], expected)
+
+
+def test_compartment_jaccard(data_file: Path, tmp_path: Path) -> None:
+    """It compares every pair of compartments with samples of each condition."""
+    pl = _run(data_file, tmp_path, compartment_jaccard=True)
+    table = pd.read_csv(
+        tmp_path / "jaccard" / "compartment_jaccard_similarity.csv",
+        index_col=[0, 1, 2, 3, 4],
+    )
+    assert table.index.names == [
+        "Mode",
+        "Group",
+        "Compartment",
+        "Reference",
+        "Category",
+    ]
+    full = {("Adi", "Liv"), ("Adi", "Pla"), ("Liv", "Pla")}
+    expected = {
+        (mode, group, *pair)
+        for mode in ["GCMS", "LCMS"]
+        for group in ["AA", "CON", "DHA"]
+        for pair in (full if group != "DHA" else {("Liv", "Pla")})
+    }
+    assert set(table.index.droplevel(4)) == expected
+    for (mode, group, a, b, category), row in table.iterrows():
+        binary = pl.binary[mode]
+        rows = binary.index.get_level_values("Category") == category
+        x = binary.loc[rows, (a, group)]
+        y = binary.loc[rows, (b, group)]
+        assert row["J-sim"] == pytest.approx((x & y).sum() / (x | y).sum())
+
+
+def _outputs(output: Path) -> Dict[Path, str]:
+    """Read every table written by a run."""
+    return {
+        file.relative_to(output): file.read_text() for file in output.rglob("*.csv")
+    }
+
+
+def test_shards_match_whole_run(data_file: Path, tmp_path: Path) -> None:
+    """Analysing lipids in shards writes the same results as all at once."""
+    options = {"all_pairs": True, "compartment_jaccard": True}
+    _run(data_file, tmp_path / "whole", **options)
+    _run(data_file, tmp_path / "shards", row_chunk=12, **options)
+    whole = _outputs(tmp_path / "whole")
+    assert _outputs(tmp_path / "shards") == whole
+    # Groups without N-lipids in any shard are dropped
+    switch = pd.read_csv(
+        tmp_path / "shards" / "switch_individual_lipids.csv", header=[0, 1]
+    )
+    groups = set(switch.columns.get_level_values(0))
+    assert "u_LIV_GCMS" not in groups
+    assert "u_ADI_LCMS" not in groups
+    assert "u_ADI_GCMS" in groups
+
+
+def test_shards_stream_moments_once(
+    data_file: Path, tmp_path: Path, mocker: MockerFixture
+) -> None:
+    """Streamed moments are read once for all shards."""
+    spy = mocker.spy(pipeline.dh, "construct_df")
+    _run(data_file, tmp_path / "whole", column_chunk=10)
+    reads = spy.call_count
+    spy.reset_mock()
+    _run(data_file, tmp_path / "shards", column_chunk=10, row_chunk=12)
+    assert spy.call_count == reads
+    assert _outputs(tmp_path / "shards") == _outputs(tmp_path / "whole")
+
+
+def test_stream_samples(
+    data_file: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """Streaming never reads every sample at once, and matches the whole run."""
+    read = mocker.spy(pipeline.Pipeline, "_read")
+    chunks = mocker.spy(pipeline.dh, "construct_df")
+    _run(data_file, tmp_path / "stream", column_chunk=10)
+    assert read.call_count == 0
+    # 48 samples are read in 5 chunks, once to binarize and once for moments
+    assert chunks.call_count == 10
+    assert "parsed whole twice for every 10 samples" in caplog.text
+    for call in chunks.call_args_list:
+        assert len(call.kwargs["usecols"]) <= 3 + 10
+    _run(data_file, tmp_path / "whole")
+    for name, index in [("individual_lipids", [0, 1, 2]), ("lipid_classes", 0)]:
+        file = Path("enfc", f"{name}.csv")
+        assert_frame_equal(
+            pd.read_csv(tmp_path / "stream" / file, header=[0, 1, 2], index_col=index),
+            pd.read_csv(tmp_path / "whole" / file, header=[0, 1, 2], index_col=index),
+        )
+    assert (tmp_path / "stream" / "switch_individual_lipids.csv").read_text() == (
+        tmp_path / "whole" / "switch_individual_lipids.csv"
+    ).read_text()
+
+
+def test_input_cache_stays_mapped(data_file: Path, tmp_path: Path) -> None:
+    """A stored data file is used as it is mapped, without its all-0 samples."""
+    lines = data_file.read_text().splitlines()
+    lines[5:] = [line.rsplit(",", 1)[0] + ",0" for line in lines[5:]]
+    data_file.write_text("\n".join(lines) + "\n")
+    pl = _pipeline(data_file, tmp_path, input_cache_dir=tmp_path / "cache")
+    stored = pl._read()
+    assert not stored.to_numpy().flags.writeable
+    assert stored.shape == (60, 47)
+    assert "GCMS_Pla_DHA_2" not in stored.columns.get_level_values("SampleID")
+
+
+@pytest.mark.parametrize("share_nulls", [False, True])
+def test_null_cache_size_needs_shared_nulls(
+    data_file: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture, share_nulls: bool
+) -> None:
+    """The size of the null cache is only used, and not warned about, when shared."""
+    pl = _pipeline(
+        data_file,
+        tmp_path,
+        sampler="counts",
+        null_cache_size=1,
+        null_cache_dir=tmp_path / "nulls",
+        null_cache_disk_size=2,
+        share_nulls=share_nulls,
+    )
+    assert pl.null_cache is not None
+    assert pl.null_cache.max_bytes == (2**20 if share_nulls else 0)
+    assert pl.null_cache.max_disk_bytes == 2 * 2**20
+    warned = "The null cache size is ignored" in caplog.text
+    assert warned is not share_nulls
@@ -1,15 +1,30 @@
 # -*- coding: utf-8 -*-
 """Tests for lta.parser."""
 
+import subprocess  # noqa: S404
+import sys
+
 from _pytest import capture
 
-from lta.commands.run import run
-from lta.parser import lta_parser
+from lta.parser import convert_parser, inspect_parser, lta_parser, select
 
-expected = """usage: lta [-h] [-c CONFIG] [-t {[0, 1]}] [-b BOOT_REPS] [-n N_ROWS_METADATA]
-           [--group GROUP] [--control CONTROL] [--compartment COMPARTMENT]
-           [--mode MODE] [--sample-id SAMPLE_ID] [-V] [-v] [-l LOGFILE]
-           [--savealignfiles]
+expected = """usage: lta [-h] [-c CONFIG] [-t {[0, 1]}] [-b BOOT_REPS]
+           [--boot-sampler {index,counts}]
+           [--boot-strategy {fixed,sequential}] [--boot-alpha {[0, 1]}]
+           [--boot-exceedances BOOT_EXCEEDANCES]
+           [--null-cache-size NULL_CACHE_SIZE]
+           [--null-cache-dir NULL_CACHE_DIR]
+           [--null-cache-disk-size NULL_CACHE_DISK_SIZE] [--share-nulls]
+           [--jaccard-method {bootstrap,exact,asymptotic}] [-j JOBS]
+           [--seed SEED] [--network NETWORK] [--all-pairs]
+           [--compartment-jaccard] [--column-chunk COLUMN_CHUNK]
+           [--row-chunk ROW_CHUNK] [--modes MODES [MODES ...]]
+           [--compartments COMPARTMENTS [COMPARTMENTS ...]]
+           [--groups GROUPS [GROUPS ...]] [--input-cache-dir INPUT_CACHE_DIR]
+           [--input-cache-size INPUT_CACHE_SIZE] [--refresh-input-cache]
+           [-n N_ROWS_METADATA] [--group GROUP] [--control CONTROL]
+           [--compartment COMPARTMENT] [--mode MODE] [--sample-id SAMPLE_ID]
+           [-V] [-v] [-l LOGFILE] [--savealignfiles]
            file output
 """
 
@@ -21,8 +36,33 @@ def test_correct_usage(capsys: capture.CaptureFixture) -> None:
     assert usage.out == expected, "LTA's usage is incorrect."
 
 
-def test_default_func() -> None:
-    """It has the correct default function."""
+def test_default_command() -> None:
+    """It has the correct default command."""
     assert (
-        lta_parser.get_default("func") == run
-    ), "The default function is not lta.commands.run."
+        lta_parser.get_default("command") == "run"
+    ), "The default command is not lta.commands.run."
+
+
+def test_imports_no_commands() -> None:
+    """It leaves the command modules to be imported when they are run."""
+    modules = ["lta.commands.run", "lta.helpers.pipeline", "numba", "scipy"]
+    code = f"import sys, lta.cli; print([m for m in {modules} if m in sys.modules])"
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]", "The parser imports the pipeline."
+
+
+def test_select() -> None:
+    """It picks the parser of a command, else the root parser."""
+    assert select(["convert", "a.csv", "a.parquet"]) == (
+        convert_parser,
+        ["a.csv", "a.parquet"],
+    )
+    assert select(["inspect", "a.csv"]) == (inspect_parser, ["a.csv"])
+    assert select(["data", "results"]) == (lta_parser, ["data", "results"])
+    assert select(["run", "inspect", "results"]) == (
+        lta_parser,
+        ["inspect", "results"],
+    )
+    assert select([]) == (lta_parser, [])